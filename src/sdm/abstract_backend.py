@@ -22,6 +22,16 @@ class AbstractBackendException(Exception):
     pass
 
 
+class UnmountException(AbstractBackendException):
+    """
+    An unmount that left the mount or its process behind.
+    outcome describes the steps taken, e.g. "unmount=failed,lazy=ok,term=timeout"
+    """
+    def __init__(self, message, outcome=""):
+        super(UnmountException, self).__init__(message)
+        self.outcome = outcome
+
+
 class AbstractBackendConfig(object):
     __metaclass__ = ABCMeta
 
@@ -41,6 +51,32 @@ class AbstractBackendConfig(object):
 class AbstractBackend(object):
     __metaclass__ = ABCMeta
 
+    def set_deadline(self, deadline):
+        self.deadline = deadline
+
+    def set_trace(self, trace):
+        # remote calls add their spans to the trace of the command
+        self.trace = trace
+
+    def get_host_health(self):
+        # backends talking to remote hosts return their HostHealth
+        return []
+
+    def prepare(self, mount_id, ms_host, dataset, username, user_pkey, gateway_name):
+        """
+        Set up a dataset ahead of mount. Return the time its certs expire,
+        or None if the backend has nothing to prepare.
+        """
+        return None
+
+    def get_mount_options(self, mount_id):
+        # options, e.g. cache_size, a mount is running with
+        return {}
+
+    def get_mount_usage(self, mount_id):
+        # CPU, memory and I/O used by a mount, or None if unknown
+        return None
+
     @abstractmethod
     def get_name(cls):
         pass
@@ -54,7 +90,7 @@ class AbstractBackend(object):
         pass
 
     @abstractmethod
-    def mount(self, mount_id, ms_host, dataset, username, user_pkey, gateway_name, mount_path):
+    def mount(self, mount_id, ms_host, dataset, username, user_pkey, gateway_name, mount_path, options=None):
         pass
 
     @abstractmethod
@@ -63,4 +99,5 @@ class AbstractBackend(object):
 
     @abstractmethod
     def unmount(self, mount_id, dataset, mount_path, cleanup=False):
+        # returns the outcome of the steps taken, or None
         pass
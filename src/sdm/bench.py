@@ -0,0 +1,306 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/bench.py
+#   Measure read throughput and metadata rates of a directory tree
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import stat
+import time
+import random
+import threading
+
+DEFAULT_MAX_FILES = 1000
+# entries stat-ed by a walk at most
+DEFAULT_MAX_STATS = 100000
+DEFAULT_SEQ_BLOCK_SIZE = 1024*1024 # 1MB
+DEFAULT_SEQ_MAX_BYTES = 256*1024*1024 # 256MB
+DEFAULT_RANDOM_BLOCK_SIZE = 4*1024 # 4KB
+DEFAULT_RANDOM_READS = 500
+DEFAULT_MAX_THREADS = 8
+
+LATENCY_PERCENTILES = [50, 95, 99]
+
+
+class BenchException(Exception):
+    pass
+
+
+class BenchWorkload(object):
+    # directory walk and stat
+    META = "meta"
+    # sequential large reads, twice to compare cold and warm cache.
+    # the first pass is only cold for data no earlier run or other reader
+    # has already brought into the page cache or the syndicatefs cache
+    SEQ = "seq"
+    # random small reads
+    RANDOM = "random"
+    # sequential reads with 1 to N threads
+    SCALING = "scaling"
+
+    @classmethod
+    def get_names(cls):
+        return [cls.META, cls.SEQ, cls.RANDOM, cls.SCALING]
+
+    @classmethod
+    def from_str(cls, names):
+        workloads = []
+        for name in names.split(","):
+            n = name.strip().lower()
+            if n not in cls.get_names():
+                raise BenchException("unknown workload - %s, choose from %s" % (name, ", ".join(cls.get_names())))
+            workloads.append(n)
+        return workloads
+
+
+class BenchConfig(object):
+    """
+    Bench parameters
+    """
+    def __init__(self):
+        self.workloads = BenchWorkload.get_names()
+        self.max_files = DEFAULT_MAX_FILES
+        self.max_stats = DEFAULT_MAX_STATS
+        self.seq_block_size = DEFAULT_SEQ_BLOCK_SIZE
+        self.seq_max_bytes = DEFAULT_SEQ_MAX_BYTES
+        self.random_block_size = DEFAULT_RANDOM_BLOCK_SIZE
+        self.random_reads = DEFAULT_RANDOM_READS
+        self.max_threads = DEFAULT_MAX_THREADS
+        self.seed = 0
+
+    def __repr__(self):
+        return "<BenchConfig %s>" % \
+            (self.workloads)
+
+
+def get_percentiles(samples):
+    # returns {"p50": ..., ...} in msec
+    result = {}
+    if len(samples) == 0:
+        return result
+
+    sorted_samples = sorted(samples)
+    for p in LATENCY_PERCENTILES:
+        idx = min(len(sorted_samples) - 1, int(len(sorted_samples) * p / 100.0))
+        result["p%d" % p] = round(sorted_samples[idx] * 1000, 3)
+    return result
+
+
+def _get_rate(count, elapsed):
+    if elapsed <= 0:
+        return None
+    return round(count / elapsed, 3)
+
+
+def walk(root, max_files, max_stats=DEFAULT_MAX_STATS, stat_all=True):
+    """
+    Walk the tree, stat entries and return (files, result).
+    files are (path, size) of up to max_files regular files.
+    The walk stops after max_stats entries, or once max_files are found
+    unless stat_all is set.
+    """
+    files = []
+    dirs = 0
+    stats = 0
+    truncated = False
+    latencies = []
+    start = time.time()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirs += 1
+        for names, is_file in [(dirnames, False), (filenames, True)]:
+            for name in names:
+                if stats >= max_stats or (not stat_all and len(files) >= max_files):
+                    truncated = True
+                    break
+
+                path = os.path.join(dirpath, name)
+                t = time.time()
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    continue
+                latencies.append(time.time() - t)
+                stats += 1
+
+                if is_file and len(files) < max_files and st.st_size > 0 and stat.S_ISREG(st.st_mode):
+                    files.append((path, st.st_size))
+
+        if truncated:
+            break
+    elapsed = time.time() - start
+
+    return files, {
+        "dirs": dirs,
+        "stats": stats,
+        "truncated": truncated,
+        "elapsed_sec": round(elapsed, 3),
+        "dirs_per_sec": _get_rate(dirs, elapsed),
+        "stats_per_sec": _get_rate(stats, elapsed),
+        "stat_latency_msec": get_percentiles(latencies)
+    }
+
+
+def _read_sequential(files, block_size, max_bytes, latencies=None):
+    # returns bytes read
+    total = 0
+    for path, _ in files:
+        if total >= max_bytes:
+            break
+        with open(path, "rb", 0) as f:
+            while total < max_bytes:
+                t = time.time()
+                data = f.read(min(block_size, max_bytes - total))
+                if latencies is not None:
+                    latencies.append(time.time() - t)
+                if not data:
+                    break
+                total += len(data)
+    return total
+
+
+def sequential_read(files, block_size, max_bytes):
+    latencies = []
+    start = time.time()
+    total = _read_sequential(files, block_size, max_bytes, latencies)
+    elapsed = time.time() - start
+    mb = total / (1024.0 * 1024.0)
+    return {
+        "bytes": total,
+        "elapsed_sec": round(elapsed, 3),
+        "mb_per_sec": _get_rate(mb, elapsed),
+        "read_latency_msec": get_percentiles(latencies)
+    }
+
+
+def random_read(files, block_size, reads, seed=0):
+    rnd = random.Random(seed)
+    latencies = []
+    total = 0
+    start = time.time()
+    for _ in range(reads):
+        path, size = rnd.choice(files)
+        offset = rnd.randint(0, max(0, size - block_size))
+        t = time.time()
+        with open(path, "rb", 0) as f:
+            f.seek(offset)
+            total += len(f.read(block_size))
+        latencies.append(time.time() - t)
+    elapsed = time.time() - start
+    return {
+        "reads": reads,
+        "bytes": total,
+        "elapsed_sec": round(elapsed, 3),
+        "iops": _get_rate(reads, elapsed),
+        "read_latency_msec": get_percentiles(latencies)
+    }
+
+
+def parallel_read(files, threads, block_size, max_bytes):
+    """
+    Read files with the given number of threads, each thread taking
+    every n-th file
+    """
+    totals = [0] * threads
+    errors = []
+
+    def _reader(idx):
+        try:
+            totals[idx] = _read_sequential(files[idx::threads], block_size, max_bytes / threads)
+        except (IOError, OSError), e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=_reader, args=(i,)) for i in range(threads)]
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.time() - start
+
+    if errors:
+        raise BenchException("cannot read files : %s" % errors[0])
+
+    mb = sum(totals) / (1024.0 * 1024.0)
+    return {
+        "threads": threads,
+        "bytes": sum(totals),
+        "elapsed_sec": round(elapsed, 3),
+        "mb_per_sec": _get_rate(mb, elapsed)
+    }
+
+
+def _get_thread_counts(max_threads):
+    counts = []
+    n = 1
+    while n < max_threads:
+        counts.append(n)
+        n *= 2
+    counts.append(max_threads)
+    return counts
+
+
+def run_bench(root, config=None):
+    """
+    Run workloads over a directory and return results as a dict
+    """
+    if config is None:
+        config = BenchConfig()
+
+    if not os.path.isdir(root):
+        raise BenchException("not a directory - %s" % root)
+
+    result = {
+        "path": root,
+        "started_at": time.time(),
+        "workloads": {}
+    }
+
+    # stat the whole tree only when metadata rates are measured
+    stat_all = BenchWorkload.META in config.workloads
+    files, walk_result = walk(root, config.max_files, config.max_stats, stat_all)
+    if stat_all:
+        result["workloads"][BenchWorkload.META] = walk_result
+
+    result["files"] = len(files)
+    if len(files) == 0:
+        return result
+
+    try:
+        if BenchWorkload.SEQ in config.workloads:
+            # the first pass fills caches, the second reads from them.
+            # files cached before the bench make the first pass warm too
+            cold = sequential_read(files, config.seq_block_size, config.seq_max_bytes)
+            warm = sequential_read(files, config.seq_block_size, config.seq_max_bytes)
+            speedup = None
+            if cold["mb_per_sec"] and warm["mb_per_sec"]:
+                speedup = round(warm["mb_per_sec"] / cold["mb_per_sec"], 3)
+            result["workloads"][BenchWorkload.SEQ] = {
+                "cold": cold,
+                "warm": warm,
+                "warm_speedup": speedup
+            }
+
+        if BenchWorkload.RANDOM in config.workloads:
+            result["workloads"][BenchWorkload.RANDOM] = random_read(files, config.random_block_size, config.random_reads, config.seed)
+
+        if BenchWorkload.SCALING in config.workloads:
+            result["workloads"][BenchWorkload.SCALING] = [
+                parallel_read(files, threads, config.seq_block_size, config.seq_max_bytes)
+                for threads in _get_thread_counts(config.max_threads)
+            ]
+    except (IOError, OSError), e:
+        raise BenchException("cannot read files : %s" % e)
+
+    return result
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/bktree.py
+#   BK-tree for approximate string lookup
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+class _Pattern(object):
+    """
+    A word prepared for bit-parallel edit distance (Myers/Hyyro).
+    Each step over the other word updates a column of the DP matrix
+    at once as bit vectors.
+    """
+    def __init__(self, word):
+        self.word = word
+        self.length = len(word)
+        self.peq = {}
+        for i, c in enumerate(word):
+            self.peq[c] = self.peq.get(c, 0) | (1 << i)
+
+    def distance(self, text):
+        m = self.length
+        if m == 0:
+            return len(text)
+
+        full = (1 << m) - 1
+        last = 1 << (m - 1)
+        pv = full
+        mv = 0
+        score = m
+        peq = self.peq
+        for c in text:
+            eq = peq.get(c, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | ~(xh | pv)
+            mh = pv & xh
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+            ph = (ph << 1) | 1
+            mh = mh << 1
+            pv = (mh | ~(xv | ph)) & full
+            mv = ph & xv & full
+        return score
+
+
+def edit_distance(a, b):
+    """
+    Levenshtein distance between two strings
+    """
+    if a == b:
+        return 0
+    return _Pattern(a).distance(b)
+
+
+class BKTree(object):
+    """
+    Burkhard-Keller tree over edit distance.
+    A search for words within distance d of a query only descends into
+    children whose edge distance is within d of the distance to the node,
+    so most of the tree is skipped.
+    """
+    def __init__(self, words=None):
+        # node is [word, {distance: child node}]
+        self.root = None
+        self.size = 0
+        if words:
+            for word in words:
+                self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = [word, {}]
+            self.size += 1
+            return
+
+        pattern = _Pattern(word)
+        node = self.root
+        while True:
+            d = pattern.distance(node[0])
+            if d == 0:
+                # already in the tree
+                return
+
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [word, {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """
+        Return [(distance, word)] within max_distance, closest first
+        """
+        results = []
+        if self.root is None:
+            return results
+
+        pattern = _Pattern(word)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = pattern.distance(node[0])
+            if d <= max_distance:
+                results.append((d, node[0]))
+
+            for child_distance, child in node[1].items():
+                if d - max_distance <= child_distance <= d + max_distance:
+                    stack.append(child)
+
+        results.sort()
+        return results
+
+    def to_list(self):
+        """
+        Return the tree as nested lists, [word, [[distance, child], ...]],
+        or None if it is empty
+        """
+        if self.root is None:
+            return None
+
+        out = [self.root[0], []]
+        stack = [(self.root, out)]
+        while stack:
+            node, out_node = stack.pop()
+            for d in sorted(node[1].keys()):
+                child = node[1][d]
+                out_child = [child[0], []]
+                out_node[1].append([d, out_child])
+                stack.append((child, out_child))
+        return out
+
+    @classmethod
+    def from_list(cls, l):
+        tree = cls()
+        if l is None:
+            return tree
+
+        tree.root = [l[0], {}]
+        tree.size = 1
+        stack = [(l, tree.root)]
+        while stack:
+            in_node, node = stack.pop()
+            for d, in_child in in_node[1]:
+                child = [in_child[0], {}]
+                node[1][d] = child
+                tree.size += 1
+                stack.append((in_child, child))
+        return tree
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return "<BKTree %d>" % \
+            (self.size)
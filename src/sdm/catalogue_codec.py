@@ -0,0 +1,273 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/catalogue_codec.py
+#   Encode and decode catalogue artifacts
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import gzip
+import hashlib
+import StringIO
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARTIFACT_FORMAT = "sdm-catalogue"
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_EXTENSIONS = [".json.gz", ".msgpack"]
+
+GZIP_MAGIC = "\x1f\x8b"
+ZSTD_MAGIC = "\x28\xb5\x2f\xfd"
+
+JSON_TYPE = "application/json"
+# artifacts store shared keys once - only clients asking for them get them
+ARTIFACT_JSON_TYPE = "application/vnd.sdm-catalogue+json"
+ARTIFACT_MSGPACK_TYPE = "application/vnd.sdm-catalogue+msgpack"
+
+
+class CatalogueCodecException(Exception):
+    pass
+
+
+def is_artifact_url(url):
+    for ext in ARTIFACT_EXTENSIONS:
+        if url.lower().endswith(ext):
+            return True
+    return False
+
+
+def make_content_hash(entries):
+    """
+    Hash of entries independent of their order and encoding
+    """
+    h = hashlib.sha256()
+    for ent in sorted(entries, key=lambda e: e["dataset"]):
+        h.update(json.dumps(ent, sort_keys=True, separators=(",", ":")))
+        h.update("\n")
+    return "sha256:%s" % h.hexdigest()
+
+
+def _make_key_id(user_pkey):
+    return hashlib.sha256(user_pkey).hexdigest()[:16]
+
+
+def make_artifact(version, entries, index=None, name_tree=None):
+    """
+    Return an artifact document of entries.
+    Private keys shared by entries are stored once and referenced by id,
+    entries without a key are kept as they are.
+    index is {gram: datasets} precomputed for search, name_tree is a
+    BKTree of dataset names in lists precomputed for suggestions.
+    """
+    keys = {}
+    packed_entries = []
+    for ent in entries:
+        packed = dict(ent)
+        user_pkey = packed.get("user_pkey")
+        if user_pkey:
+            key_id = _make_key_id(user_pkey)
+            keys[key_id] = user_pkey
+            del packed["user_pkey"]
+            packed["user_pkey_id"] = key_id
+        packed_entries.append(packed)
+
+    doc = {
+        "format": ARTIFACT_FORMAT,
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "version": version,
+        "content_hash": make_content_hash(entries),
+        "keys": keys,
+        "entries": packed_entries
+    }
+    if index is not None:
+        grams = {}
+        for g, datasets in index.items():
+            grams[g] = sorted(datasets)
+        doc["index"] = grams
+    if name_tree is not None:
+        doc["name_tree"] = name_tree
+    return doc
+
+
+def read_artifact(doc):
+    """
+    Return a catalogue document {"version": ..., "entries": [...],
+    "index": ..., "name_tree": ..., "content_hash": ...} of an artifact
+    document.
+    The content hash is checked against the entries.
+    """
+    if not isinstance(doc, dict) or doc.get("format") != ARTIFACT_FORMAT:
+        raise CatalogueCodecException("not a catalogue artifact")
+
+    if doc.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise CatalogueCodecException("unsupported catalogue artifact format version - %s" % doc.get("format_version"))
+
+    keys = doc.get("keys", {})
+    entries = []
+    for packed in doc["entries"]:
+        ent = dict(packed)
+        key_id = ent.pop("user_pkey_id", None)
+        if key_id is not None:
+            if key_id not in keys:
+                raise CatalogueCodecException("unknown key id - %s" % key_id)
+            ent["user_pkey"] = keys[key_id]
+        entries.append(ent)
+
+    content_hash = make_content_hash(entries)
+    if content_hash != doc.get("content_hash"):
+        raise CatalogueCodecException("content hash mismatch - expected %s, got %s" % (doc.get("content_hash"), content_hash))
+
+    return {
+        "version": doc.get("version"),
+        "entries": entries,
+        "index": doc.get("index"),
+        "name_tree": doc.get("name_tree"),
+        "content_hash": content_hash
+    }
+
+
+def _gzip(data):
+    buf = StringIO.StringIO()
+    # mtime is fixed so that the same catalogue gives the same bytes
+    with gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def _gunzip(data):
+    with gzip.GzipFile(fileobj=StringIO.StringIO(data), mode="rb") as f:
+        return f.read()
+
+
+def _unzstd(data):
+    if zstandard is None:
+        raise CatalogueCodecException("zstandard is not installed")
+    # frames may not record their content size
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def encode_json_gz(doc):
+    return _gzip(json.dumps(doc, separators=(",", ":")))
+
+
+def encode_msgpack(doc):
+    if msgpack is None:
+        raise CatalogueCodecException("msgpack is not installed")
+    return msgpack.packb(doc, use_bin_type=True)
+
+
+def decode(data):
+    """
+    Decode an artifact from gzipped JSON, JSON or msgpack bytes
+    """
+    try:
+        if data.startswith(GZIP_MAGIC):
+            data = _gunzip(data)
+
+        if data.lstrip()[:1] in ["{", "["]:
+            return json.loads(data)
+    except (IOError, ValueError), e:
+        raise CatalogueCodecException("cannot decode a catalogue artifact : %s" % e)
+
+    if msgpack is None:
+        raise CatalogueCodecException("msgpack is not installed")
+
+    try:
+        return msgpack.unpackb(data, raw=False)
+    except Exception, e:
+        raise CatalogueCodecException("cannot decode a catalogue artifact : %s" % e)
+
+
+def get_accept_header():
+    types = []
+    if msgpack is not None:
+        types.append(ARTIFACT_MSGPACK_TYPE)
+    types.append(ARTIFACT_JSON_TYPE)
+    types.append("%s;q=0.5" % JSON_TYPE)
+    return ", ".join(types)
+
+
+def get_accept_encoding_header():
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return ", ".join(encodings)
+
+
+def _parse_header_values(header):
+    return [v.split(";")[0].strip().lower() for v in (header or "").split(",")]
+
+
+def choose_content_type(accept):
+    types = _parse_header_values(accept)
+    if ARTIFACT_MSGPACK_TYPE in types and msgpack is not None:
+        return ARTIFACT_MSGPACK_TYPE
+    if ARTIFACT_JSON_TYPE in types:
+        return ARTIFACT_JSON_TYPE
+    return JSON_TYPE
+
+
+def choose_content_encoding(accept_encoding):
+    # returns None for an uncompressed body
+    encodings = _parse_header_values(accept_encoding)
+    if "zstd" in encodings and zstandard is not None:
+        return "zstd"
+    if "gzip" in encodings:
+        return "gzip"
+    return None
+
+
+def encode_body(doc, content_type, content_encoding=None):
+    if content_type == ARTIFACT_MSGPACK_TYPE:
+        data = encode_msgpack(doc)
+    else:
+        data = json.dumps(doc, separators=(",", ":"))
+
+    if content_encoding == "zstd":
+        data = zstandard.ZstdCompressor().compress(data)
+    elif content_encoding == "gzip":
+        data = _gzip(data)
+    return data
+
+
+def decode_body(data, content_type, content_encoding=None):
+    """
+    Decode a HTTP response body with the decoder its headers ask for
+    """
+    encodings = _parse_header_values(content_encoding)
+    try:
+        # HTTP clients decode gzip by themselves, zstd is left to us
+        if "zstd" in encodings and data.startswith(ZSTD_MAGIC):
+            data = _unzstd(data)
+        elif "gzip" in encodings and data.startswith(GZIP_MAGIC):
+            data = _gunzip(data)
+
+        if _parse_header_values(content_type)[0] == ARTIFACT_MSGPACK_TYPE:
+            if msgpack is None:
+                raise CatalogueCodecException("msgpack is not installed")
+            return msgpack.unpackb(data, raw=False)
+        return json.loads(data)
+    except CatalogueCodecException:
+        raise
+    except Exception, e:
+        raise CatalogueCodecException("cannot decode a catalogue response : %s" % e)
@@ -0,0 +1,413 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/catalogue_source.py
+#   Access catalogue servers
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import urllib
+import grequests
+import requests
+import deadline as sdm_deadline
+import catalogue_codec as sdm_catalogue_codec
+
+# catalogue servers advertise optional features in this response header
+CAPABILITIES_HEADER = "X-SDM-Catalogue-Capabilities"
+
+
+class CatalogueSourceException(Exception):
+    pass
+
+
+class CatalogueCapability(object):
+    # GET <url>/<dataset> returns a single entry
+    LOOKUP = "lookup"
+    # GET <url>?q=<query> returns matching entries
+    QUERY = "query"
+    # GET <url>?limit=<n> returns at most n entries
+    LIMIT = "limit"
+    # GET <url>?since=<version> returns changes made after the version
+    DELTA = "delta"
+
+
+def normalize_catalogue(doc):
+    """
+    Return a catalogue document as {"version": ..., "entries": [...]}.
+    Unversioned catalogues are plain JSON arrays of entries. Catalogue
+    artifacts are unpacked and checked.
+    """
+    if isinstance(doc, list):
+        return {
+            "version": None,
+            "entries": doc
+        }
+
+    if isinstance(doc, dict) and doc.get("format") == sdm_catalogue_codec.ARTIFACT_FORMAT:
+        try:
+            return sdm_catalogue_codec.read_artifact(doc)
+        except sdm_catalogue_codec.CatalogueCodecException, e:
+            raise CatalogueSourceException("cannot read a catalogue artifact : %s" % e)
+
+    if isinstance(doc, dict) and isinstance(doc.get("entries"), list):
+        return {
+            "version": doc.get("version"),
+            "entries": doc["entries"]
+        }
+
+    raise CatalogueSourceException("unrecognized catalogue format")
+
+
+def normalize_delta(doc):
+    """
+    Return a delta document as {"version": ..., "added": [...],
+    "modified": [...], "removed": [...]}, or a catalogue document if the
+    server sent the full catalogue instead.
+    """
+    if isinstance(doc, list) or (isinstance(doc, dict) and ("entries" in doc or "format" in doc)):
+        return normalize_catalogue(doc)
+
+    if not isinstance(doc, dict) or "version" not in doc:
+        raise CatalogueSourceException("unrecognized delta format")
+
+    delta = {
+        "version": doc["version"]
+    }
+    for k in ["added", "modified", "removed"]:
+        v = doc.get(k, [])
+        if not isinstance(v, list):
+            raise CatalogueSourceException("unrecognized delta format - %s" % k)
+        delta[k] = v
+    return delta
+
+
+def match_entry_dict(query, ent):
+    for k in ["dataset", "username", "description"]:
+        if query in ent.get(k, "").lower():
+            return True
+    return False
+
+
+class HttpCatalogueSource(object):
+    """
+    Catalogue served over HTTP
+    """
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.capabilities = None
+        # capabilities the server told, kept by the repository for later commands
+        self.learned_capabilities = None
+        self.deadline = sdm_deadline.Deadline()
+
+    def set_deadline(self, deadline):
+        self.deadline = deadline
+
+    def _get(self, url, params=None, method="GET", phase="catalogue fetch"):
+        timeout = self.deadline.remaining(phase)
+        headers = {
+            "Accept": sdm_catalogue_codec.get_accept_header(),
+            "Accept-Encoding": sdm_catalogue_codec.get_accept_encoding_header()
+        }
+        if method == "HEAD":
+            req = [grequests.head(url, params=params, headers=headers, verify=False, timeout=timeout)]
+        else:
+            req = [grequests.get(url, params=params, headers=headers, verify=False, timeout=timeout)]
+
+        errors = []
+        res = grequests.map(req, exception_handler=lambda r, e: errors.append(e))[0]
+        if res is None:
+            for e in errors:
+                if isinstance(e, requests.Timeout):
+                    raise sdm_deadline.DeadlineExceededException(phase, self.deadline.timeout)
+            raise CatalogueSourceException("cannot connect to a catalogue server : %s" % url)
+        self._learn_capabilities(res)
+        return res
+
+    def _learn_capabilities(self, res):
+        # servers with optional features advertise them on every response
+        header = res.headers.get(CAPABILITIES_HEADER)
+        if header is not None:
+            capabilities = [c.strip().lower() for c in header.split(",") if len(c.strip()) > 0]
+        elif res.status_code == 200:
+            # a server without optional features
+            capabilities = []
+        else:
+            return
+        self.capabilities = capabilities
+        self.learned_capabilities = capabilities
+
+    def set_capabilities(self, capabilities):
+        # capabilities learned by an earlier command save a HEAD request
+        self.capabilities = capabilities
+
+    def get_learned_capabilities(self):
+        return self.learned_capabilities
+
+    def _decode(self, res):
+        try:
+            return sdm_catalogue_codec.decode_body(res.content, res.headers.get("Content-Type"), res.headers.get("Content-Encoding"))
+        except sdm_catalogue_codec.CatalogueCodecException, e:
+            raise CatalogueSourceException(e)
+
+    def get_capabilities(self):
+        if self.capabilities is None:
+            try:
+                self._get(self.url, method="HEAD", phase="catalogue capability check")
+            except CatalogueSourceException:
+                pass
+            if self.capabilities is None:
+                # not learned - assume none for this command
+                self.capabilities = []
+        return self.capabilities
+
+    def has_capability(self, capability):
+        return capability in self.get_capabilities()
+
+    def fetch_all(self):
+        res = self._get(self.url)
+        if res.status_code != 200:
+            raise CatalogueSourceException("received a http error - code %s" % res.status_code)
+        return normalize_catalogue(self._decode(res))
+
+    def fetch_delta(self, version):
+        # returns None if the server cannot produce a delta from the version
+        res = self._get(self.url, params={"since": version}, phase="catalogue delta fetch")
+        if res.status_code in [404, 410]:
+            return None
+        if res.status_code != 200:
+            raise CatalogueSourceException("received a http error - code %s" % res.status_code)
+        return normalize_delta(self._decode(res))
+
+    def fetch_entry(self, dataset):
+        url = "%s/%s" % (self.url, urllib.quote(dataset.strip().lower()))
+        res = self._get(url, phase="dataset lookup")
+        if res.status_code == 404:
+            return None
+        if res.status_code != 200:
+            raise CatalogueSourceException("received a http error - code %s" % res.status_code)
+
+        ent = self._decode(res)
+        if not isinstance(ent, dict):
+            raise CatalogueSourceException("unexpected response for a dataset lookup - %s" % dataset)
+        return ent
+
+    def query(self, query=None, limit=None):
+        params = {}
+        if query:
+            params["q"] = query
+        if limit is not None:
+            params["limit"] = limit
+
+        res = self._get(self.url, params=params, phase="catalogue query")
+        if res.status_code != 200:
+            raise CatalogueSourceException("received a http error - code %s" % res.status_code)
+
+        ent_arr = self._decode(res)
+        if not isinstance(ent_arr, list):
+            raise CatalogueSourceException("unexpected response for a query - %s" % query)
+        return ent_arr
+
+
+class LocalCatalogueSource(object):
+    """
+    File-based stand-in for a catalogue server.
+    Each version of the catalogue is kept as <path>/<version>.json.
+    """
+    def __init__(self, path):
+        self.path = path.rstrip("/")
+
+    def set_deadline(self, deadline):
+        pass
+
+    def _make_version_path(self, version):
+        return "%s/%d.json" % (self.path, version)
+
+    def list_versions(self):
+        versions = []
+        if os.path.isdir(self.path):
+            for filename in os.listdir(self.path):
+                name, ext = os.path.splitext(filename)
+                if ext == ".json" and name.isdigit():
+                    versions.append(int(name))
+        return sorted(versions)
+
+    def _get_latest_version(self):
+        versions = self.list_versions()
+        if len(versions) == 0:
+            raise CatalogueSourceException("no catalogue found at %s" % self.path)
+        return versions[-1]
+
+    def _read_version(self, version):
+        with open(self._make_version_path(version), "r") as f:
+            return json.load(f)
+
+    def get_capabilities(self):
+        return [
+            CatalogueCapability.LOOKUP,
+            CatalogueCapability.QUERY,
+            CatalogueCapability.LIMIT,
+            CatalogueCapability.DELTA
+        ]
+
+    def has_capability(self, capability):
+        return capability in self.get_capabilities()
+
+    def set_capabilities(self, capabilities):
+        pass
+
+    def get_learned_capabilities(self):
+        return None
+
+    def fetch_all(self):
+        version = self._get_latest_version()
+        return {
+            "version": version,
+            "entries": self._read_version(version)
+        }
+
+    def fetch_entry(self, dataset):
+        k = dataset.strip().lower()
+        for ent in self.fetch_all()["entries"]:
+            if ent["dataset"].strip().lower() == k:
+                return ent
+        return None
+
+    def query(self, query=None, limit=None):
+        entries = []
+        for ent in self.fetch_all()["entries"]:
+            if limit is not None and len(entries) >= limit:
+                break
+            if query and not match_entry_dict(query, ent):
+                continue
+            entries.append(ent)
+        return entries
+
+    def fetch_delta(self, version):
+        try:
+            since = int(version)
+        except (TypeError, ValueError):
+            return None
+
+        if since not in self.list_versions():
+            return None
+
+        latest = self._get_latest_version()
+        old_entries = {}
+        for ent in self._read_version(since):
+            old_entries[ent["dataset"].strip().lower()] = ent
+
+        new_entries = {}
+        for ent in self._read_version(latest):
+            new_entries[ent["dataset"].strip().lower()] = ent
+
+        delta = {
+            "version": latest,
+            "added": [],
+            "modified": [],
+            "removed": []
+        }
+        for k in new_entries.keys():
+            if k not in old_entries:
+                delta["added"].append(new_entries[k])
+            elif new_entries[k] != old_entries[k]:
+                delta["modified"].append(new_entries[k])
+
+        for k in old_entries.keys():
+            if k not in new_entries:
+                delta["removed"].append(k)
+        return delta
+
+    def publish(self, entries):
+        # store the entries as a new version
+        if not os.path.exists(self.path):
+            os.makedirs(self.path, 0755)
+
+        versions = self.list_versions()
+        version = 1
+        if len(versions) > 0:
+            version = versions[-1] + 1
+
+        version_path = self._make_version_path(version)
+        tmp_path = version_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.rename(tmp_path, version_path)
+        return version
+
+
+class ArtifactCatalogueSource(object):
+    """
+    Catalogue artifact built by tools/build_catalogue.py,
+    read from a file path or a URL
+    """
+    def __init__(self, url):
+        self.url = url
+        self.deadline = sdm_deadline.Deadline()
+
+    def set_deadline(self, deadline):
+        self.deadline = deadline
+
+    def _read(self):
+        if "://" not in self.url or self.url.startswith("file://"):
+            path = self.url
+            if path.startswith("file://"):
+                path = path[len("file://"):]
+            with open(path, "rb") as f:
+                return f.read()
+
+        phase = "catalogue fetch"
+        timeout = self.deadline.remaining(phase)
+        errors = []
+        req = [grequests.get(self.url, verify=False, timeout=timeout)]
+        res = grequests.map(req, exception_handler=lambda r, e: errors.append(e))[0]
+        if res is None:
+            for e in errors:
+                if isinstance(e, requests.Timeout):
+                    raise sdm_deadline.DeadlineExceededException(phase, self.deadline.timeout)
+            raise CatalogueSourceException("cannot connect to a catalogue server : %s" % self.url)
+        if res.status_code != 200:
+            raise CatalogueSourceException("received a http error - code %s" % res.status_code)
+        return res.content
+
+    def get_capabilities(self):
+        return []
+
+    def has_capability(self, capability):
+        return capability in self.get_capabilities()
+
+    def set_capabilities(self, capabilities):
+        pass
+
+    def get_learned_capabilities(self):
+        return None
+
+    def fetch_all(self):
+        try:
+            return sdm_catalogue_codec.read_artifact(sdm_catalogue_codec.decode(self._read()))
+        except (IOError, sdm_catalogue_codec.CatalogueCodecException), e:
+            raise CatalogueSourceException("cannot read a catalogue artifact %s : %s" % (self.url, e))
+
+
+def get_catalogue_source(url):
+    if sdm_catalogue_codec.is_artifact_url(url):
+        return ArtifactCatalogueSource(url)
+
+    if url.startswith("file://"):
+        return LocalCatalogueSource(url[len("file://"):])
+
+    if "://" not in url:
+        return LocalCatalogueSource(url)
+
+    return HttpCatalogueSource(url)
@@ -24,6 +24,13 @@ import backends as sdm_backends
 
 DEFAULT_REPO_URL = "https://butler.opencloud.cs.arizona.edu/sdm/catalogue"
 DEFAULT_BACKEND = sdm_backends.Backends.get_backend_name("FUSE")
+# time budget of commands in sec - 0 means no limit
+DEFAULT_TIMEOUTS = {
+    "catalogue": 60,
+    "mount": 300,
+    "unmount": 60,
+    "status": 60
+}
 
 
 class Config(object):
@@ -35,6 +42,9 @@ class Config(object):
         self.default_backend = DEFAULT_BACKEND
         self.backend_configs = sdm_backends.Backends.get_default_backend_configs()
         self.syndicate_users = sdm_syndicate_user.get_default_users()
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        # datasets "sdm warm" prepares when no dataset is given
+        self.warm_datasets = []
 
         try:
             self.load_config(path)
@@ -45,7 +55,8 @@ class Config(object):
         bconfigs = {}
         for bk in self.backend_configs.keys():
             bc = self.backend_configs[bk]
-            bconfigs[bk] = bc.__dict__
+            # configs may hold objects, e.g. resource limits
+            bconfigs[bk] = json.loads(bc.to_json())
 
         susers = []
         for suser in self.syndicate_users:
@@ -55,7 +66,9 @@ class Config(object):
             "repo_url": self.repo_url,
             "default_backend": self.default_backend,
             "backend_configs": bconfigs,
-            "syndicate_users": susers
+            "syndicate_users": susers,
+            "timeouts": self.timeouts,
+            "warm_datasets": self.warm_datasets
         }
 
     def _load(self, conf):
@@ -74,6 +87,11 @@ class Config(object):
                 for syndicate_user in conf[k]:
                     user = sdm_syndicate_user.SyndicateUser.from_dict(syndicate_user)
                     self.add_syndicate_user(user)
+            elif k == "warm_datasets":
+                self.warm_datasets = [d.strip().lower() for d in conf[k]]
+            elif k == "timeouts":
+                for op in conf[k].keys():
+                    self.timeouts[op.strip().lower()] = conf[k][op]
 
     def load_config(self, path):
         conf = {}
@@ -118,6 +136,9 @@ class Config(object):
 
         self.syndicate_users.append(user)
 
+    def get_timeout(self, operation):
+        return self.timeouts.get(operation, 0)
+
     def get_backend_config(self, backend):
         if backend in self.backend_configs:
             return self.backend_configs[backend]
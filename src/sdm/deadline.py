@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/deadline.py
+#   Track the time budget of a command
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import time
+
+
+class DeadlineExceededException(Exception):
+    def __init__(self, phase, timeout=None):
+        self.phase = phase
+        self.timeout = timeout
+        if timeout is None:
+            message = "timed out during %s" % phase
+        else:
+            message = "timed out during %s - the command ran out of its %.1f sec budget" % (phase, timeout)
+        super(DeadlineExceededException, self).__init__(message)
+
+
+class Deadline(object):
+    """
+    Deadline of a command. timeout of None or <= 0 means no deadline.
+    """
+    def __init__(self, timeout=None):
+        self.timeout = None
+        self.expires_at = None
+        if timeout is not None and timeout > 0:
+            self.timeout = float(timeout)
+            self.expires_at = time.time() + self.timeout
+
+    def is_expired(self):
+        if self.expires_at is None:
+            return False
+        return time.time() >= self.expires_at
+
+    def remaining(self, phase):
+        """
+        Return the remaining budget in sec, or None if there is no
+        deadline. Raise if the budget has run out.
+        """
+        if self.expires_at is None:
+            return None
+
+        r = self.expires_at - time.time()
+        if r <= 0:
+            raise DeadlineExceededException(phase, self.timeout)
+        return r
+
+    def get_timeout(self, phase, timeout=None):
+        """
+        Return the smaller of the timeout and the remaining budget
+        """
+        r = self.remaining(phase)
+        if r is None:
+            return timeout
+        if timeout is None:
+            return r
+        return min(r, timeout)
+
+    def check(self, phase):
+        self.remaining(phase)
+
+    def __repr__(self):
+        return "<Deadline %s>" % \
+            (self.timeout)
@@ -0,0 +1,268 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/file_index.py
+#   Local listing of files in a mounted dataset
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import re
+import json
+import gzip
+import stat
+import time
+import fnmatch
+import multiprocessing.pool
+
+INDEX_FORMAT = "sdm-file-index"
+INDEX_FORMAT_VERSION = 1
+DEFAULT_INDEX_THREADS = 8
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class FileIndexException(Exception):
+    pass
+
+
+def parse_size(s):
+    """
+    Parse a size such as 512, 10K, 4M or 1G into bytes
+    """
+    m = re.match(r"^\s*(\d+)\s*([KMGT]?)B?\s*$", s, re.IGNORECASE)
+    if m is None:
+        raise FileIndexException("invalid size - %s" % s)
+    return int(m.group(1)) * SIZE_UNITS[m.group(2).upper()]
+
+
+def parse_age(s):
+    """
+    Parse an age such as 30m, 12h or 7d into seconds
+    """
+    m = re.match(r"^\s*(\d+)\s*([smhdw]?)\s*$", s, re.IGNORECASE)
+    if m is None:
+        raise FileIndexException("invalid age - %s" % s)
+    return int(m.group(1)) * AGE_UNITS[(m.group(2) or "d").lower()]
+
+
+def _escape(name):
+    # keeps tabs and newlines in names from breaking records
+    return name.encode("string_escape")
+
+
+def _unescape(name):
+    return name.decode("string_escape")
+
+
+class DirectoryListing(object):
+    """
+    Files and subdirectories directly under a directory
+    """
+    def __init__(self, mtime, files=None, subdirs=None):
+        # None for a listing that has to be made again
+        self.mtime = mtime
+        # [(name, size, mtime)]
+        self.files = files or []
+        self.subdirs = subdirs or []
+
+    def __repr__(self):
+        return "<DirectoryListing %d files, %d dirs>" % \
+            (len(self.files), len(self.subdirs))
+
+
+class FileIndex(object):
+    """
+    Listing of files under a root directory.
+    Directories are keyed by their path relative to the root ("" for the root).
+    """
+    def __init__(self, dataset, root):
+        self.dataset = dataset
+        self.root = root
+        self.built_at = None
+        self.dirs = {}
+
+    def _list_dir(self, rel_path, old):
+        # returns (rel_path, listing, rescanned)
+        path = os.path.join(self.root, rel_path)
+        if isinstance(path, unicode):
+            # list names as bytes, whatever their encoding is
+            path = path.encode("utf-8")
+        try:
+            # sub-second mtimes catch changes made right after a walk
+            mtime = os.lstat(path).st_mtime
+        except OSError:
+            return rel_path, None, False
+
+        if old is not None and old.mtime == mtime:
+            # no entry was added, removed or renamed
+            return rel_path, old, False
+
+        try:
+            names = os.listdir(path)
+        except OSError:
+            # keep what was known and list it again next time
+            if old is not None:
+                return rel_path, DirectoryListing(None, old.files, old.subdirs), False
+            return rel_path, DirectoryListing(None), False
+
+        listing = DirectoryListing(mtime)
+        for name in sorted(names):
+            try:
+                st = os.lstat(os.path.join(path, name))
+            except OSError:
+                # the listing misses an entry, list it again next time
+                listing.mtime = None
+                continue
+
+            if stat.S_ISDIR(st.st_mode):
+                listing.subdirs.append(name)
+            elif stat.S_ISREG(st.st_mode):
+                listing.files.append((name, st.st_size, int(st.st_mtime)))
+        return rel_path, listing, True
+
+    def update(self, threads=DEFAULT_INDEX_THREADS, full=False):
+        """
+        Walk the tree a level at a time, listing directories in parallel.
+        Unless full, directories whose mtime has not changed keep their
+        old listing and only their subdirectories are visited.
+        Returns the number of directories listed.
+        """
+        if not os.path.isdir(self.root):
+            raise FileIndexException("not a directory - %s" % self.root)
+
+        old_dirs = {} if full else self.dirs
+        dirs = {}
+        rescanned = 0
+        level = [""]
+        pool = multiprocessing.pool.ThreadPool(threads)
+        try:
+            while level:
+                results = pool.map(lambda p: self._list_dir(p, old_dirs.get(p)), level)
+                level = []
+                for rel_path, listing, listed in results:
+                    if listing is None:
+                        continue
+                    dirs[rel_path] = listing
+                    if listed:
+                        rescanned += 1
+                    for name in listing.subdirs:
+                        level.append(os.path.join(rel_path, name))
+        finally:
+            pool.close()
+
+        self.dirs = dirs
+        self.built_at = time.time()
+        return rescanned
+
+    def iter_files(self):
+        """
+        Yield (rel_path, size, mtime) of every file
+        """
+        for rel_path in sorted(self.dirs.keys()):
+            for name, size, mtime in self.dirs[rel_path].files:
+                yield os.path.join(rel_path, name), size, mtime
+
+    def find(self, pattern=None, min_size=None, max_size=None, newer_than=None, older_than=None):
+        """
+        Yield (rel_path, size, mtime) of files matching a glob pattern.
+        A pattern with "/" matches the relative path, otherwise the name.
+        newer_than and older_than are timestamps.
+        """
+        for rel_path, size, mtime in self.iter_files():
+            if pattern:
+                target = rel_path if "/" in pattern else os.path.basename(rel_path)
+                if not fnmatch.fnmatchcase(target, pattern):
+                    continue
+            if min_size is not None and size < min_size:
+                continue
+            if max_size is not None and size > max_size:
+                continue
+            if newer_than is not None and mtime < newer_than:
+                continue
+            if older_than is not None and mtime > older_than:
+                continue
+            yield rel_path, size, mtime
+
+    def get_file_count(self):
+        return sum([len(listing.files) for listing in self.dirs.values()])
+
+    def save(self, path):
+        """
+        Write the index as gzipped tab-separated records, a "D" record per
+        directory followed by "F" records of its files
+        """
+        parent = os.path.dirname(path)
+        if not os.path.exists(parent):
+            os.makedirs(parent, 0755)
+
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        f = gzip.open(tmp_path, "wb")
+        try:
+            f.write(json.dumps({
+                "format": INDEX_FORMAT,
+                "format_version": INDEX_FORMAT_VERSION,
+                "dataset": self.dataset,
+                "root": self.root,
+                "built_at": self.built_at
+            }) + "\n")
+            for rel_path in sorted(self.dirs.keys()):
+                listing = self.dirs[rel_path]
+                f.write("D\t%s\t%r\n" % (_escape(rel_path), listing.mtime))
+                for name, size, mtime in listing.files:
+                    f.write("F\t%s\t%d\t%d\n" % (_escape(name), size, mtime))
+        finally:
+            f.close()
+        # replace the index atomically
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            f = gzip.open(path, "rb")
+            try:
+                header = json.loads(f.readline())
+                if header.get("format") != INDEX_FORMAT or header.get("format_version") != INDEX_FORMAT_VERSION:
+                    raise FileIndexException("unsupported file index format - %s" % path)
+
+                index = FileIndex(header["dataset"], header["root"])
+                index.built_at = header["built_at"]
+                listing = None
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if fields[0] == "D":
+                        rel_path = _unescape(fields[1])
+                        mtime = None
+                        if fields[2] != "None":
+                            mtime = float(fields[2])
+                        listing = DirectoryListing(mtime)
+                        index.dirs[rel_path] = listing
+                        if rel_path:
+                            parent, name = os.path.split(rel_path)
+                            index.dirs[parent].subdirs.append(name)
+                    else:
+                        listing.files.append((_unescape(fields[1]), int(fields[2]), int(fields[3])))
+            finally:
+                f.close()
+            return index
+        except (IOError, ValueError, KeyError, IndexError, AttributeError), e:
+            raise FileIndexException("cannot read a file index %s : %s" % (path, e))
+
+    def __repr__(self):
+        return "<FileIndex %s %s>" % \
+            (self.dataset, self.root)
+
+
+def get_index_path(index_root, dataset):
+    return "%s/%s.idx.gz" % (index_root.rstrip("/"), dataset)
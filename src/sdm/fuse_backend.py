@@ -17,8 +17,10 @@
 #   limitations under the License.
 
 import json
+import hashlib
 import psutil
 import os
+import fcntl
 import time
 import inspect
 import subprocess
@@ -26,24 +28,215 @@ import tempfile
 import shlex
 import shutil
 import abstract_backend as sdm_absbackends
+import deadline as sdm_deadline
+import log_sink as sdm_log_sink
+import resource_limits as sdm_resource_limits
+import latency_history as sdm_latency_history
 import util as sdm_util
 
 from os.path import expanduser
 
 DEFAULT_MOUNT_PATH = "~/sdm_mounts"
-DEFAULT_SYNDICATE_DEBUG_MODE = True
+# debug output costs CPU per I/O, turn it on with the debug profile
+DEFAULT_SYNDICATE_DEBUG_MODE = False
 DEFAULT_SYNDICATE_DEBUG_LEVEL = 3
 DEFAULT_SYNDICATE_CACHE_MAX = 2*1024*1024*1024 # 20GB
 DEFAULT_USE_VALGRIND = False
+DEFAULT_SYNDICATE_CERT_TTL = 60*60 # 1 hour
+DEFAULT_SHARED_MOUNT = False
+DEFAULT_SHARED_MOUNT_ROOT = "/var/lib/sdm/shared"
+DEFAULT_PROFILE = None
+# time to wait for a mount to show up - with history of the dataset,
+# its p99 mount time * factor within [min, max] is used instead
+DEFAULT_MOUNT_TIMEOUT = 30 # sec
+DEFAULT_MOUNT_TIMEOUT_FACTOR = 3.0
+DEFAULT_MOUNT_TIMEOUT_MIN = 10 # sec
+# below the "mount" budget of a dataset, which Syndicate setup shares
+DEFAULT_MOUNT_TIMEOUT_MAX = 240 # sec
+
+# named sets of mount options
+FUSE_PROFILES = {
+    # no debug output, a large cache
+    "throughput": {
+        "debug_mode": False,
+        "debug_level": 0,
+        "use_valgrind": False,
+        "cache_size": 10*1024*1024*1024, # 10GB
+        "log_sink": sdm_log_sink.LogSinkType.RING
+    },
+    "debug": {
+        "debug_mode": True,
+        "debug_level": 3,
+        "use_valgrind": False,
+        "cache_size": 1024*1024*1024, # 1GB
+        "log_sink": sdm_log_sink.LogSinkType.ROTATE
+    },
+    "valgrind": {
+        "debug_mode": True,
+        "debug_level": 3,
+        "use_valgrind": True,
+        "cache_size": 1024*1024*1024, # 1GB
+        "log_sink": sdm_log_sink.LogSinkType.ROTATE
+    }
+}
+
+# kernel FUSE options that can be passed to syndicatefs with -o, and their types
+FUSE_KERNEL_OPTIONS = {
+    "max_read": int,
+    "max_readahead": int,
+    "max_background": int,
+    "congestion_threshold": int,
+    "kernel_cache": bool,
+    "auto_cache": bool,
+    # seconds to cache attributes, names and missing names
+    "attr_timeout": float,
+    "entry_timeout": float,
+    "negative_timeout": float
+}
 
 SYNDICATEFS_PROCESS_NAME = "syndicatefs"
+
+# interval to poll external processes - grows from min to max
+COMMAND_POLL_INTERVAL_MIN = 0.01 # sec
+COMMAND_POLL_INTERVAL_MAX = 0.1 # sec
+MOUNT_POLL_INTERVAL_MAX = 1 # sec
+
 SYNDICATE_CONFIG_ROOT_PATH = "~/.sdm/mounts/"
+SYNDICATE_USER_CONFIG_ROOT_PATH = "~/.sdm/users/"
+SYNDICATE_CERT_STATE_FILENAME = "certs.json"
+SYNDICATE_USER_REFS_FILENAME = "refs.json"
+SYNDICATE_USER_LOCK_FILENAME = "lock"
+# written once syndicate setup of the shared user has succeeded
+SYNDICATE_USER_SETUP_DONE_FILENAME = "setup.done"
+SYNDICATE_MOUNT_USER_FILENAME = "user.json"
+SYNDICATEFS_PID_FILENAME = "syndicatefs.pid"
+SYNDICATE_MOUNT_WARM_FILENAME = "warm.json"
+SYNDICATE_MOUNT_OPTIONS_FILENAME = "options.json"
+
+# a mount of a shared syndicatefs instance keeps the instance id here
+SYNDICATE_MOUNT_SHARED_FILENAME = "shared.json"
+SHARED_INSTANCE_PREFIX = "shared-"
+SHARED_INSTANCE_REFS_FILENAME = "refs.json"
+SHARED_INSTANCE_MOUNT_DIRNAME = "mnt"
+
+# each unmount stage - fusermount, lazy detach, SIGTERM, SIGKILL - waits up to this
+DEFAULT_UNMOUNT_STAGE_TIMEOUT = 2 # sec
+# with history of the dataset, its p99 unmount time * factor up to max is
+# used if longer
+UNMOUNT_STAGE_TIMEOUT_FACTOR = 3.0
+UNMOUNT_STAGE_TIMEOUT_MAX = 30 # sec
+
+
+class UnmountStage(object):
+    # fusermount -u
+    UNMOUNT = "unmount"
+    # fusermount -u -z, detaches a busy mount
+    LAZY = "lazy"
+    # SIGTERM to the tracked syndicatefs
+    TERM = "term"
+    # SIGKILL to the tracked syndicatefs
+    KILL = "kill"
+
+
+class UnmountResult(object):
+    OK = "ok"
+    NOT_MOUNTED = "not_mounted"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+    EXITED = "exited"
+
+
+def format_unmount_outcome(outcome):
+    return ",".join(["%s=%s" % (stage, result) for stage, result in outcome])
+
+# syndicate.conf entries pointing to state shared by all mounts of a user
+SYNDICATE_SHARED_CONFIG_KEYS = ["users", "syndicate"]
+
+# cert kind -> directory under the syndicate configuration root
+SYNDICATE_CERT_DIRS = {
+    "user": "users",
+    "volume": "volumes",
+    "gateway": "gateways"
+}
 
 
 class FuseBackendException(sdm_absbackends.AbstractBackendException):
     pass
 
 
+class MountTimeoutException(FuseBackendException):
+    pass
+
+
+def validate_fuse_options(options):
+    """
+    Return kernel FUSE options checked against FUSE_KERNEL_OPTIONS.
+    Options not in the list are refused so that catalogue hints cannot
+    pass arbitrary flags, e.g. allow_other.
+    """
+    if not isinstance(options, dict):
+        raise FuseBackendException("FUSE options must be a dict - %s" % options)
+
+    validated = {}
+    for k, v in options.items():
+        if k not in FUSE_KERNEL_OPTIONS:
+            raise FuseBackendException("unknown FUSE option - %s, choose from %s" % (k, ", ".join(sorted(FUSE_KERNEL_OPTIONS.keys()))))
+
+        t = FUSE_KERNEL_OPTIONS[k]
+        if t == bool:
+            if not isinstance(v, bool):
+                raise FuseBackendException("FUSE option %s must be true or false - %s" % (k, v))
+        elif isinstance(v, bool) or not isinstance(v, (int, long, float)) or v < 0:
+            raise FuseBackendException("FUSE option %s must be a non-negative number - %s" % (k, v))
+        elif t == int and v != int(v):
+            raise FuseBackendException("FUSE option %s must be an integer - %s" % (k, v))
+        validated[k] = t(v)
+
+    if validated.get("kernel_cache") and validated.get("auto_cache"):
+        raise FuseBackendException("FUSE options kernel_cache and auto_cache cannot be used together")
+    return validated
+
+
+def merge_fuse_options(options, overrides):
+    """
+    Return options updated with overrides. Turning on one of kernel_cache
+    and auto_cache turns off the other.
+    """
+    merged = dict(options)
+    for k, other in [("kernel_cache", "auto_cache"), ("auto_cache", "kernel_cache")]:
+        if overrides.get(k):
+            merged.pop(other, None)
+    merged.update(overrides)
+    return merged
+
+
+def get_invoking_uid():
+    """
+    Return the uid of the user who ran sdm, through sudo or not
+    """
+    sudo_uid = os.environ.get("SUDO_UID")
+    if sudo_uid and sudo_uid.isdigit():
+        return int(sudo_uid)
+    return os.getuid()
+
+
+def render_fuse_options(options):
+    """
+    Return syndicatefs arguments of kernel FUSE options, e.g. "-o kernel_cache,max_read=131072"
+    """
+    flags = []
+    for k in sorted(options.keys()):
+        v = options[k]
+        if v is True:
+            flags.append(k)
+        elif v is not False:
+            flags.append("%s=%s" % (k, v))
+
+    if len(flags) == 0:
+        return ""
+    return "-o %s" % ",".join(flags)
+
+
 class FuseBackendConfig(sdm_absbackends.AbstractBackendConfig):
     """
     FUSE Backend Config
@@ -54,6 +247,24 @@ class FuseBackendConfig(sdm_absbackends.AbstractBackendConfig):
         self.syndicate_debug_level = DEFAULT_SYNDICATE_DEBUG_LEVEL
         self.syndicate_cache_max = DEFAULT_SYNDICATE_CACHE_MAX
         self.use_valgrind = DEFAULT_USE_VALGRIND
+        self.syndicate_cert_ttl = DEFAULT_SYNDICATE_CERT_TTL
+        # share one syndicatefs per dataset and gateway on the node
+        self.shared_mount = DEFAULT_SHARED_MOUNT
+        self.shared_mount_root = DEFAULT_SHARED_MOUNT_ROOT
+        # a profile overrides debug, valgrind, cache and log settings
+        self.profile = DEFAULT_PROFILE
+        self.log_sink = sdm_log_sink.DEFAULT_LOG_SINK
+        self.log_max_bytes = sdm_log_sink.DEFAULT_LOG_MAX_BYTES
+        # kernel FUSE options for all mounts and per dataset
+        self.fuse_options = {}
+        self.dataset_fuse_options = {}
+        # cgroup, nice, ionice and CPU affinity of syndicatefs
+        self.resource_limits = sdm_resource_limits.ResourceLimits()
+        self.unmount_stage_timeout = DEFAULT_UNMOUNT_STAGE_TIMEOUT
+        self.mount_timeout = DEFAULT_MOUNT_TIMEOUT
+        self.mount_timeout_factor = DEFAULT_MOUNT_TIMEOUT_FACTOR
+        self.mount_timeout_min = DEFAULT_MOUNT_TIMEOUT_MIN
+        self.mount_timeout_max = DEFAULT_MOUNT_TIMEOUT_MAX
 
     @classmethod
     def from_dict(cls, d):
@@ -63,6 +274,42 @@ class FuseBackendConfig(sdm_absbackends.AbstractBackendConfig):
         config.syndicate_debug_level = d["syndicate_debug_level"]
         config.syndicate_cache_max = d["syndicate_cache_max"]
         config.use_valgrind = d["use_valgrind"]
+        if "syndicate_cert_ttl" in d:
+            config.syndicate_cert_ttl = d["syndicate_cert_ttl"]
+        if "shared_mount" in d:
+            config.shared_mount = d["shared_mount"]
+        if "shared_mount_root" in d:
+            config.shared_mount_root = d["shared_mount_root"]
+        if "profile" in d:
+            config.profile = d["profile"]
+        if "log_sink" in d:
+            config.log_sink = d["log_sink"]
+        if "log_max_bytes" in d:
+            config.log_max_bytes = d["log_max_bytes"]
+        if "fuse_options" in d:
+            config.fuse_options = validate_fuse_options(d["fuse_options"])
+        if "dataset_fuse_options" in d:
+            config.dataset_fuse_options = {}
+            for dataset, options in d["dataset_fuse_options"].items():
+                config.dataset_fuse_options[dataset.strip().lower()] = validate_fuse_options(options)
+        if "unmount_stage_timeout" in d:
+            v = d["unmount_stage_timeout"]
+            if isinstance(v, bool) or not isinstance(v, (int, long, float)) or v <= 0:
+                raise FuseBackendException("unmount_stage_timeout must be a positive number - %s" % v)
+            config.unmount_stage_timeout = v
+        if "mount_timeout" in d:
+            config.mount_timeout = d["mount_timeout"]
+        if "mount_timeout_factor" in d:
+            config.mount_timeout_factor = d["mount_timeout_factor"]
+        if "mount_timeout_min" in d:
+            config.mount_timeout_min = d["mount_timeout_min"]
+        if "mount_timeout_max" in d:
+            config.mount_timeout_max = d["mount_timeout_max"]
+        if "resource_limits" in d:
+            try:
+                config.resource_limits = sdm_resource_limits.ResourceLimits.from_dict(d["resource_limits"])
+            except sdm_resource_limits.ResourceLimitsException, e:
+                raise FuseBackendException(e)
         return config
 
     @classmethod
@@ -75,7 +322,21 @@ class FuseBackendConfig(sdm_absbackends.AbstractBackendConfig):
             "syndicate_debug_mode": self.syndicate_debug_mode,
             "syndicate_debug_level": self.syndicate_debug_level,
             "syndicate_cache_max": self.syndicate_cache_max,
-            "use_valgrind": self.use_valgrind
+            "use_valgrind": self.use_valgrind,
+            "syndicate_cert_ttl": self.syndicate_cert_ttl,
+            "shared_mount": self.shared_mount,
+            "shared_mount_root": self.shared_mount_root,
+            "profile": self.profile,
+            "log_sink": self.log_sink,
+            "log_max_bytes": self.log_max_bytes,
+            "fuse_options": self.fuse_options,
+            "dataset_fuse_options": self.dataset_fuse_options,
+            "resource_limits": self.resource_limits.to_dict(),
+            "unmount_stage_timeout": self.unmount_stage_timeout,
+            "mount_timeout": self.mount_timeout,
+            "mount_timeout_factor": self.mount_timeout_factor,
+            "mount_timeout_min": self.mount_timeout_min,
+            "mount_timeout_max": self.mount_timeout_max
         })
 
     def __eq__(self, other):
@@ -92,6 +353,11 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
     """
     def __init__(self, backend_config):
         self.backend_config = backend_config
+        # force reloading certs even if they are fresh
+        self.refresh_certs = False
+        self.deadline = sdm_deadline.Deadline()
+        # loaded when first used
+        self.latency_history = None
 
     @classmethod
     def get_name(cls):
@@ -114,16 +380,18 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
 
         return abs_mount_path
 
+    def _get_process_attr(self, p, name):
+        # old psutil has attributes where new psutil has methods
+        attr = getattr(p, name)
+        if inspect.ismethod(attr):
+            return attr()
+        return attr
+
     def _get_processes(self, name):
         matching_processes = []
         for p in psutil.process_iter():
             try:
-                pcmdline = ""
-                if inspect.ismethod(p.cmdline):
-                    pcmdline = p.cmdline()
-                else:
-                    pcmdline = p.cmdline
-
+                pcmdline = self._get_process_attr(p, "cmdline")
                 if name in pcmdline:
                     matching_processes.append(p)
             except psutil.NoSuchProcess:
@@ -141,13 +409,118 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
                         matching_mounts.append(w)
         return matching_mounts
 
-    def _wait_mount(self, mount_path, timeout=30, retry=0):
-        tick = 0
+    def _make_syndicatefs_pid_path(self, mount_id):
+        return "%s/%s" % (
+            self._make_syndicate_configuration_root_path(mount_id),
+            SYNDICATEFS_PID_FILENAME
+        )
+
+    def _save_syndicatefs_pid(self, mount_id, pid, cgroup_path=None):
+        # create_time guards against reuse of the pid
+        p = psutil.Process(pid)
+        state = {
+            "pid": pid,
+            "create_time": self._get_process_attr(p, "create_time"),
+            "cgroup": cgroup_path
+        }
+
+        pid_path = self._make_syndicatefs_pid_path(mount_id)
+        with open(pid_path, "w") as f:
+            json.dump(state, f)
+
+    def _get_syndicatefs_cgroup(self, mount_id):
+        pid_path = self._make_syndicatefs_pid_path(mount_id)
+        try:
+            with open(pid_path, "r") as f:
+                return json.load(f).get("cgroup")
+        except (IOError, ValueError):
+            return None
+
+    def _remove_syndicatefs_pid(self, mount_id):
+        pid_path = self._make_syndicatefs_pid_path(mount_id)
+        if os.path.exists(pid_path):
+            os.remove(pid_path)
+
+    def _get_syndicatefs_process(self, mount_id):
+        """
+        Return (tracked, process). tracked is False for mounts made before
+        pids were recorded. process is None if the tracked process is gone.
+        """
+        pid_path = self._make_syndicatefs_pid_path(mount_id)
+        try:
+            with open(pid_path, "r") as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return False, None
+
+        try:
+            p = psutil.Process(state["pid"])
+            if self._get_process_attr(p, "create_time") != state["create_time"]:
+                # pid is reused
+                return True, None
+            if self._get_process_attr(p, "status") == psutil.STATUS_ZOMBIE:
+                return True, None
+            return True, p
+        except psutil.NoSuchProcess:
+            return True, None
+
+    def _is_syndicatefs_running(self, mount_id):
+        tracked, process = self._get_syndicatefs_process(mount_id)
+        if tracked:
+            return process is not None
+
+        # legacy mounts - scan all processes
+        return len(self._get_processes(SYNDICATEFS_PROCESS_NAME)) > 0
+
+    def _get_latency_history(self):
+        if self.latency_history is None:
+            self.latency_history = sdm_latency_history.LatencyHistory(sdm_latency_history.DEFAULT_HISTORY_PATH)
+        return self.latency_history
+
+    def _record_latency(self, dataset, phase, duration):
+        # duration of None records a wait that timed out
+        try:
+            history = self._get_latency_history()
+            if duration is None:
+                history.record_timeout(dataset, phase)
+            else:
+                history.record(dataset, phase, duration)
+            history.save()
+        except (IOError, OSError), e:
+            sdm_util.log_message("Cannot save latency history : %s" % e, sdm_util.LogLevel.WARNING)
+
+    def _get_mount_timeout(self, dataset):
+        return self._get_latency_history().get_timeout(
+            dataset,
+            sdm_latency_history.LatencyPhase.MOUNT,
+            self.backend_config.mount_timeout,
+            self.backend_config.mount_timeout_factor,
+            self.backend_config.mount_timeout_min,
+            self.backend_config.mount_timeout_max
+        )
+
+    def _get_unmount_stage_timeout(self, dataset):
+        floor = self.backend_config.unmount_stage_timeout
+        if dataset is None:
+            return floor
+        return self._get_latency_history().get_timeout(
+            dataset,
+            sdm_latency_history.LatencyPhase.UNMOUNT,
+            floor,
+            UNMOUNT_STAGE_TIMEOUT_FACTOR,
+            floor,
+            max(floor, UNMOUNT_STAGE_TIMEOUT_MAX)
+        )
+
+    def _wait_mount(self, mount_id, mount_path, timeout=DEFAULT_MOUNT_TIMEOUT, retry=0):
+        start = time.time()
+        interval = COMMAND_POLL_INTERVAL_MAX
         trial = 0
         while True:
+            self.deadline.check("syndicatefs mount wait")
+
             # check processes
-            matching_processes = self._get_processes(SYNDICATEFS_PROCESS_NAME)
-            if len(matching_processes) == 0:
+            if not self._is_syndicatefs_running(mount_id):
                 trial += 1
                 if trial > retry:
                     raise FuseBackendException(
@@ -164,15 +537,56 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
                     # success
                     return
 
-            time.sleep(1)
-            tick += 1
-
-            if tick >= timeout:
-                raise FuseBackendException(
-                    "mount timed out - %s / %s" %
-                    (SYNDICATEFS_PROCESS_NAME, mount_path)
+            if time.time() - start >= timeout:
+                raise MountTimeoutException(
+                    "mount timed out after %.1f sec - %s / %s" %
+                    (timeout, SYNDICATEFS_PROCESS_NAME, mount_path)
                 )
 
+            # polled often at first so that recorded mount times are accurate
+            time.sleep(self.deadline.get_timeout("syndicatefs mount wait", interval))
+            interval = min(interval * 2, MOUNT_POLL_INTERVAL_MAX)
+
+    def _wait_process_exit(self, process, timeout):
+        try:
+            process.wait(timeout)
+            return True
+        except psutil.TimeoutExpired:
+            return False
+        except psutil.NoSuchProcess:
+            return True
+
+    def _stop_syndicatefs(self, mount_id, timeout):
+        """
+        Wait for the tracked syndicatefs to exit, then SIGTERM and SIGKILL it,
+        each waiting up to timeout. Returns (exited, [(stage, result)]).
+        """
+        outcome = []
+        tracked, process = self._get_syndicatefs_process(mount_id)
+        cgroup_path = self._get_syndicatefs_cgroup(mount_id)
+        exited = True
+        # syndicatefs exits after fusermount
+        if process and not self._wait_process_exit(process, timeout):
+            exited = False
+            for stage, send_signal in [(UnmountStage.TERM, process.terminate), (UnmountStage.KILL, process.kill)]:
+                sdm_util.log_message("Sending SIG%s to syndicatefs, pid %d" % (stage.upper(), process.pid), sdm_util.LogLevel.WARNING)
+                try:
+                    send_signal()
+                except psutil.NoSuchProcess:
+                    pass
+
+                exited = self._wait_process_exit(process, timeout)
+                if exited:
+                    outcome.append((stage, UnmountResult.EXITED))
+                    break
+                outcome.append((stage, UnmountResult.TIMEOUT))
+
+        if exited:
+            sdm_resource_limits.remove_cgroup(cgroup_path)
+            if tracked:
+                self._remove_syndicatefs_pid(mount_id)
+        return exited, outcome
+
     def _make_syndicate_configuration_path(self, mount_id):
         confing_path = "%s/syndicate.conf" % (
             self._make_syndicate_configuration_root_path(mount_id)
@@ -180,8 +594,13 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
         return confing_path
 
     def _make_syndicate_configuration_root_path(self, mount_id):
+        config_root = SYNDICATE_CONFIG_ROOT_PATH
+        if mount_id.startswith(SHARED_INSTANCE_PREFIX):
+            # shared instances live outside of the user's home
+            config_root = self.backend_config.shared_mount_root
+
         config_root_path = "%s/%s" % (
-            SYNDICATE_CONFIG_ROOT_PATH.rstrip("/"),
+            config_root.rstrip("/"),
             mount_id.strip().lower()
         )
         abs_config_root_path = sdm_util.get_abs_path(config_root_path)
@@ -189,6 +608,9 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
 
     def _make_syndicate_command(self, mount_id, debug_mode=False):
         conf_path = self._make_syndicate_configuration_path(mount_id)
+        return self._make_syndicate_command_with_config(conf_path, debug_mode)
+
+    def _make_syndicate_command_with_config(self, conf_path, debug_mode=False):
         debug_flag = ""
         if debug_mode:
             debug_flag = "-d"
@@ -201,45 +623,224 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
             debug_flag = "-d%d" % debug_level
         return "syndicatefs %s -c %s" % (debug_flag, conf_path)
 
-    def _run_command_foreground(self, command):
+    def _start_command(self, command):
+        sdm_util.log_message("Running an external process - %s" % command, sdm_util.LogLevel.DEBUG)
+        # output goes to a file so that waiting can be bounded
+        output_file = tempfile.TemporaryFile()
+        proc = subprocess.Popen(
+            shlex.split(command),
+            stderr=subprocess.STDOUT,
+            stdout=output_file
+        )
+        proc.output_file = output_file
+        return proc
+
+    def _wait_command(self, proc, phase="external process", deadline=None):
+        if deadline is None:
+            deadline = self.deadline
+
         try:
-            sdm_util.log_message("Running an external process - %s" % command, sdm_util.LogLevel.DEBUG)
-            proc = subprocess.Popen(
-                shlex.split(command),
-                stderr=subprocess.STDOUT,
-                stdout=subprocess.PIPE
+            interval = COMMAND_POLL_INTERVAL_MIN
+            while proc.poll() is None:
+                if deadline.is_expired():
+                    proc.kill()
+                    proc.wait()
+                    deadline.check(phase)
+                time.sleep(interval)
+                interval = min(interval * 2, COMMAND_POLL_INTERVAL_MAX)
+
+            proc.output_file.seek(0)
+            message = repr(proc.output_file.read())
+        finally:
+            proc.output_file.close()
+
+        rc = proc.returncode
+        if rc != 0:
+            raise FuseBackendException(
+                "Failed to run an external process - %d : %s" % (rc, message)
             )
 
-            stdout_value = proc.communicate()[0]
-            message = repr(stdout_value)
-            rc = proc.poll()
-            if rc != 0:
-                raise FuseBackendException(
-                    "Failed to run an external process - %d : %s" % (rc, message)
-                )
+    def _kill_command(self, proc):
+        try:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        except OSError:
+            pass
+        finally:
+            proc.output_file.close()
+
+    def _run_command_foreground(self, command, phase="external process", deadline=None):
+        try:
+            proc = self._start_command(command)
+            self._wait_command(proc, phase, deadline)
         except subprocess.CalledProcessError as err:
             raise FuseBackendException(
                 "> error code: %d, %s" % (err.returncode, err.output)
             )
 
-    def _run_command_background(self, command, log_path):
+    def _run_command_background(self, command, log_path, log_sink=sdm_log_sink.DEFAULT_LOG_SINK):
         try:
             sdm_util.log_message("Running an external process in background - %s" % command, sdm_util.LogLevel.DEBUG)
-            fd = open(log_path, "w")
-            fileno = fd.fileno()
-            proc = subprocess.Popen(
-                command,
-                stderr=subprocess.STDOUT,
-                stdout=fileno,
-                shell=True
-            )
-
+            # output goes through a sink process that bounds the log size
+            sink_fd = sdm_log_sink.start_log_sink(log_path, log_sink, self.backend_config.log_max_bytes)
+            try:
+                # the child keeps its own copy of the sink fd
+                return subprocess.Popen(
+                    shlex.split(command),
+                    stderr=subprocess.STDOUT,
+                    stdout=sink_fd,
+                    close_fds=True
+                )
+            finally:
+                sink_fd.close()
+        except sdm_log_sink.LogSinkException, e:
+            raise FuseBackendException(e)
         except subprocess.CalledProcessError as err:
             raise FuseBackendException(
                 "> error code: %d, %s" % (err.returncode, err.output)
             )
 
-    def _setup_syndicate(self, mount_id, dataset, username, user_pkey, gateway_name, ms_host, debug_mode=False, cache_size_limit=DEFAULT_SYNDICATE_CACHE_MAX):
+    def _make_syndicate_user_configuration_root_path(self, username, ms_host):
+        user_key = hashlib.sha256("%s@%s" % (username.strip(), ms_host.strip())).hexdigest().lower()
+        config_root_path = "%s/%s" % (
+            SYNDICATE_USER_CONFIG_ROOT_PATH.rstrip("/"),
+            user_key
+        )
+        abs_config_root_path = sdm_util.get_abs_path(config_root_path)
+        return abs_config_root_path
+
+    def _make_syndicate_user_configuration_path(self, user_config_root_path):
+        return "%s/syndicate.conf" % user_config_root_path
+
+    def _lock_file(self, lock_path, phase):
+        parent = os.path.dirname(lock_path)
+        if not os.path.exists(parent):
+            os.makedirs(parent, 0755)
+
+        lock_fd = open(lock_path, "a")
+        while True:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_fd
+            except IOError:
+                if self.deadline.is_expired():
+                    lock_fd.close()
+                    self.deadline.check(phase)
+                time.sleep(COMMAND_POLL_INTERVAL_MAX)
+
+    def _unlock_file(self, lock_fd):
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        lock_fd.close()
+
+    def _lock_syndicate_user(self, user_config_root_path):
+        lock_path = "%s/%s" % (user_config_root_path, SYNDICATE_USER_LOCK_FILENAME)
+        return self._lock_file(lock_path, "syndicate user lock")
+
+    def _unlock_syndicate_user(self, lock_fd):
+        self._unlock_file(lock_fd)
+
+    def _load_syndicate_user_refs(self, user_config_root_path):
+        refs_path = "%s/%s" % (user_config_root_path, SYNDICATE_USER_REFS_FILENAME)
+        try:
+            with open(refs_path, "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return []
+
+    def _save_syndicate_user_refs(self, user_config_root_path, refs):
+        refs_path = "%s/%s" % (user_config_root_path, SYNDICATE_USER_REFS_FILENAME)
+        with open(refs_path, "w") as f:
+            json.dump(refs, f)
+
+    def _get_syndicate_user_configuration_root_path(self, mount_id):
+        # returns None for mounts set up without a shared user configuration
+        mount_user_path = "%s/%s" % (
+            self._make_syndicate_configuration_root_path(mount_id),
+            SYNDICATE_MOUNT_USER_FILENAME
+        )
+        try:
+            with open(mount_user_path, "r") as f:
+                return json.load(f)["user_config_root_path"]
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def _is_syndicate_user_set_up(self, user_config_root_path):
+        done_path = "%s/%s" % (user_config_root_path, SYNDICATE_USER_SETUP_DONE_FILENAME)
+        if os.path.exists(done_path):
+            return True
+
+        user_config_path = self._make_syndicate_user_configuration_path(user_config_root_path)
+        if os.path.exists(user_config_path) and len(self._load_syndicate_user_refs(user_config_root_path)) > 0:
+            # set up before the marker was written, mounts are using it
+            open(done_path, "w").close()
+            return True
+        return False
+
+    def _setup_syndicate_user(self, user_config_root_path, username, user_pkey, ms_host, debug_mode=False):
+        user_config_path = self._make_syndicate_user_configuration_path(user_config_root_path)
+        if self._is_syndicate_user_set_up(user_config_root_path):
+            # already set up by another mount
+            return False
+
+        if os.path.exists(user_config_path):
+            # left by a setup that failed - start over
+            sdm_util.log_message("Retrying Syndicate setup for an user, %s" % username, sdm_util.LogLevel.WARNING)
+            os.remove(user_config_path)
+
+        sdm_util.log_message("Setting up Syndicate for an user, %s" % username)
+        user_pkey_fd, user_pkey_path = tempfile.mkstemp()
+        f = os.fdopen(user_pkey_fd, "w")
+        f.write(user_pkey)
+        f.close()
+
+        command_register = "%s --trust_public_key setup %s %s %s" % (
+            self._make_syndicate_command_with_config(user_config_path, debug_mode),
+            username.strip(),
+            user_pkey_path,
+            ms_host.strip()
+        )
+
+        try:
+            self._run_command_foreground(command_register, "syndicate user setup")
+            open("%s/%s" % (user_config_root_path, SYNDICATE_USER_SETUP_DONE_FILENAME), "w").close()
+            sdm_util.log_message("Successfully set up Syndicate for an user, %s" % username)
+        finally:
+            os.remove(user_pkey_path)
+        return True
+
+    def _setup_syndicate_mount(self, user_config_root_path, mount_id, cache_size_limit=DEFAULT_SYNDICATE_CACHE_MAX):
+        # derive the mount configuration from the shared user configuration.
+        # user state stays shared, volume and gateway state becomes per-mount.
+        config_root_path = self._make_syndicate_configuration_root_path(mount_id)
+        config_path = self._make_syndicate_configuration_path(mount_id)
+        user_config_path = self._make_syndicate_user_configuration_path(user_config_root_path)
+
+        lines = []
+        with open(user_config_path, "r") as uf:
+            for line in uf:
+                if "=" in line:
+                    k, v = line.split("=", 1)
+                    if k.strip() not in SYNDICATE_SHARED_CONFIG_KEYS and v.strip().startswith(user_config_root_path):
+                        local_path = config_root_path + v.strip()[len(user_config_root_path):]
+                        if not os.path.exists(local_path):
+                            os.makedirs(local_path, 0755)
+                        line = "%s=%s\n" % (k.rstrip(), local_path)
+                lines.append(line)
+
+        with open(config_path, "w") as cf:
+            cf.writelines(lines)
+
+            # set local cache size
+            cf.write("\n[gateway]\n")
+            cf.write("cache_size_limit=%d\n" % cache_size_limit)
+
+        mount_user_path = "%s/%s" % (config_root_path, SYNDICATE_MOUNT_USER_FILENAME)
+        with open(mount_user_path, "w") as f:
+            json.dump({"user_config_root_path": user_config_root_path}, f)
+
+    def _setup_syndicate(self, mount_id, dataset, username, user_pkey, gateway_name, ms_host, debug_mode=False, cache_size_limit=DEFAULT_SYNDICATE_CACHE_MAX, cert_ttl=DEFAULT_SYNDICATE_CERT_TTL, refresh_certs=False):
+        start = time.time()
         config_root_path = self._make_syndicate_configuration_root_path(mount_id)
         if not os.path.exists(config_root_path):
             os.makedirs(config_root_path, 0755)
@@ -251,59 +852,219 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
             skip_config = True
 
         syndicate_command = self._make_syndicate_command(mount_id, debug_mode)
-
+        user_config_root_path = self._get_syndicate_user_configuration_root_path(mount_id)
         if not skip_config:
-            sdm_util.log_message("Setting up Syndicate for an user, %s" % username)
-            user_pkey_fd, user_pkey_path = tempfile.mkstemp()
-            f = os.fdopen(user_pkey_fd, "w")
-            f.write(user_pkey)
-            f.close()
-
-            command_register = "%s --trust_public_key setup %s %s %s" % (
-                syndicate_command,
-                username.strip(),
-                user_pkey_path,
-                ms_host.strip()
-            )
+            user_config_root_path = self._make_syndicate_user_configuration_root_path(username, ms_host)
 
-            try:
-                self._run_command_foreground(command_register)
-                sdm_util.log_message("Successfully set up Syndicate for an user, %s" % username)
-            finally:
-                os.remove(user_pkey_path)
+        volume_certs = [
+            ("volume", dataset.strip().lower()),
+            ("gateway", gateway_name.strip().lower())
+        ]
+        user_cert = ("user", username.strip())
 
-            # set local cache size
-            with open(config_path, "a") as cf:
-                cf.write("\n[gateway]\n")
-                cf.write("cache_size_limit=%d\n" % cache_size_limit)
+        if user_config_root_path is None:
+            # a mount configured with its own user state
+            self._reload_certs(config_root_path, syndicate_command, [user_cert] + volume_certs, cert_ttl, refresh_certs)
+            self._record_latency(dataset, sdm_latency_history.LatencyPhase.SETUP, time.time() - start)
+            return
 
-        command_reload_user_cert = "%s reload_user_cert %s" % (
-            syndicate_command,
-            username.strip()
-        )
-        command_reload_volume_cert = "%s reload_volume_cert %s" % (
-            syndicate_command,
-            dataset.strip().lower()
+        user_syndicate_command = self._make_syndicate_command_with_config(
+            self._make_syndicate_user_configuration_path(user_config_root_path),
+            debug_mode
         )
-        command_reload_gatway_cert = "%s reload_gateway_cert %s" % (
-            syndicate_command,
-            gateway_name.strip().lower()
+
+        # volume and gateway certs are reloaded while the user cert is
+        # being reloaded under the lock of the shared user configuration
+        volume_procs = None
+        succeeded = False
+        lock_fd = self._lock_syndicate_user(user_config_root_path)
+        try:
+            refresh_user_cert = refresh_certs
+            if self._setup_syndicate_user(user_config_root_path, username, user_pkey, ms_host, debug_mode):
+                refresh_user_cert = True
+
+            refs = self._load_syndicate_user_refs(user_config_root_path)
+            if mount_id not in refs:
+                refs.append(mount_id)
+                self._save_syndicate_user_refs(user_config_root_path, refs)
+
+            if not skip_config:
+                self._setup_syndicate_mount(user_config_root_path, mount_id, cache_size_limit)
+                # certs of a new configuration are never fresh
+                refresh_certs = True
+
+            volume_procs = self._start_reload_certs(config_root_path, syndicate_command, volume_certs, cert_ttl, refresh_certs)
+            self._reload_certs(user_config_root_path, user_syndicate_command, [user_cert], cert_ttl, refresh_user_cert)
+            succeeded = True
+        finally:
+            self._unlock_syndicate_user(lock_fd)
+            if volume_procs:
+                if succeeded:
+                    self._finish_reload_certs(config_root_path, volume_procs)
+                else:
+                    # keep the error that got us here
+                    try:
+                        self._finish_reload_certs(config_root_path, volume_procs)
+                    except Exception, e:
+                        sdm_util.log_message("Cannot finish reloading certs of %s : %s" % (dataset, e), sdm_util.LogLevel.WARNING)
+
+        self._record_latency(dataset, sdm_latency_history.LatencyPhase.SETUP, time.time() - start)
+
+    def _make_cert_state_path(self, config_root_path):
+        cert_state_path = "%s/%s" % (
+            config_root_path,
+            SYNDICATE_CERT_STATE_FILENAME
         )
+        return cert_state_path
+
+    def _load_cert_state(self, config_root_path):
+        cert_state_path = self._make_cert_state_path(config_root_path)
+        try:
+            with open(cert_state_path, "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _save_cert_state(self, config_root_path, cert_state):
+        cert_state_path = self._make_cert_state_path(config_root_path)
+        with open(cert_state_path, "w") as f:
+            json.dump(cert_state, f, sort_keys=True, indent=4, separators=(',', ': '))
+
+    def _is_cert_filename(self, filename, name):
+        # syndicate stores <name>.<ext>, e.g. refseq.cert and refseq.pkey -
+        # "ref" must not match files of "refseq" or "ref.seq"
+        if not filename.startswith(name + "."):
+            return False
+        ext = filename[len(name) + 1:]
+        return len(ext) > 0 and "." not in ext
+
+    def _get_cert_fingerprint(self, config_root_path, kind, name):
+        # fingerprint of cert files stored by syndicate for the given name
+        cert_dir = "%s/%s" % (config_root_path, SYNDICATE_CERT_DIRS[kind])
+        if not os.path.isdir(cert_dir):
+            return None
+
+        digest = hashlib.sha256()
+        found = False
+        for filename in sorted(os.listdir(cert_dir)):
+            if not self._is_cert_filename(filename, name):
+                continue
+
+            cert_path = "%s/%s" % (cert_dir, filename)
+            if not os.path.isfile(cert_path):
+                continue
+
+            found = True
+            digest.update(filename)
+            with open(cert_path, "rb") as f:
+                digest.update(f.read())
+
+        if not found:
+            return None
+        return digest.hexdigest()
+
+    def _is_cert_fresh(self, config_root_path, cert_state, kind, name, cert_ttl):
+        if kind not in cert_state:
+            return False
+
+        state = cert_state[kind]
+        if state.get("name") != name:
+            return False
+
+        if time.time() - state.get("fetched_at", 0) > cert_ttl:
+            return False
+
+        fingerprint = self._get_cert_fingerprint(config_root_path, kind, name)
+        if fingerprint is None or fingerprint != state.get("fingerprint"):
+            return False
+        return True
+
+    def _start_reload_certs(self, config_root_path, syndicate_command, certs, cert_ttl=DEFAULT_SYNDICATE_CERT_TTL, refresh_certs=False):
+        cert_state = self._load_cert_state(config_root_path)
+
+        # reloads are independent of each other - run them concurrently
+        procs = []
+        for kind, name in certs:
+            if not refresh_certs and self._is_cert_fresh(config_root_path, cert_state, kind, name, cert_ttl):
+                sdm_util.log_message("Skipped reloading a fresh %s cert, %s" % (kind, name))
+                continue
+
+            command = "%s reload_%s_cert %s" % (syndicate_command, kind, name)
+            procs.append((kind, name, self._start_command(command)))
+        return procs
+
+    def _finish_reload_certs(self, config_root_path, procs):
+        if len(procs) == 0:
+            return
+
+        error = None
+        remaining = list(procs)
+        try:
+            while len(remaining) > 0:
+                kind, _, proc = remaining.pop(0)
+                try:
+                    self._wait_command(proc, "%s cert reload" % kind)
+                except FuseBackendException, e:
+                    if error is None:
+                        error = e
+        finally:
+            # a deadline cut the wait short - do not leave the others behind
+            for _, _, proc in remaining:
+                self._kill_command(proc)
+
+        if error:
+            raise error
 
-        self._run_command_foreground(command_reload_user_cert)
-        sdm_util.log_message("Successfully reloaded a user cert, %s" % username)
-        self._run_command_foreground(command_reload_volume_cert)
-        sdm_util.log_message("Successfully reloaded a volume cert, %s" % dataset)
-        self._run_command_foreground(command_reload_gatway_cert)
-        sdm_util.log_message("Successfully reloaded a gateway cert, %s" % gateway_name)
+        cert_state = self._load_cert_state(config_root_path)
+        now = time.time()
+        for kind, name, _ in procs:
+            sdm_util.log_message("Successfully reloaded a %s cert, %s" % (kind, name))
+            cert_state[kind] = {
+                "name": name,
+                "fingerprint": self._get_cert_fingerprint(config_root_path, kind, name),
+                "fetched_at": now
+            }
+
+        self._save_cert_state(config_root_path, cert_state)
+
+    def _get_cert_expiry(self, config_root_path, cert_ttl):
+        # returns None if no cert has been reloaded
+        fetched = []
+        for state in self._load_cert_state(config_root_path).values():
+            fetched.append(state.get("fetched_at", 0))
+
+        if len(fetched) == 0:
+            return None
+        return min(fetched) + cert_ttl
+
+    def _reload_certs(self, config_root_path, syndicate_command, certs, cert_ttl=DEFAULT_SYNDICATE_CERT_TTL, refresh_certs=False):
+        procs = self._start_reload_certs(config_root_path, syndicate_command, certs, cert_ttl, refresh_certs)
+        self._finish_reload_certs(config_root_path, procs)
 
     def _remove_syndicate_setup(self, mount_id):
+        user_config_root_path = self._get_syndicate_user_configuration_root_path(mount_id)
+
         config_root_path = self._make_syndicate_configuration_root_path(mount_id)
         if os.path.exists(config_root_path):
             shutil.rmtree(config_root_path)
             sdm_util.log_message("Successfully removed Syndicate at %s" % config_root_path)
 
-    def _mount_syndicatefs(self, mount_id, dataset, gateway_name, mount_path, debug_mode=False, debug_level=1, use_valgrind=False):
+        if user_config_root_path and os.path.exists(user_config_root_path):
+            lock_fd = self._lock_syndicate_user(user_config_root_path)
+            try:
+                refs = self._load_syndicate_user_refs(user_config_root_path)
+                if mount_id in refs:
+                    refs.remove(mount_id)
+                    self._save_syndicate_user_refs(user_config_root_path, refs)
+
+                if len(refs) == 0:
+                    # the last mount of the user is gone
+                    shutil.rmtree(user_config_root_path)
+                    sdm_util.log_message("Successfully removed Syndicate at %s" % user_config_root_path)
+            finally:
+                self._unlock_syndicate_user(lock_fd)
+
+    def _mount_syndicatefs(self, mount_id, dataset, gateway_name, mount_path, debug_mode=False, debug_level=1, use_valgrind=False, log_sink=sdm_log_sink.DEFAULT_LOG_SINK, fuse_options=None):
         sdm_util.log_message("Mounting syndicatefs, %s to %s" % (dataset, mount_path))
 
         abs_mount_path = sdm_util.get_abs_path(mount_path)
@@ -319,6 +1080,10 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
         if debug_mode and use_valgrind:
             command_format = "valgrind " + command_format
 
+        fuse_flags = render_fuse_options(fuse_options or {})
+        if fuse_flags:
+            syndicatefs_command = "%s %s" % (syndicatefs_command, fuse_flags)
+
         command_mount = command_format % (
             syndicatefs_command,
             dataset,
@@ -326,39 +1091,468 @@ class FuseBackend(sdm_absbackends.AbstractBackend):
             abs_mount_path
         )
 
-        self._run_command_background(command_mount, syndicatefs_log_path)
-        self._wait_mount(abs_mount_path, retry=3)
+        cgroup_path = self._make_syndicatefs_cgroup(mount_id)
+
+        timeout = self._get_mount_timeout(dataset)
+        sdm_util.log_message("Waiting up to %.1f sec for syndicatefs to mount %s" % (timeout, dataset))
+
+        start = time.time()
+        proc = self._run_command_background(command_mount, syndicatefs_log_path, log_sink)
+        cgroup_path = self._apply_resource_limits(proc.pid, cgroup_path)
+        self._save_syndicatefs_pid(mount_id, proc.pid, cgroup_path)
+        try:
+            self._wait_mount(mount_id, abs_mount_path, timeout, retry=3)
+        except Exception, e:
+            if isinstance(e, MountTimeoutException):
+                # the next wait of a slow dataset is longer
+                self._record_latency(dataset, sdm_latency_history.LatencyPhase.MOUNT, None)
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            self._remove_syndicatefs_pid(mount_id)
+            sdm_resource_limits.remove_cgroup(cgroup_path)
+            # the sink writes out what it kept once syndicatefs is gone
+            sdm_util.log_message("syndicatefs output is kept at %s" % syndicatefs_log_path, sdm_util.LogLevel.WARNING)
+            raise
+        self._record_latency(dataset, sdm_latency_history.LatencyPhase.MOUNT, time.time() - start)
         sdm_util.log_message("Successfully mounted syndicatefs, %s to %s" % (dataset, abs_mount_path))
 
-    def _unmount_syndicatefs(self, mount_path):
+    def _make_syndicatefs_cgroup(self, mount_id):
+        """
+        Return the path of a cgroup made for syndicatefs of the mount, or None
+        """
+        limits = self.backend_config.resource_limits
+        if not limits.cgroup:
+            return None
+
+        try:
+            return sdm_resource_limits.create_cgroup(limits, "syndicatefs-%s" % mount_id[:12])
+        except sdm_resource_limits.ResourceLimitsException, e:
+            # e.g. cgroups are not delegated to the user
+            sdm_util.log_message("Cannot use a cgroup, applying nice, ionice and CPU affinity only : %s" % e, sdm_util.LogLevel.WARNING)
+            return None
+
+    def _apply_resource_limits(self, pid, cgroup_path):
+        """
+        Move a started syndicatefs to its cgroup and apply process limits.
+        Returns the path of the cgroup the process is in, or None.
+        """
+        if cgroup_path:
+            try:
+                sdm_resource_limits.join_cgroup(cgroup_path, pid)
+            except sdm_resource_limits.ResourceLimitsException, e:
+                sdm_util.log_message("Cannot use a cgroup, applying nice, ionice and CPU affinity only : %s" % e, sdm_util.LogLevel.WARNING)
+                sdm_resource_limits.remove_cgroup(cgroup_path)
+                cgroup_path = None
+
+        limits = self.backend_config.resource_limits
+        if limits.has_process_limits():
+            try:
+                sdm_resource_limits.apply_process_limits(limits, pid)
+            except sdm_resource_limits.ResourceLimitsException, e:
+                # e.g. a negative nice needs privileges
+                sdm_util.log_message(e, sdm_util.LogLevel.WARNING)
+        return cgroup_path
+
+    def _run_fusermount(self, mount_path, lazy, timeout):
+        flags = "-u"
+        if lazy:
+            flags = "-u -z"
+
         try:
-            command_unmount = "fusermount -u %s" % mount_path
-            self._run_command_foreground(command_unmount)
+            # a wedged syndicatefs can block fusermount - bound it by its own deadline
+            self._run_command_foreground("fusermount %s %s" % (flags, mount_path), "fusermount unmount", sdm_deadline.Deadline(timeout))
+            return UnmountResult.OK
+        except sdm_deadline.DeadlineExceededException:
+            return UnmountResult.TIMEOUT
         except FuseBackendException, e:
             if "not found" in str(e):
+                # it's already unmounted
+                return UnmountResult.NOT_MOUNTED
+            # e.g. device or resource busy
+            sdm_util.log_message("Cannot unmount %s : %s" % (mount_path, e), sdm_util.LogLevel.WARNING)
+            return UnmountResult.FAILED
+
+    def _unmount_syndicatefs(self, mount_id, mount_path, dataset=None):
+        """
+        Unmount in stages, each bounded by unmount_stage_timeout - fusermount,
+        a lazy detach, then SIGTERM and SIGKILL to syndicatefs.
+        Returns [(stage, result)]. Raises UnmountException if the mount or
+        syndicatefs is left behind.
+        """
+        timeout = self._get_unmount_stage_timeout(dataset)
+        start = time.time()
+        outcome = []
+        detached = False
+        for stage, lazy in [(UnmountStage.UNMOUNT, False), (UnmountStage.LAZY, True)]:
+            result = self._run_fusermount(mount_path, lazy, timeout)
+            outcome.append((stage, result))
+            if result in [UnmountResult.OK, UnmountResult.NOT_MOUNTED]:
+                detached = True
+                break
+
+        exited, stop_outcome = self._stop_syndicatefs(mount_id, timeout)
+        outcome.extend(stop_outcome)
+
+        if not detached and exited:
+            # a mount of a dead syndicatefs can be detached
+            result = self._run_fusermount(mount_path, True, timeout)
+            outcome.append((UnmountStage.LAZY, result))
+            detached = result in [UnmountResult.OK, UnmountResult.NOT_MOUNTED]
+
+        outcome_str = format_unmount_outcome(outcome)
+        sdm_util.log_message("Unmount of %s : %s" % (mount_path, outcome_str))
+        if not detached:
+            raise sdm_absbackends.UnmountException("cannot unmount %s - %s" % (mount_path, outcome_str), outcome_str)
+        if not exited:
+            raise sdm_absbackends.UnmountException("syndicatefs of %s does not exit - %s" % (mount_path, outcome_str), outcome_str)
+
+        if dataset is not None and outcome == [(UnmountStage.UNMOUNT, UnmountResult.OK)]:
+            # unmounts cut short by a stage timeout tell nothing of how long they take
+            self._record_latency(dataset, sdm_latency_history.LatencyPhase.UNMOUNT, time.time() - start)
+        return outcome
+
+    def _make_shared_instance_id(self, dataset, gateway_name):
+        seed = "%s|%s" % (dataset.strip().lower(), gateway_name.strip().lower())
+        return SHARED_INSTANCE_PREFIX + hashlib.sha256(seed).hexdigest()[:16]
+
+    def _make_shared_instance_mount_path(self, instance_id):
+        return "%s/%s" % (
+            self._make_syndicate_configuration_root_path(instance_id),
+            SHARED_INSTANCE_MOUNT_DIRNAME
+        )
+
+    def _lock_shared_instance(self, instance_id):
+        # the lock lives outside of the instance so that teardown can remove it
+        lock_path = "%s.lock" % self._make_syndicate_configuration_root_path(instance_id)
+        return self._lock_file(lock_path, "shared mount lock")
+
+    def _load_shared_instance_refs(self, instance_id):
+        refs_path = "%s/%s" % (self._make_syndicate_configuration_root_path(instance_id), SHARED_INSTANCE_REFS_FILENAME)
+        try:
+            with open(refs_path, "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return []
+
+    def _save_shared_instance_refs(self, instance_id, refs):
+        config_root_path = self._make_syndicate_configuration_root_path(instance_id)
+        if not os.path.exists(config_root_path):
+            os.makedirs(config_root_path, 0755)
+
+        refs_path = "%s/%s" % (config_root_path, SHARED_INSTANCE_REFS_FILENAME)
+        with open(refs_path, "w") as f:
+            json.dump(refs, f)
+
+    def _load_live_shared_instance_refs(self, instance_id):
+        # a process that crashed before unmounting leaves its ref behind,
+        # the ref is alive only while its bind mount is still there
+        refs = []
+        for ref in self._load_shared_instance_refs(instance_id):
+            if len(self._get_fuse_mounts(SYNDICATEFS_PROCESS_NAME, ref["mount_path"])) > 0:
+                refs.append(ref)
+            else:
+                sdm_util.log_message("Dropping a stale reference of a shared syndicatefs %s - %s" % (instance_id, ref["mount_path"]), sdm_util.LogLevel.WARNING)
+        return refs
+
+    def _get_shared_instance_id(self, mount_id):
+        # returns None for mounts running their own syndicatefs
+        mount_shared_path = "%s/%s" % (
+            self._make_syndicate_configuration_root_path(mount_id),
+            SYNDICATE_MOUNT_SHARED_FILENAME
+        )
+        try:
+            with open(mount_shared_path, "r") as f:
+                return json.load(f)["instance_id"]
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def _set_shared_instance_id(self, mount_id, instance_id):
+        config_root_path = self._make_syndicate_configuration_root_path(mount_id)
+        if not os.path.exists(config_root_path):
+            os.makedirs(config_root_path, 0755)
+
+        mount_shared_path = "%s/%s" % (config_root_path, SYNDICATE_MOUNT_SHARED_FILENAME)
+        with open(mount_shared_path, "w") as f:
+            json.dump({"instance_id": instance_id}, f)
+
+    def _clear_shared_instance_id(self, mount_id):
+        mount_shared_path = "%s/%s" % (
+            self._make_syndicate_configuration_root_path(mount_id),
+            SYNDICATE_MOUNT_SHARED_FILENAME
+        )
+        if os.path.exists(mount_shared_path):
+            os.remove(mount_shared_path)
+
+    def _is_shared_instance_mounted(self, instance_id):
+        if not self._is_syndicatefs_running(instance_id):
+            return False
+
+        instance_mount_path = self._make_shared_instance_mount_path(instance_id)
+        return len(self._get_fuse_mounts(SYNDICATEFS_PROCESS_NAME, instance_mount_path)) > 0
+
+    def _bind_mount(self, source_path, mount_path):
+        abs_mount_path = sdm_util.get_abs_path(mount_path)
+        if not os.path.exists(abs_mount_path):
+            os.makedirs(abs_mount_path, 0755)
+
+        self._run_command_foreground("mount --bind %s %s" % (source_path, abs_mount_path), "bind mount")
+        try:
+            self._run_command_foreground("mount -o remount,bind,ro %s" % abs_mount_path, "bind mount")
+        except Exception:
+            self._run_command_foreground("umount %s" % abs_mount_path, "bind unmount")
+            raise
+
+    def _bind_unmount(self, mount_path):
+        try:
+            self._run_command_foreground("umount %s" % mount_path, "bind unmount")
+        except FuseBackendException, e:
+            if "not mounted" in str(e) or "not found" in str(e):
                 # it's already unmounted - skip
                 pass
             else:
                 raise e
 
-    def mount(self, mount_id, ms_host, dataset, username, user_pkey, gateway_name, mount_path):
+    def _check_shared_mount_privilege(self):
+        # a shared instance is owned by root so that no user can stop it for
+        # others, and bind mounts need root anyway
+        if os.getuid() != 0:
+            raise FuseBackendException("shared mounts need root - run sdm with sudo or turn off shared_mount")
+
+    def _mount_shared(self, mount_id, ms_host, dataset, username, user_pkey, gateway_name, mount_path, mount_options):
+        self._check_shared_mount_privilege()
+        instance_id = self._make_shared_instance_id(dataset, gateway_name)
+        instance_mount_path = self._make_shared_instance_mount_path(instance_id)
+
+        lock_fd = self._lock_shared_instance(instance_id)
+        try:
+            started = False
+            if not self._is_shared_instance_mounted(instance_id):
+                sdm_util.log_message("Starting a shared syndicatefs, %s" % instance_id)
+                if os.path.exists(instance_mount_path):
+                    # clear a stale instance
+                    self._unmount_syndicatefs(instance_id, instance_mount_path)
+                # the first mount of an instance decides its options.
+                # allow_other is refused in FUSE options but other users
+                # reach the instance through their bind mounts.
+                fuse_options = dict(mount_options["fuse_options"])
+                fuse_options["allow_other"] = True
+                self._setup_syndicate(instance_id, dataset, username, user_pkey, gateway_name, ms_host, mount_options["debug_mode"], mount_options["cache_size"], self.backend_config.syndicate_cert_ttl, self.refresh_certs)
+                self._mount_syndicatefs(instance_id, dataset, gateway_name, instance_mount_path, mount_options["debug_mode"], mount_options["debug_level"], mount_options["use_valgrind"], mount_options["log_sink"], fuse_options)
+                started = True
+
+            refs = self._load_live_shared_instance_refs(instance_id)
+            try:
+                self._bind_mount(instance_mount_path, mount_path)
+            except Exception:
+                if started or len(refs) == 0:
+                    # nothing uses the instance, do not leave it running
+                    sdm_util.log_message("Stopping a shared syndicatefs with no references, %s" % instance_id)
+                    try:
+                        self._unmount_syndicatefs(instance_id, instance_mount_path)
+                        self._remove_syndicate_setup(instance_id)
+                    except FuseBackendException, e:
+                        sdm_util.log_message("Could not stop a shared syndicatefs %s : %s" % (instance_id, e), sdm_util.LogLevel.WARNING)
+                raise
+            self._set_shared_instance_id(mount_id, instance_id)
+
+            ref = {
+                "uid": get_invoking_uid(),
+                "mount_id": mount_id,
+                "mount_path": sdm_util.get_abs_path(mount_path)
+            }
+            if ref not in refs:
+                refs.append(ref)
+            self._save_shared_instance_refs(instance_id, refs)
+            sdm_util.log_message("A shared syndicatefs %s has %d references" % (instance_id, len(refs)))
+        finally:
+            self._unlock_file(lock_fd)
+
+    def _unmount_shared(self, instance_id, mount_id, mount_path, dataset=None):
+        self._check_shared_mount_privilege()
+        abs_mount_path = sdm_util.get_abs_path(mount_path)
+        uid = get_invoking_uid()
+
+        lock_fd = self._lock_shared_instance(instance_id)
+        try:
+            refs = []
+            for ref in self._load_live_shared_instance_refs(instance_id):
+                if ref["mount_path"] == abs_mount_path and ref["uid"] != uid:
+                    raise FuseBackendException("%s is mounted by another user - uid %d" % (abs_mount_path, ref["uid"]))
+                if ref["mount_id"] == mount_id and ref["mount_path"] == abs_mount_path:
+                    continue
+                refs.append(ref)
+
+            self._bind_unmount(abs_mount_path)
+
+            if len(refs) > 0:
+                self._save_shared_instance_refs(instance_id, refs)
+                sdm_util.log_message("A shared syndicatefs %s has %d references" % (instance_id, len(refs)))
+                return
+
+            # the last reference is released
+            sdm_util.log_message("Stopping a shared syndicatefs, %s" % instance_id)
+            outcome = self._unmount_syndicatefs(instance_id, self._make_shared_instance_mount_path(instance_id), dataset)
+            self._remove_syndicate_setup(instance_id)
+            return outcome
+        finally:
+            self._unlock_file(lock_fd)
+
+    def _save_warm_state(self, mount_id, dataset, cert_expires_at):
+        mount_warm_path = "%s/%s" % (
+            self._make_syndicate_configuration_root_path(mount_id),
+            SYNDICATE_MOUNT_WARM_FILENAME
+        )
+        with open(mount_warm_path, "w") as f:
+            json.dump({
+                "dataset": dataset,
+                "prepared_at": time.time(),
+                "cert_expires_at": cert_expires_at
+            }, f)
+
+    def prepare(self, mount_id, ms_host, dataset, username, user_pkey, gateway_name):
+        sdm_util.log_message("Preparing a dataset %s" % dataset)
+        mount_options = self._make_mount_options(None, dataset)
+        if self.backend_config.shared_mount:
+            # warm up the shared instance mounts will use
+            self._check_shared_mount_privilege()
+            mount_id = self._make_shared_instance_id(dataset, gateway_name)
+            lock_fd = self._lock_shared_instance(mount_id)
+            try:
+                self._setup_syndicate(mount_id, dataset, username, user_pkey, gateway_name, ms_host, mount_options["debug_mode"], mount_options["cache_size"], self.backend_config.syndicate_cert_ttl, self.refresh_certs)
+            finally:
+                self._unlock_file(lock_fd)
+        else:
+            self._setup_syndicate(mount_id, dataset, username, user_pkey, gateway_name, ms_host, mount_options["debug_mode"], mount_options["cache_size"], self.backend_config.syndicate_cert_ttl, self.refresh_certs)
+
+        cert_ttl = self.backend_config.syndicate_cert_ttl
+        expiries = [self._get_cert_expiry(self._make_syndicate_configuration_root_path(mount_id), cert_ttl)]
+        user_config_root_path = self._get_syndicate_user_configuration_root_path(mount_id)
+        if user_config_root_path:
+            expiries.append(self._get_cert_expiry(user_config_root_path, cert_ttl))
+
+        expiries = [e for e in expiries if e is not None]
+        cert_expires_at = None
+        if len(expiries) > 0:
+            cert_expires_at = min(expiries)
+
+        self._save_warm_state(mount_id, dataset, cert_expires_at)
+        sdm_util.log_message("Successfully prepared a dataset %s" % dataset)
+        return cert_expires_at
+
+    def _make_mount_options(self, options, dataset=None):
+        # config < profile < options given to the mount
+        mount_options = {
+            "profile": self.backend_config.profile,
+            "debug_mode": self.backend_config.syndicate_debug_mode,
+            "debug_level": self.backend_config.syndicate_debug_level,
+            "use_valgrind": self.backend_config.use_valgrind,
+            "cache_size": self.backend_config.syndicate_cache_max,
+            "log_sink": self.backend_config.log_sink
+        }
+        if options is None:
+            options = {}
+
+        profile = options.get("profile", self.backend_config.profile)
+        if profile:
+            if profile not in FUSE_PROFILES:
+                raise FuseBackendException("unknown profile - %s, choose from %s" % (profile, ", ".join(sorted(FUSE_PROFILES.keys()))))
+            mount_options.update(FUSE_PROFILES[profile])
+            mount_options["profile"] = profile
+
+        # config < catalogue hints < per-dataset config
+        options = dict(options)
+        fuse_options = dict(self.backend_config.fuse_options)
+        try:
+            fuse_options = merge_fuse_options(fuse_options, validate_fuse_options(options.pop("fuse_hints", None) or {}))
+        except FuseBackendException, e:
+            # a bad hint should not keep a dataset from mounting
+            sdm_util.log_message("Ignoring FUSE options suggested by the catalogue : %s" % e, sdm_util.LogLevel.WARNING)
+        if dataset:
+            fuse_options = merge_fuse_options(fuse_options, self.backend_config.dataset_fuse_options.get(dataset.strip().lower(), {}))
+        mount_options["fuse_options"] = fuse_options
+
+        mount_options.update(options)
+        return mount_options
+
+    def _make_mount_options_path(self, mount_id):
+        return "%s/%s" % (
+            self._make_syndicate_configuration_root_path(mount_id),
+            SYNDICATE_MOUNT_OPTIONS_FILENAME
+        )
+
+    def _save_mount_options(self, mount_id, mount_options):
+        config_root_path = self._make_syndicate_configuration_root_path(mount_id)
+        if not os.path.exists(config_root_path):
+            os.makedirs(config_root_path, 0755)
+
+        with open(self._make_mount_options_path(mount_id), "w") as f:
+            json.dump(mount_options, f)
+
+    def get_mount_options(self, mount_id):
+        try:
+            with open(self._make_mount_options_path(mount_id), "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            # mounts made before options were recorded use the defaults
+            return self._make_mount_options(None)
+
+    def mount(self, mount_id, ms_host, dataset, username, user_pkey, gateway_name, mount_path, options=None):
         sdm_util.print_message("Mounting a dataset %s to %s" % (dataset, mount_path), True)
-        self._setup_syndicate(mount_id, dataset, username, user_pkey, gateway_name, ms_host, self.backend_config.syndicate_debug_mode, self.backend_config.syndicate_cache_max)
-        self._mount_syndicatefs(mount_id, dataset, gateway_name, mount_path, self.backend_config.syndicate_debug_mode, self.backend_config.syndicate_debug_level, self.backend_config.use_valgrind)
+        estimate = self._get_latency_history().get_estimate(dataset, [sdm_latency_history.LatencyPhase.SETUP, sdm_latency_history.LatencyPhase.MOUNT])
+        if estimate is not None:
+            sdm_util.print_message("Mounting %s usually takes about %.1f sec" % (dataset, estimate))
+        mount_options = self._make_mount_options(options, dataset)
+        if self.backend_config.shared_mount:
+            self._mount_shared(mount_id, ms_host, dataset, username, user_pkey, gateway_name, mount_path, mount_options)
+        else:
+            self._clear_shared_instance_id(mount_id)
+            config_path = self._make_syndicate_configuration_path(mount_id)
+            if os.path.exists(config_path) and self.get_mount_options(mount_id) != mount_options:
+                # the configuration is written with the options - write it again
+                os.remove(config_path)
+
+            self._setup_syndicate(mount_id, dataset, username, user_pkey, gateway_name, ms_host, mount_options["debug_mode"], mount_options["cache_size"], self.backend_config.syndicate_cert_ttl, self.refresh_certs)
+            self._mount_syndicatefs(mount_id, dataset, gateway_name, mount_path, mount_options["debug_mode"], mount_options["debug_level"], mount_options["use_valgrind"], mount_options["log_sink"], mount_options["fuse_options"])
+
+        self._save_mount_options(mount_id, mount_options)
         sdm_util.print_message("A dataset %s is mounted to %s" % (dataset, mount_path), True)
 
+    def get_mount_usage(self, mount_id):
+        instance_id = self._get_shared_instance_id(mount_id)
+        if instance_id:
+            # usage of the shared instance
+            mount_id = instance_id
+
+        _, process = self._get_syndicatefs_process(mount_id)
+        return sdm_resource_limits.get_usage(self._get_syndicatefs_cgroup(mount_id), process)
+
     def check_mount(self, mount_id, dataset, mount_path):
+        instance_id = self._get_shared_instance_id(mount_id)
+        if instance_id:
+            if not self._is_shared_instance_mounted(instance_id):
+                return False
+            # bind mounts show up with the source of the instance
+            return len(self._get_fuse_mounts(SYNDICATEFS_PROCESS_NAME, mount_path)) > 0
+
         try:
-            self._wait_mount(mount_path)
+            self._wait_mount(mount_id, mount_path)
             return True
-        except FuseBackendException, e:
+        except FuseBackendException:
             return False
 
     def unmount(self, mount_id, dataset, mount_path, cleanup=False):
         sdm_util.print_message("Unmounting a dataset %s mounted at %s" % (dataset, mount_path), True)
-        self._unmount_syndicatefs(mount_path)
+        instance_id = self._get_shared_instance_id(mount_id)
+        if instance_id:
+            outcome = self._unmount_shared(instance_id, mount_id, mount_path, dataset)
+        else:
+            outcome = self._unmount_syndicatefs(mount_id, mount_path, dataset)
 
         if cleanup:
             self._remove_syndicate_setup(mount_id)
 
         sdm_util.print_message("Successfully unmounted a dataset %s mounted at %s" % (dataset, mount_path), True)
+        if outcome:
+            return format_unmount_outcome(outcome)
+        return None
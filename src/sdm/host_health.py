@@ -0,0 +1,287 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/host_health.py
+#   Track health of REST hosts across invocations
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import time
+import fcntl
+import atexit
+import util as sdm_util
+
+DEFAULT_HEALTH_PATH = "~/.sdm/rest_health.json"
+DEFAULT_CIRCUIT_ERROR_THRESHOLD = 0.5
+DEFAULT_CIRCUIT_OPEN_SEC = 60
+
+# results kept per host
+HEALTH_WINDOW = 20
+# latencies kept per host, also used to decide when to hedge requests
+LATENCY_WINDOW = 100
+# results needed before a circuit can trip
+HEALTH_MIN_SAMPLES = 4
+
+
+class CircuitState(object):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+class HostHealth(object):
+    """
+    Recent results of requests sent to a host
+    """
+    def __init__(self, host):
+        self.host = host
+        self.state = CircuitState.CLOSED
+        # recent latencies of successful requests in sec
+        self.latencies = []
+        # recent results - True for success
+        self.results = []
+        self.last_failure = None
+        self.opened_at = None
+        self.probed_at = None
+
+    @classmethod
+    def from_dict(cls, d):
+        health = HostHealth(d["host"])
+        health.state = d["state"]
+        health.latencies = d["latencies"]
+        health.results = d["results"]
+        health.last_failure = d["last_failure"]
+        health.opened_at = d["opened_at"]
+        health.probed_at = d["probed_at"]
+        return health
+
+    def to_dict(self):
+        return {
+            "host": self.host,
+            "state": self.state,
+            "latencies": self.latencies,
+            "results": self.results,
+            "last_failure": self.last_failure,
+            "opened_at": self.opened_at,
+            "probed_at": self.probed_at
+        }
+
+    def get_error_rate(self):
+        if len(self.results) == 0:
+            return 0.0
+        return self.results.count(False) / float(len(self.results))
+
+    def get_latency_percentile(self, percentile):
+        # returns None if there is no sample
+        if len(self.latencies) == 0:
+            return None
+
+        sorted_latencies = sorted(self.latencies)
+        idx = min(len(sorted_latencies) - 1, int(len(sorted_latencies) * percentile / 100.0))
+        return sorted_latencies[idx]
+
+    def __repr__(self):
+        return "<HostHealth %s %s %.2f>" % \
+            (self.host, self.state, self.get_error_rate())
+
+
+class HostHealthTable(object):
+    """
+    Health of hosts kept in a file shared by all invocations.
+    Hosts whose error rate reaches the threshold are tripped into an open
+    circuit and fail fast. After open_sec, a single probe request is let
+    through (half-open) to decide whether to close the circuit again.
+    """
+    def __init__(self, path=DEFAULT_HEALTH_PATH, error_threshold=DEFAULT_CIRCUIT_ERROR_THRESHOLD, open_sec=DEFAULT_CIRCUIT_OPEN_SEC):
+        self.path = sdm_util.get_abs_path(path)
+        self.error_threshold = error_threshold
+        self.open_sec = open_sec
+        self.hosts = {}
+        # results recorded since the last save
+        self.pending = []
+        # a circuit changed since the last save
+        self.state_changed = False
+        self.save_at_exit = False
+        self._load()
+
+    def _load(self):
+        self.hosts = {}
+        try:
+            with open(self.path, "r") as f:
+                for d in json.load(f):
+                    health = HostHealth.from_dict(d)
+                    self.hosts[health.host] = health
+        except (IOError, ValueError, KeyError), e:
+            if os.path.exists(self.path):
+                sdm_util.log_message("Cannot read host health, starting over : %s" % e, sdm_util.LogLevel.WARNING)
+
+    def get_health(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = HostHealth(host)
+        return self.hosts[host]
+
+    def list_health(self):
+        return [self.hosts[host] for host in sorted(self.hosts.keys())]
+
+    def allow_request(self, host):
+        """
+        Return False if requests to the host should fail fast
+        """
+        health = self.get_health(host)
+        if health.state == CircuitState.CLOSED:
+            return True
+
+        now = time.time()
+        if health.state == CircuitState.OPEN:
+            return now - health.opened_at >= self.open_sec
+
+        # half-open - one probe at a time
+        return health.probed_at is None or now - health.probed_at >= self.open_sec
+
+    def is_probing(self, host):
+        return self.get_health(host).state != CircuitState.CLOSED
+
+    def claim_probe(self, host):
+        """
+        Claim the probe of a host whose circuit is not closed. The claim is
+        written to the file under its lock before the probe is sent, so that
+        one invocation probes at a time. Return False if another has claimed it.
+        """
+        def _claim():
+            if not self.allow_request(host):
+                return False
+            self._apply(host, None, None, time.time())
+            return True
+
+        claimed = self._update(_claim)
+        if claimed:
+            sdm_util.log_message("Probing a REST host with an open circuit : %s" % host, sdm_util.LogLevel.INFO)
+        return claimed
+
+    def _apply(self, host, success, latency, now, verbose=True):
+        health = self.get_health(host)
+        state = health.state
+        try:
+            self._apply_result(health, host, success, latency, now, verbose)
+        finally:
+            if health.state != state:
+                self.state_changed = True
+
+    def _apply_result(self, health, host, success, latency, now, verbose):
+        if success is None:
+            # probe started
+            if health.state == CircuitState.OPEN:
+                health.state = CircuitState.HALF_OPEN
+            health.probed_at = now
+            return
+
+        health.results.append(success)
+        del health.results[:-HEALTH_WINDOW]
+
+        if success:
+            health.latencies.append(latency)
+            del health.latencies[:-LATENCY_WINDOW]
+            if health.state != CircuitState.CLOSED:
+                if verbose:
+                    sdm_util.log_message("Closing the circuit of a REST host : %s" % host, sdm_util.LogLevel.INFO)
+                health.state = CircuitState.CLOSED
+                health.results = [True]
+                health.opened_at = None
+                health.probed_at = None
+            return
+
+        health.last_failure = now
+        if health.state == CircuitState.HALF_OPEN:
+            health.state = CircuitState.OPEN
+            health.opened_at = now
+        elif health.state == CircuitState.CLOSED and \
+                len(health.results) >= HEALTH_MIN_SAMPLES and \
+                health.get_error_rate() >= self.error_threshold:
+            if verbose:
+                sdm_util.log_message("Opening the circuit of a REST host : %s" % host, sdm_util.LogLevel.WARNING)
+            health.state = CircuitState.OPEN
+            health.opened_at = now
+
+    def record_success(self, host, latency):
+        now = time.time()
+        self._apply(host, True, latency, now)
+        self.pending.append((host, True, latency, now))
+
+    def record_failure(self, host):
+        now = time.time()
+        self._apply(host, False, None, now)
+        self.pending.append((host, False, None, now))
+
+    def _update(self, func=None):
+        # merges pending results into the file under its lock and
+        # returns what func, run on the merged table, returns
+        parent = os.path.dirname(self.path)
+        if not os.path.exists(parent):
+            os.makedirs(parent, 0755)
+
+        pending = self.pending
+        self.pending = []
+        with open(self.path + ".lock", "a") as lock_fd:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            try:
+                # other invocations may have written since we loaded
+                self._load()
+                for host, success, latency, now in pending:
+                    self._apply(host, success, latency, now, False)
+
+                result = None
+                if func is not None:
+                    result = func()
+
+                tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+                with open(tmp_path, "w") as f:
+                    json.dump([h.to_dict() for h in self.list_health()], f)
+                os.rename(tmp_path, self.path)
+                self.state_changed = False
+                return result
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+    def save(self):
+        """
+        Merge results recorded since the last save into the file
+        """
+        if len(self.pending) == 0:
+            return
+        self._update()
+
+    def flush(self):
+        """
+        Save now if there are failures or a circuit changed, as other
+        invocations need to see them. Successes are saved at exit.
+        """
+        if len(self.pending) == 0:
+            return
+
+        failed = False
+        for _, success, _, _ in self.pending:
+            if not success:
+                failed = True
+        if failed or self.state_changed:
+            self.save()
+        elif not self.save_at_exit:
+            self.save_at_exit = True
+            atexit.register(self._save_at_exit)
+
+    def _save_at_exit(self):
+        try:
+            self.save()
+        except (IOError, OSError), e:
+            sdm_util.log_message("Cannot save host health : %s" % e, sdm_util.LogLevel.WARNING)
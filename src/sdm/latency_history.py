@@ -0,0 +1,225 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/latency_history.py
+#   Keep durations of mount operations per dataset
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import fcntl
+import bisect
+import util as sdm_util
+
+DEFAULT_HISTORY_PATH = "~/.sdm/mount_history.json"
+
+# upper bounds of histogram buckets in sec, growing by half - 0.1 sec to about 2 hours
+BUCKET_BOUNDS = [round(0.1 * (1.5 ** i), 3) for i in range(25)]
+# counts are halved past this so that recent durations weigh more
+HISTOGRAM_MAX_COUNT = 200
+# durations needed before the history is trusted
+HISTORY_MIN_SAMPLES = 5
+
+
+class LatencyPhase(object):
+    # syndicate user, volume and gateway setup
+    SETUP = "setup"
+    # start of syndicatefs to the mount showing up
+    MOUNT = "mount"
+    # fusermount to syndicatefs exiting, of unmounts that need no retry
+    UNMOUNT = "unmount"
+
+
+class LatencyHistogram(object):
+    """
+    Durations counted in log-scaled buckets. The size does not grow with
+    the number of durations recorded.
+    """
+    def __init__(self, counts=None):
+        # the last bucket takes durations over the largest bound
+        self.counts = counts or [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, duration):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, duration)] += 1
+        if self.get_count() > HISTOGRAM_MAX_COUNT:
+            self.counts = [c / 2 for c in self.counts]
+
+    def get_count(self):
+        return sum(self.counts)
+
+    def get_percentile(self, percentile):
+        """
+        Return the upper bound of the bucket holding the percentile, or
+        None if there is no duration
+        """
+        total = self.get_count()
+        if total == 0:
+            return None
+
+        target = total * percentile / 100.0
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if c > 0 and seen >= target:
+                if idx < len(BUCKET_BOUNDS):
+                    return BUCKET_BOUNDS[idx]
+                break
+        return BUCKET_BOUNDS[-1]
+
+    def __repr__(self):
+        return "<LatencyHistogram %d>" % \
+            (self.get_count())
+
+
+class LatencyHistory(object):
+    """
+    Histograms of durations per dataset and phase, kept in a file shared
+    by all invocations
+    """
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = sdm_util.get_abs_path(path)
+        # {dataset: {phase: LatencyHistogram}}
+        self.datasets = {}
+        # {dataset: {phase: waits timed out in a row}}, kept apart from
+        # durations as the time a timed-out phase takes is unknown
+        self.timeouts = {}
+        # durations recorded since the last save, None for a timeout
+        self.pending = []
+        self._load()
+
+    def _load(self):
+        self.datasets = {}
+        self.timeouts = {}
+        try:
+            with open(self.path, "r") as f:
+                doc = json.load(f)
+
+            for dataset, phases in doc.get("histograms", {}).items():
+                self.datasets[dataset] = {}
+                for phase, counts in phases.items():
+                    if len(counts) == len(BUCKET_BOUNDS) + 1:
+                        self.datasets[dataset][phase] = LatencyHistogram(counts)
+
+            for dataset, phases in doc.get("timeouts", {}).items():
+                self.timeouts[dataset] = {}
+                for phase, count in phases.items():
+                    if isinstance(count, int):
+                        self.timeouts[dataset][phase] = count
+        except (IOError, ValueError, AttributeError, TypeError), e:
+            if os.path.exists(self.path):
+                sdm_util.log_message("Cannot read latency history, starting over : %s" % e, sdm_util.LogLevel.WARNING)
+
+    def get_histogram(self, dataset, phase):
+        phases = self.datasets.setdefault(dataset.strip().lower(), {})
+        if phase not in phases:
+            phases[phase] = LatencyHistogram()
+        return phases[phase]
+
+    def get_timeouts(self, dataset, phase):
+        return self.timeouts.get(dataset.strip().lower(), {}).get(phase, 0)
+
+    def _apply(self, dataset, phase, duration):
+        timeouts = self.timeouts.setdefault(dataset.strip().lower(), {})
+        if duration is None:
+            timeouts[phase] = timeouts.get(phase, 0) + 1
+            return
+
+        self.get_histogram(dataset, phase).add(duration)
+        timeouts.pop(phase, None)
+
+    def record(self, dataset, phase, duration):
+        self._apply(dataset, phase, duration)
+        self.pending.append((dataset, phase, duration))
+
+    def record_timeout(self, dataset, phase):
+        self._apply(dataset, phase, None)
+        self.pending.append((dataset, phase, None))
+
+    def get_percentile(self, dataset, phase, percentile):
+        # returns None until there are enough durations
+        histogram = self.get_histogram(dataset, phase)
+        if histogram.get_count() < HISTORY_MIN_SAMPLES:
+            return None
+        return histogram.get_percentile(percentile)
+
+    def get_timeout(self, dataset, phase, default, factor, floor, ceiling):
+        """
+        Return p99 * factor clamped to [floor, ceiling], or default if
+        the dataset has little history. Each wait timed out in a row
+        multiplies it by factor up to ceiling, and one more timeout at
+        ceiling starts over so that failures are not always slow.
+        """
+        timeout = default
+        p99 = self.get_percentile(dataset, phase, 99)
+        if p99 is not None:
+            timeout = min(max(p99 * factor, floor), ceiling)
+
+        base = timeout
+        for _ in range(self.get_timeouts(dataset, phase)):
+            if timeout >= ceiling:
+                timeout = base
+            else:
+                timeout = min(timeout * factor, ceiling)
+        return timeout
+
+    def get_estimate(self, dataset, phases):
+        """
+        Return the median time the phases take together, or None if
+        one of them has little history
+        """
+        total = 0.0
+        for phase in phases:
+            p50 = self.get_percentile(dataset, phase, 50)
+            if p50 is None:
+                return None
+            total += p50
+        return total
+
+    def save(self):
+        """
+        Merge durations recorded since the last save into the file
+        """
+        if len(self.pending) == 0:
+            return
+
+        parent = os.path.dirname(self.path)
+        if not os.path.exists(parent):
+            os.makedirs(parent, 0755)
+
+        pending = self.pending
+        self.pending = []
+        with open(self.path + ".lock", "a") as lock_fd:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            try:
+                # other invocations may have written since we loaded
+                self._load()
+                for dataset, phase, duration in pending:
+                    self._apply(dataset, phase, duration)
+
+                doc = {
+                    "histograms": {},
+                    "timeouts": {}
+                }
+                for dataset, phases in self.datasets.items():
+                    doc["histograms"][dataset] = dict([(phase, h.counts) for phase, h in phases.items()])
+                for dataset, phases in self.timeouts.items():
+                    if len(phases) > 0:
+                        doc["timeouts"][dataset] = phases
+
+                tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+                with open(tmp_path, "w") as f:
+                    json.dump(doc, f)
+                os.rename(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
@@ -0,0 +1,163 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/log_sink.py
+#   Keep output of background processes within a size limit
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import sys
+import collections
+import subprocess
+
+# a sink runs as a separate process, so this module only uses the standard library
+
+DEFAULT_LOG_SINK = "rotate"
+DEFAULT_LOG_MAX_BYTES = 10*1024*1024 # 10MB
+LOG_BACKUP_COUNT = 2
+RING_LINES = 2000
+
+
+class LogSinkType(object):
+    # write to the log file, rotating it at the size limit
+    ROTATE = "rotate"
+    # keep the last lines in memory, write them when the process exits
+    RING = "ring"
+
+    @classmethod
+    def get_names(cls):
+        return [cls.ROTATE, cls.RING]
+
+
+class LogSinkException(Exception):
+    pass
+
+
+class RotatingLogWriter(object):
+    """
+    Write lines to a file and rotate it to <path>.1, <path>.2, ...
+    when it grows over max_bytes
+    """
+    def __init__(self, path, max_bytes=DEFAULT_LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.f = open(self.path, "w")
+        self.size = 0
+
+    def _rotate(self):
+        self.f.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = "%s.%d" % (self.path, i)
+            if os.path.exists(src):
+                os.rename(src, "%s.%d" % (self.path, i + 1))
+        if self.backup_count > 0:
+            os.rename(self.path, "%s.1" % self.path)
+        self.f = open(self.path, "w")
+        self.size = 0
+
+    def write(self, line):
+        if self.f.closed:
+            # a rotation failed half-way
+            self.f = open(self.path, "a")
+            self.size = self.f.tell()
+        if self.size > 0 and self.size + len(line) > self.max_bytes:
+            self._rotate()
+        self.f.write(line)
+        self.f.flush()
+        self.size += len(line)
+
+    def close(self):
+        self.f.close()
+
+
+class RingLogWriter(object):
+    """
+    Keep the last lines in memory and write them out on close
+    """
+    def __init__(self, path, max_lines=RING_LINES):
+        self.path = path
+        self.lines = collections.deque(maxlen=max_lines)
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def close(self):
+        with open(self.path, "w") as f:
+            f.writelines(self.lines)
+
+
+def make_writer(path, sink, max_bytes):
+    if sink == LogSinkType.ROTATE:
+        return RotatingLogWriter(path, max_bytes)
+    if sink == LogSinkType.RING:
+        return RingLogWriter(path)
+    raise LogSinkException("unknown log sink - %s" % sink)
+
+
+def pump(fd, writer):
+    """
+    Copy lines from fd to the writer until the other end is closed.
+    Lines that cannot be written, e.g. on a full disk, are dropped and
+    counted so that syndicatefs never blocks on a full pipe.
+    """
+    dropped = 0
+    try:
+        for line in iter(fd.readline, ""):
+            try:
+                if dropped > 0:
+                    writer.write("[%d lines dropped by the log sink]\n" % dropped)
+                    dropped = 0
+                writer.write(line)
+            except (IOError, OSError):
+                dropped += 1
+    finally:
+        try:
+            writer.close()
+        except (IOError, OSError):
+            pass
+
+
+def start_log_sink(log_path, sink=DEFAULT_LOG_SINK, max_bytes=DEFAULT_LOG_MAX_BYTES):
+    """
+    Start a sink process and return its stdin.
+    The sink outlives sdm and exits when every writer has closed its end.
+    """
+    if sink not in LogSinkType.get_names():
+        raise LogSinkException("unknown log sink - %s" % sink)
+
+    script_path = os.path.abspath(__file__)
+    if script_path.endswith(".pyc"):
+        script_path = script_path[:-1]
+
+    with open(os.devnull, "w") as devnull:
+        proc = subprocess.Popen(
+            [sys.executable, script_path, log_path, sink, str(max_bytes)],
+            stdin=subprocess.PIPE,
+            stdout=devnull,
+            stderr=subprocess.STDOUT,
+            close_fds=True,
+            # do not die with the terminal of sdm
+            preexec_fn=os.setsid
+        )
+    return proc.stdin
+
+
+def main(argv):
+    log_path, sink, max_bytes = argv[0], argv[1], int(argv[2])
+    pump(sys.stdin, make_writer(log_path, sink, max_bytes))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/manifest.py
+#   Reconcile desired mounts against the mount table
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import mount_table as sdm_mount_table
+import backends as sdm_backends
+import util as sdm_util
+
+# mount options a manifest may set
+MANIFEST_MOUNT_OPTIONS = ["cache_size", "profile"]
+
+
+class ManifestException(Exception):
+    pass
+
+
+class MountActionType(object):
+    MOUNT = "MOUNT"
+    UNMOUNT = "UNMOUNT"
+    # unmount and mount again
+    REMOUNT = "REMOUNT"
+
+
+class DesiredMount(object):
+    """
+    A mount described by a manifest
+    """
+    def __init__(self, dataset, mount_path, backend, options=None):
+        self.dataset = dataset.strip().lower()
+        self.mount_path = mount_path
+        self.backend = backend
+        self.options = options or {}
+
+    @classmethod
+    def from_dict(cls, d, default_backend):
+        if "dataset" not in d:
+            raise ManifestException("a mount has no dataset - %s" % d)
+
+        backend = default_backend
+        if "backend" in d:
+            backend = sdm_backends.Backends.get_backend_name(d["backend"])
+
+        options = {}
+        for k in MANIFEST_MOUNT_OPTIONS:
+            if k in d:
+                options[k] = d[k]
+
+        mount_path = None
+        if "path" in d:
+            mount_path = sdm_util.get_abs_path(d["path"])
+        return DesiredMount(d["dataset"], mount_path, backend, options)
+
+    def __repr__(self):
+        return "<DesiredMount %s %s %s>" % \
+            (self.dataset, self.mount_path, self.backend)
+
+
+class Manifest(object):
+    """
+    Desired state of mounts.
+    prune unmounts mounts that are not in the manifest.
+    """
+    def __init__(self, mounts, prune=True):
+        self.mounts = mounts
+        self.prune = prune
+
+    @classmethod
+    def from_dict(cls, d, default_backend):
+        if isinstance(d, list):
+            d = {"mounts": d}
+
+        if not isinstance(d, dict) or not isinstance(d.get("mounts"), list):
+            raise ManifestException("unrecognized manifest format")
+
+        mounts = []
+        seen = set()
+        for m in d["mounts"]:
+            desired = DesiredMount.from_dict(m, default_backend)
+            if (desired.dataset, desired.backend) in seen:
+                raise ManifestException("a dataset appears twice - %s" % desired.dataset)
+            seen.add((desired.dataset, desired.backend))
+            mounts.append(desired)
+
+        prune = True
+        if "prune" in d:
+            prune = sdm_util.to_bool(d["prune"])
+        return Manifest(mounts, prune)
+
+    @classmethod
+    def load(cls, path, default_backend):
+        try:
+            with open(path, "r") as f:
+                return Manifest.from_dict(json.load(f), default_backend)
+        except (IOError, ValueError), e:
+            raise ManifestException("cannot read a manifest %s : %s" % (path, e))
+
+
+class MountAction(object):
+    """
+    A step of a plan
+    """
+    def __init__(self, action, dataset, mount_path, backend, record=None, options=None, cleanup=False, reason=""):
+        self.action = action
+        self.dataset = dataset
+        self.mount_path = mount_path
+        self.backend = backend
+        # the existing mount record to unmount
+        self.record = record
+        self.options = options or {}
+        # remove mount states on unmount
+        self.cleanup = cleanup
+        self.reason = reason
+        # catalogue entry of the dataset to mount
+        self.entry = None
+
+    def is_unmounting(self):
+        return self.action in [MountActionType.UNMOUNT, MountActionType.REMOUNT]
+
+    def is_mounting(self):
+        return self.action in [MountActionType.MOUNT, MountActionType.REMOUNT]
+
+    def __repr__(self):
+        return "<MountAction %s %s %s>" % \
+            (self.action, self.dataset, self.mount_path)
+
+
+def make_plan(manifest, records, check_mount, get_mount_options):
+    """
+    Return actions that bring the mounts to the manifest.
+    check_mount(record) tells if a record is actually mounted.
+    get_mount_options(record) returns options the record is mounted with.
+    Options a backend does not report, e.g. any option of REST mounts,
+    are not compared.
+    """
+    desired_map = {}
+    for desired in manifest.mounts:
+        desired_map[(desired.dataset, desired.backend)] = desired
+
+    actions = []
+    handled = set()
+    for rec in records:
+        k = (rec.dataset, rec.backend)
+        desired = desired_map.get(k)
+        if desired is None:
+            if manifest.prune and rec.status == sdm_mount_table.MountRecordStatus.MOUNTED:
+                actions.append(MountAction(MountActionType.UNMOUNT, rec.dataset, rec.mount_path, rec.backend, rec, reason="not in the manifest"))
+            continue
+
+        handled.add(k)
+        mount_path = desired.mount_path or rec.mount_path
+        if mount_path != rec.mount_path:
+            # record ids are per dataset - the old record has to go
+            actions.append(MountAction(MountActionType.REMOUNT, rec.dataset, mount_path, rec.backend, rec, desired.options, True, "mount path changed"))
+            continue
+
+        if rec.status == sdm_mount_table.MountRecordStatus.UNMOUNTED:
+            actions.append(MountAction(MountActionType.MOUNT, rec.dataset, mount_path, rec.backend, None, desired.options, reason="unmounted"))
+            continue
+
+        current_options = get_mount_options(rec)
+        changed = False
+        for opt in desired.options.keys():
+            if opt not in current_options:
+                # the backend does not use the option
+                continue
+            if current_options[opt] != desired.options[opt]:
+                changed = True
+                break
+
+        if changed:
+            actions.append(MountAction(MountActionType.REMOUNT, rec.dataset, mount_path, rec.backend, rec, desired.options, True, "options changed"))
+        elif not check_mount(rec):
+            actions.append(MountAction(MountActionType.REMOUNT, rec.dataset, mount_path, rec.backend, rec, desired.options, False, "mount is broken"))
+
+    for desired in manifest.mounts:
+        if (desired.dataset, desired.backend) not in handled:
+            actions.append(MountAction(MountActionType.MOUNT, desired.dataset, desired.mount_path, desired.backend, None, desired.options, reason="new"))
+    return actions
+
+
+def _get_path_depth(path):
+    if path is None:
+        return 0
+    return len([p for p in path.split("/") if len(p) > 0])
+
+
+def make_stages(actions):
+    """
+    Group plan steps into stages that can run concurrently.
+    Unmounts go first, deepest paths first, so that nested mounts are
+    released before their parents. Mounts follow, shallowest paths first.
+    Each stage is a list of (action, is_unmount).
+    """
+    unmount_stages = {}
+    mount_stages = {}
+    for action in actions:
+        if action.is_unmounting():
+            depth = _get_path_depth(action.record.mount_path)
+            unmount_stages.setdefault(depth, []).append((action, True))
+        if action.is_mounting():
+            depth = _get_path_depth(action.mount_path)
+            mount_stages.setdefault(depth, []).append((action, False))
+
+    stages = []
+    for depth in sorted(unmount_stages.keys(), reverse=True):
+        stages.append(unmount_stages[depth])
+    for depth in sorted(mount_stages.keys()):
+        stages.append(mount_stages[depth])
+    return stages
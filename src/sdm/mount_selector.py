@@ -0,0 +1,194 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/mount_selector.py
+#   Select mount records with patterns and attributes
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import bisect
+import fnmatch
+import util as sdm_util
+
+GLOB_CHARS = "*?["
+SELECTOR_KEYS = ["dataset", "id", "path", "backend", "status"]
+
+
+class MountSelectorException(Exception):
+    pass
+
+
+def is_glob(arg):
+    for c in GLOB_CHARS:
+        if c in arg:
+            return True
+    return False
+
+
+def is_attribute_selector(arg):
+    for criterion in arg.split(","):
+        if "=" not in criterion:
+            return False
+        k = criterion.split("=", 1)[0].strip().lower()
+        if k not in SELECTOR_KEYS:
+            return False
+    return True
+
+
+class MountSelector(object):
+    """
+    Resolve selectors against mount records.
+
+    selectors:
+        <dataset> | <mount_id prefix> | <mount_path> : a single mount
+        <glob> : mounts of datasets matching the glob pattern
+        dataset=<glob>, id=<prefix>, path=<path prefix>,
+        backend=<backend>, status=<status> : mounts with the attribute.
+        criteria joined by "," must all match.
+    """
+    def __init__(self, records):
+        # index records in one pass
+        self.records = records
+        self.positions = {}
+        self.by_dataset = {}
+        self.by_path = {}
+        self.by_backend = {}
+        self.by_status = {}
+
+        ids = []
+        paths = []
+        for pos in range(len(records)):
+            rec = records[pos]
+            self.positions[rec.record_id] = pos
+            self.by_dataset.setdefault(rec.dataset, []).append(rec)
+            self.by_path.setdefault(rec.mount_path, []).append(rec)
+            self.by_backend.setdefault(rec.backend.lower(), []).append(rec)
+            self.by_status.setdefault(rec.status.upper(), []).append(rec)
+            ids.append((rec.record_id, pos))
+            paths.append((rec.mount_path, pos))
+
+        self.sorted_ids = sorted(ids)
+        self.sorted_paths = sorted(paths)
+
+    def _select_prefix(self, sorted_keys, prefix):
+        selected = []
+        idx = bisect.bisect_left(sorted_keys, (prefix,))
+        while idx < len(sorted_keys) and sorted_keys[idx][0].startswith(prefix):
+            selected.append(self.records[sorted_keys[idx][1]])
+            idx += 1
+        return selected
+
+    def _select_id(self, prefix):
+        return self._select_prefix(self.sorted_ids, prefix.strip().lower())
+
+    def _select_path(self, prefix):
+        path = sdm_util.get_abs_path(prefix).rstrip("/")
+        selected = []
+        for rec in self._select_prefix(self.sorted_paths, path):
+            # match path components only
+            rest = rec.mount_path[len(path):]
+            if rest == "" or rest.startswith("/") or path == "":
+                selected.append(rec)
+        return selected
+
+    def _select_dataset(self, pattern):
+        p = pattern.strip().lower()
+        if not is_glob(p):
+            return list(self.by_dataset.get(p, []))
+
+        selected = []
+        for dataset in fnmatch.filter(self.by_dataset.keys(), p):
+            selected.extend(self.by_dataset[dataset])
+        return selected
+
+    def _select_criterion(self, criterion):
+        k, v = criterion.split("=", 1)
+        k = k.strip().lower()
+        v = v.strip()
+        if k == "dataset":
+            return self._select_dataset(v)
+        elif k == "id":
+            return self._select_id(v)
+        elif k == "path":
+            return self._select_path(v)
+        elif k == "backend":
+            return list(self.by_backend.get(v.lower(), []))
+        elif k == "status":
+            return list(self.by_status.get(v.upper(), []))
+        else:
+            raise MountSelectorException("unknown selector - %s" % criterion)
+
+    def _select_attributes(self, arg):
+        selected = None
+        for criterion in arg.split(","):
+            records = self._select_criterion(criterion)
+            if selected is None:
+                selected = records
+            else:
+                ids = set([rec.record_id for rec in records])
+                selected = [rec for rec in selected if rec.record_id in ids]
+        return selected
+
+    def _select_single(self, arg):
+        # dataset?
+        records = self.by_dataset.get(arg.strip().lower(), [])
+        if len(records) > 0:
+            return records
+
+        # record_id?
+        records = self._select_id(arg)
+        if len(records) > 0:
+            return records
+
+        # path?
+        return self.by_path.get(sdm_util.get_abs_path(arg), [])
+
+    def select_all(self):
+        return list(self.records)
+
+    def select(self, arg):
+        """
+        Return records selected by a selector
+        """
+        if is_attribute_selector(arg):
+            return self._select_attributes(arg)
+        elif is_glob(arg):
+            return self._select_dataset(arg)
+        else:
+            records = self._select_single(arg)
+            if len(records) > 1:
+                raise MountSelectorException("There are more %d mounts - %s" % (len(records), arg))
+            return records
+
+    def resolve(self, args):
+        """
+        Return (records, errors) for the selectors.
+        records are in mount table order without duplicates.
+        errors describe selectors that did not select a mount.
+        """
+        selected = {}
+        errors = []
+        for arg in args:
+            try:
+                records = self.select(arg)
+            except MountSelectorException, e:
+                errors.append(str(e))
+                continue
+
+            if len(records) == 0:
+                errors.append("Cannot find mount - %s" % arg)
+            for rec in records:
+                selected[rec.record_id] = rec
+
+        records = sorted(selected.values(), key=lambda rec: self.positions[rec.record_id])
+        return records, errors
@@ -31,11 +31,17 @@ class MountRecordStatus(object):
     MOUNTED = "MOUNTED"
 
 
+def make_record_id(dataset, backend):
+    # record ids are deterministic so that a dataset can be prepared before it is mounted
+    seed = "seed123%sMountRecord%s" % (dataset.strip().lower(), backend)
+    return hashlib.sha256(seed).hexdigest().lower()
+
+
 class MountRecord(object):
     """
     mount table record
     """
-    def __init__(self, dataset, mount_path, backend, status=MountRecordStatus.UNMOUNTED, record_id=""):
+    def __init__(self, dataset, mount_path, backend, status=MountRecordStatus.UNMOUNTED, record_id="", unmount_outcome=""):
         self.dataset = dataset.strip().lower()
         self.mount_path = mount_path.strip()
 
@@ -51,25 +57,34 @@ class MountRecord(object):
         else:
             self.status = MountRecordStatus.UNMOUNTED
 
+        # steps the last unmount took, e.g. "unmount=failed,lazy=ok"
+        self.unmount_outcome = unmount_outcome.strip()
+
     def _make_record_id(self, dataset, backend):
-        seed = "seed123%sMountRecord%s" % (dataset, backend)
-        return hashlib.sha256(seed).hexdigest().lower()
+        return make_record_id(dataset, backend)
 
     @classmethod
     def from_line(cls, line):
         fields = line.strip().split("\t")
-        if len(fields) == 5:
+        if len(fields) in [5, 6]:
             record_id = fields[0].strip()
             dataset = fields[1].strip()
             mount_path = fields[2].strip()
             backend = sdm_backends.Backends.get_backend_name(fields[3].strip())
             status = fields[4].strip()
-            return MountRecord(dataset, mount_path, backend, status, record_id)
+            unmount_outcome = ""
+            if len(fields) == 6:
+                unmount_outcome = fields[5].strip()
+            return MountRecord(dataset, mount_path, backend, status, record_id, unmount_outcome)
         else:
             raise MountTableException("unrecognized format - %s" % line)
 
     def to_line(self):
-        return "%s\t%s\t%s\t%s\t%s" % (self.record_id, self.dataset, self.mount_path, self.backend, self.status)
+        line = "%s\t%s\t%s\t%s\t%s" % (self.record_id, self.dataset, self.mount_path, self.backend, self.status)
+        if self.unmount_outcome:
+            # records without an unmount keep the 5-field format
+            line += "\t%s" % self.unmount_outcome
+        return line
 
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
@@ -176,6 +191,11 @@ class MountTable(object):
         else:
             raise MountTableException("Record already exists - %s" % record)
 
+    def delete_records(self, record_ids):
+        # deletes many records in one pass
+        ids = set(record_ids)
+        self.table = [r for r in self.table if r.record_id not in ids]
+
     def delete_record(self, record_id):
         exist = False
         idx = 0
@@ -0,0 +1,175 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/output_format.py
+#   Print rows of command output in table or machine-readable formats
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import sys
+import json
+
+from prettytable import PrettyTable
+
+
+class OutputFormatException(Exception):
+    pass
+
+
+class OutputFormat(object):
+    TABLE = "table"
+    JSON = "json"
+    JSONL = "jsonl"
+    TSV = "tsv"
+
+    @classmethod
+    def from_str(cls, name):
+        n = name.strip().lower()
+        if n in [cls.TABLE, cls.JSON, cls.JSONL, cls.TSV]:
+            return n
+        raise OutputFormatException("unknown output format - %s" % name)
+
+
+class RowWriter(object):
+    """
+    Write rows of the given fields
+    """
+    def __init__(self, field_names, fields=None, header=True, out=sys.stdout):
+        self.header = header
+        self.out = out
+        self.field_names = []
+        self.field_indices = []
+
+        if fields:
+            upper_field_names = [f.upper() for f in field_names]
+            for field in fields:
+                f = field.strip().upper()
+                if f not in upper_field_names:
+                    raise OutputFormatException("unknown field - %s, available fields are %s" % (field, ", ".join(field_names)))
+                self.field_indices.append(upper_field_names.index(f))
+                self.field_names.append(field_names[upper_field_names.index(f)])
+        else:
+            self.field_indices = range(len(field_names))
+            self.field_names = list(field_names)
+
+        self.rows = 0
+
+    def _project(self, row):
+        return [row[idx] for idx in self.field_indices]
+
+    def write_row(self, row):
+        self.rows += 1
+        self._write_row(self._project(row))
+
+    def _write_row(self, row):
+        pass
+
+    def close(self):
+        pass
+
+    def is_tabular(self):
+        return False
+
+
+class TableRowWriter(RowWriter):
+    """
+    Collect rows to a PrettyTable and print it on close
+    """
+    def __init__(self, field_names, fields=None, header=True, out=sys.stdout):
+        super(TableRowWriter, self).__init__(field_names, fields, header, out)
+        self.tbl = PrettyTable()
+        self.tbl.field_names = self.field_names
+        self.tbl.header = header
+
+    def _write_row(self, row):
+        self.tbl.add_row(row)
+
+    def close(self):
+        self.out.write("%s\n" % self.tbl)
+
+    def is_tabular(self):
+        return True
+
+
+class JsonRowWriter(RowWriter):
+    """
+    Stream rows as a JSON array of objects
+    """
+    def _to_dict(self, row):
+        d = {}
+        for idx in range(len(self.field_names)):
+            d[self.field_names[idx].lower()] = row[idx]
+        return d
+
+    def _write_row(self, row):
+        if self.rows == 1:
+            self.out.write("[\n")
+        else:
+            self.out.write(",\n")
+        self.out.write(json.dumps(self._to_dict(row)))
+
+    def close(self):
+        if self.rows == 0:
+            self.out.write("[")
+        self.out.write("\n]\n")
+
+
+class JsonlRowWriter(JsonRowWriter):
+    """
+    Stream rows as JSON objects, one per line
+    """
+    def _write_row(self, row):
+        self.out.write(json.dumps(self._to_dict(row)) + "\n")
+
+    def close(self):
+        pass
+
+
+class TsvRowWriter(RowWriter):
+    """
+    Stream rows as tab-separated values
+    """
+    def _escape(self, value):
+        if value is None:
+            return ""
+        if not isinstance(value, basestring):
+            value = str(value)
+        return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+    def _write_line(self, values):
+        line = "\t".join([self._escape(v) for v in values])
+        if isinstance(line, unicode):
+            line = line.encode("utf-8")
+        self.out.write(line + "\n")
+
+    def _write_row(self, row):
+        if self.rows == 1 and self.header:
+            self._write_line([f.lower() for f in self.field_names])
+        self._write_line(row)
+
+    def close(self):
+        if self.rows == 0 and self.header:
+            self._write_line([f.lower() for f in self.field_names])
+
+
+def make_row_writer(output_format, field_names, fields=None, header=True, out=sys.stdout):
+    if output_format == OutputFormat.TABLE:
+        return TableRowWriter(field_names, fields, header, out)
+    elif output_format == OutputFormat.JSON:
+        return JsonRowWriter(field_names, fields, header, out)
+    elif output_format == OutputFormat.JSONL:
+        return JsonlRowWriter(field_names, fields, header, out)
+    elif output_format == OutputFormat.TSV:
+        return TsvRowWriter(field_names, fields, header, out)
+    else:
+        raise OutputFormatException("unknown output format - %s" % output_format)
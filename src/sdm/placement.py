@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/placement.py
+#   Place datasets on hosts with consistent hashing
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import fcntl
+import bisect
+import hashlib
+import util as sdm_util
+
+# virtual nodes per unit of weight
+DEFAULT_VNODES = 128
+DEFAULT_PLACEMENT_PATH = "~/.sdm/rest_placement.json"
+
+
+class PlacementException(Exception):
+    pass
+
+
+def _hash(key):
+    return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+
+class ConsistentHashRing(object):
+    """
+    Consistent hash ring of hosts.
+    A host with weight w gets w * vnodes points on the ring, so adding or
+    removing a host only moves the keys next to its points.
+    """
+    def __init__(self, hosts, weights=None, vnodes=DEFAULT_VNODES):
+        self.hosts = list(hosts)
+        self.points = []
+        self.point_hosts = []
+
+        if weights is None:
+            weights = {}
+
+        ring = []
+        for host in self.hosts:
+            weight = weights.get(host, 1)
+            if weight < 0:
+                raise PlacementException("weight of a host must not be negative - %s" % host)
+
+            for i in range(int(weight * vnodes)):
+                ring.append((_hash("%s#%d" % (host, i)), host))
+
+        ring.sort()
+        for point, host in ring:
+            self.points.append(point)
+            self.point_hosts.append(host)
+
+    def get_hosts(self, key, replicas):
+        """
+        Return replicas distinct hosts for the key in ring order
+        """
+        distinct_hosts = len(set(self.point_hosts))
+        if replicas <= 0 or replicas > distinct_hosts:
+            replicas = distinct_hosts
+
+        hosts = []
+        if replicas == 0:
+            return hosts
+
+        idx = bisect.bisect(self.points, _hash(key))
+        while len(hosts) < replicas:
+            host = self.point_hosts[idx % len(self.points)]
+            if host not in hosts:
+                hosts.append(host)
+            idx += 1
+        return hosts
+
+    def __repr__(self):
+        return "<ConsistentHashRing %s>" % \
+            (self.hosts)
+
+
+class Placement(object):
+    """
+    Hosts a mount was placed on
+    """
+    def __init__(self, hosts=None, user_hosts=None):
+        # hosts keeping the gateway session of the last mount
+        self.hosts = hosts or []
+        # hosts a user was set up on by any mount, kept until cleanup
+        self.user_hosts = user_hosts or []
+
+    @classmethod
+    def from_dict(cls, d):
+        return Placement(d["hosts"], d["user_hosts"])
+
+    def to_dict(self):
+        return {
+            "hosts": self.hosts,
+            "user_hosts": self.user_hosts
+        }
+
+    def __repr__(self):
+        return "<Placement %s>" % \
+            (self.hosts)
+
+
+class PlacementTable(object):
+    """
+    Placements of mounts kept in a file shared by all invocations, so that
+    mounts are checked and removed where they were placed even after hosts
+    join or leave the ring
+    """
+    def __init__(self, path=DEFAULT_PLACEMENT_PATH):
+        self.path = sdm_util.get_abs_path(path)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (IOError, ValueError), e:
+            if os.path.exists(self.path):
+                sdm_util.log_message("Cannot read placements, starting over : %s" % e, sdm_util.LogLevel.WARNING)
+            return {}
+
+    def get(self, mount_id):
+        # returns None if the mount has not been placed
+        d = self._load().get(mount_id)
+        if d is None:
+            return None
+        return Placement.from_dict(d)
+
+    def _update(self, mount_id, placement):
+        parent = os.path.dirname(self.path)
+        if not os.path.exists(parent):
+            os.makedirs(parent, 0755)
+
+        with open(self.path + ".lock", "a") as lock_fd:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            try:
+                placements = self._load()
+                if placement is None:
+                    placements.pop(mount_id, None)
+                else:
+                    placements[mount_id] = placement.to_dict()
+
+                tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+                with open(tmp_path, "w") as f:
+                    json.dump(placements, f, sort_keys=True)
+                os.rename(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+    def set(self, mount_id, placement):
+        self._update(mount_id, placement)
+
+    def remove(self, mount_id):
+        self._update(mount_id, None)
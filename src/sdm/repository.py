@@ -16,8 +16,18 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import os
 import json
-import grequests
+import hashlib
+import util as sdm_util
+import deadline as sdm_deadline
+import bktree as sdm_bktree
+import catalogue_source as sdm_catalogue_source
+
+# suggestions are at most this many edits away
+MAX_SUGGESTION_DISTANCE = 3
+MAX_SUGGESTIONS = 5
+
 
 class RepositoryException(Exception):
     pass
@@ -27,7 +37,7 @@ class RepositoryEntry(object):
     """
     repository entry
     """
-    def __init__(self, dataset, ms_host, volume, username, user_pkey, gateway, description):
+    def __init__(self, dataset, ms_host, volume, username, user_pkey, gateway, description, fuse_options=None):
         self.dataset = dataset.strip().lower()
         self.ms_host = ms_host.strip()
         self.volume = volume.strip()
@@ -35,6 +45,8 @@ class RepositoryEntry(object):
         self.user_pkey = user_pkey
         self.gateway = gateway.strip()
         self.description = description
+        # kernel FUSE options suggested by the catalogue
+        self.fuse_options = fuse_options or {}
 
     @classmethod
     def from_json(cls, jsonstr):
@@ -58,11 +70,12 @@ class RepositoryEntry(object):
             username,
             user_pkey,
             ent["gateway"],
-            ent["description"]
+            ent["description"],
+            ent.get("fuse_options")
         )
 
-    def to_json(self):
-        return json.dumps({
+    def to_dict(self):
+        d = {
             "dataset": self.dataset,
             "ms_host": self.ms_host,
             "volume": self.volume,
@@ -70,7 +83,14 @@ class RepositoryEntry(object):
             "user_pkey": self.user_pkey,
             "gateway": self.gateway,
             "description": self.description
-        })
+        }
+        # only catalogues with hints carry the field
+        if self.fuse_options:
+            d["fuse_options"] = self.fuse_options
+        return d
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
 
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
@@ -80,54 +100,443 @@ class RepositoryEntry(object):
             (self.dataset, self.description)
 
 
+class RepositoryIndex(object):
+    """
+    Trigram index over searchable fields of repository entries
+    """
+    GRAM_SIZE = 3
+
+    def __init__(self, grams=None):
+        # gram -> set of datasets
+        if grams is None:
+            grams = {}
+        self.grams = grams
+
+    @classmethod
+    def make_grams(cls, text):
+        grams = set()
+        t = text.lower()
+        for idx in range(len(t) - cls.GRAM_SIZE + 1):
+            grams.add(t[idx:idx + cls.GRAM_SIZE])
+        return grams
+
+    @classmethod
+    def make_entry_grams(cls, entry):
+        grams = set()
+        for text in [entry.dataset, entry.username, entry.description]:
+            grams |= cls.make_grams(text)
+        return grams
+
+    @classmethod
+    def from_dict(cls, d):
+        grams = {}
+        for g, datasets in d.items():
+            grams[g] = set(datasets)
+        return RepositoryIndex(grams)
+
+    @classmethod
+    def build(cls, entries):
+        grams = {}
+        for entry in entries:
+            for g in cls.make_entry_grams(entry):
+                if g not in grams:
+                    grams[g] = set()
+                grams[g].add(entry.dataset)
+        return RepositoryIndex(grams)
+
+    def apply(self, removed_entries, added_entries):
+        # returns a new index - sets of untouched grams are shared
+        grams = dict(self.grams)
+        copied = set()
+
+        def _get_set(g):
+            if g not in copied:
+                grams[g] = set(grams.get(g, ()))
+                copied.add(g)
+            return grams[g]
+
+        for entry in removed_entries:
+            for g in self.make_entry_grams(entry):
+                _get_set(g).discard(entry.dataset)
+
+        for entry in added_entries:
+            for g in self.make_entry_grams(entry):
+                _get_set(g).add(entry.dataset)
+
+        for g in copied:
+            if len(grams[g]) == 0:
+                del grams[g]
+        return RepositoryIndex(grams)
+
+    def search(self, query):
+        # returns candidate datasets or None if the query is too short
+        query_grams = self.make_grams(query)
+        if len(query_grams) == 0:
+            return None
+
+        candidates = None
+        for g in query_grams:
+            datasets = self.grams.get(g)
+            if not datasets:
+                return set()
+            if candidates is None:
+                candidates = set(datasets)
+            else:
+                candidates &= datasets
+        return candidates
+
+
 class Repository(object):
     """
     Manage SDM Repository
     """
-    def __init__(self, url):
-        self.table = {}
+    def __init__(self, url, cache_path=None):
+        self.table = None
+        # built on the first query
+        self.index = None
+        # BKTree of dataset names, kept in the snapshot
+        self.name_tree = None
+        self.version = None
+        # version of the snapshot on disk
+        self.snapshot_version = None
 
         if not url:
             raise RepositoryException("not a valid repository url : %s" % url)
 
-        self.load_table(url)
+        self.url = url
+        self.cache_path = cache_path
+        self.source = sdm_catalogue_source.get_catalogue_source(url)
+        self.saved_capabilities = self._load_capabilities()
+        if self.saved_capabilities is not None:
+            self.source.set_capabilities(self.saved_capabilities)
+
+    def set_deadline(self, deadline):
+        self.source.set_deadline(deadline)
+
+    def _make_snapshot_path(self):
+        return "%s/%s.json" % (
+            self.cache_path.rstrip("/"),
+            hashlib.sha256(self.url).hexdigest()[:16]
+        )
+
+    def _make_capabilities_path(self):
+        return "%s/%s.capabilities.json" % (
+            self.cache_path.rstrip("/"),
+            hashlib.sha256(self.url).hexdigest()[:16]
+        )
+
+    def _load_capabilities(self):
+        # kept apart from the snapshot, which commands using lookups never write
+        if not self.cache_path:
+            return None
+
+        try:
+            with open(self._make_capabilities_path(), "r") as f:
+                capabilities = json.load(f)
+            if isinstance(capabilities, list):
+                return capabilities
+        except (IOError, ValueError):
+            pass
+        return None
+
+    def _save_capabilities(self):
+        capabilities = self.source.get_learned_capabilities()
+        if not self.cache_path or capabilities is None or capabilities == self.saved_capabilities:
+            return
+
+        try:
+            if not os.path.exists(self.cache_path):
+                os.makedirs(self.cache_path, 0755)
+
+            capabilities_path = self._make_capabilities_path()
+            tmp_path = "%s.%d.tmp" % (capabilities_path, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump(capabilities, f)
+            os.rename(tmp_path, capabilities_path)
+            self.saved_capabilities = capabilities
+        except (IOError, OSError), e:
+            sdm_util.log_message("Cannot save catalogue server capabilities : %s" % e, sdm_util.LogLevel.WARNING)
+
+    def _load_snapshot(self):
+        if not self.cache_path:
+            return None
 
-    def load_table(self, url):
-        self.table = {}
         try:
-            req = [grequests.get(url, verify=False)]
-            res = grequests.map(set(req))[0]
-            ent_arr = res.json()
-            for ent in ent_arr:
+            with open(self._make_snapshot_path(), "r") as f:
+                snapshot = json.load(f)
+
+            table = {}
+            for ent in snapshot["entries"]:
                 entry = RepositoryEntry.from_dict(ent)
-                self.table[entry.dataset] = entry
+                table[entry.dataset] = entry
+
+            name_tree = None
+            if snapshot.get("name_tree") is not None:
+                name_tree = sdm_bktree.BKTree.from_list(snapshot["name_tree"])
+            return snapshot["version"], table, name_tree
+        except (IOError, ValueError, KeyError, TypeError, IndexError):
+            return None
+
+    def _save_snapshot(self, version, table, name_tree=None):
+        if not self.cache_path:
+            return
+
+        if not os.path.exists(self.cache_path):
+            os.makedirs(self.cache_path, 0755)
+
+        snapshot_path = self._make_snapshot_path()
+        tmp_path = "%s.%d.tmp" % (snapshot_path, os.getpid())
+        snapshot = {
+            "url": self.url,
+            "version": version,
+            "entries": [entry.to_dict() for entry in table.values()]
+        }
+        if name_tree is not None:
+            snapshot["name_tree"] = name_tree.to_list()
+
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        # replace the snapshot atomically
+        os.rename(tmp_path, snapshot_path)
+        self.snapshot_version = version
+
+    def _set_table(self, version, table, index=None, name_tree=None):
+        self.table, self.index, self.version = table, index, version
+        self.name_tree = name_tree
+
+    def _get_name_tree(self):
+        # snapshots of older versions come without a tree
+        if self.name_tree is None:
+            self.name_tree = sdm_bktree.BKTree(sorted(self.table.keys()))
+        return self.name_tree
+
+    def _get_index(self):
+        # listing without a query never needs the index
+        if self.index is None:
+            self.index = RepositoryIndex.build(self.table.values())
+        return self.index
+
+    def _apply_full(self, catalogue):
+        table = {}
+        for ent in catalogue["entries"]:
+            entry = RepositoryEntry.from_dict(ent)
+            table[entry.dataset] = entry
+
+        index = None
+        if catalogue.get("index") is not None:
+            # catalogue artifacts come with a prebuilt index
+            index = RepositoryIndex.from_dict(catalogue["index"])
+
+        name_tree = None
+        if catalogue.get("name_tree") is not None:
+            # so is the tree of dataset names
+            name_tree = sdm_bktree.BKTree.from_list(catalogue["name_tree"])
+
+        # an unversioned catalogue may have changed without notice
+        if catalogue["version"] is None or catalogue["version"] != self.snapshot_version:
+            if name_tree is None:
+                # built once per catalogue version, suggestions reuse it
+                name_tree = sdm_bktree.BKTree(sorted(table.keys()))
+            self._save_snapshot(catalogue["version"], table, name_tree)
+        elif name_tree is None:
+            # the catalogue of the snapshot, so is its tree
+            name_tree = self.name_tree
+        self._set_table(catalogue["version"], table, index, name_tree)
+
+    def _apply_delta(self, version, table, delta, name_tree=None):
+        # returns False if the server cannot produce the delta
+        if delta is None:
+            return False
+
+        if "entries" in delta:
+            # the server sent the full catalogue
+            self._apply_full(delta)
+            return True
+
+        # parse all changes before touching the table
+        removed = [k.strip().lower() for k in delta["removed"]]
+        changed = [RepositoryEntry.from_dict(ent) for ent in delta["added"] + delta["modified"]]
+
+        new_table = dict(table)
+        old_entries = []
+        for k in removed:
+            if k in new_table:
+                old_entries.append(new_table.pop(k))
+
+        for entry in changed:
+            if entry.dataset in new_table:
+                old_entries.append(new_table[entry.dataset])
+            new_table[entry.dataset] = entry
+
+        new_index = None
+        if table is self.table and self.index is not None:
+            new_index = self.index.apply(old_entries, changed)
+
+        sdm_util.log_message("Applied a catalogue delta %s -> %s : %d changed, %d removed" % (version, delta["version"], len(changed), len(removed)))
+        new_name_tree = name_tree
+        if delta["version"] != version or len(changed) > 0 or len(removed) > 0:
+            if new_name_tree is None or len(removed) > 0:
+                # words cannot be removed from a BKTree
+                new_name_tree = sdm_bktree.BKTree(sorted(new_table.keys()))
+            else:
+                for entry in changed:
+                    new_name_tree.add(entry.dataset)
+            self._save_snapshot(delta["version"], new_table, new_name_tree)
+        self._set_table(delta["version"], new_table, new_index, new_name_tree)
+        return True
+
+    def load_table(self):
+        # sync the loaded table or the local snapshot with the server
+        try:
+            snapshot = None
+            if self.table is not None:
+                snapshot = self.version, self.table, self.name_tree
+            else:
+                snapshot = self._load_snapshot()
+                if snapshot is not None:
+                    self.snapshot_version = snapshot[0]
+                    self.name_tree = snapshot[2]
+
+            if snapshot is not None:
+                version, table, name_tree = snapshot
+                if version is not None and self.source.has_capability(sdm_catalogue_source.CatalogueCapability.DELTA):
+                    try:
+                        if self._apply_delta(version, table, self.source.fetch_delta(version), name_tree):
+                            return
+                    except sdm_deadline.DeadlineExceededException:
+                        raise
+                    except Exception, e:
+                        sdm_util.log_message("Cannot apply a catalogue delta, falling back to a full sync : %s" % e, sdm_util.LogLevel.WARNING)
+
+            self._apply_full(self.source.fetch_all())
+        except sdm_deadline.DeadlineExceededException:
+            raise
         except Exception, e:
             raise RepositoryException("cannot retrieve repository entries : %s" % e)
+        finally:
+            self._save_capabilities()
+
+    def _get_table(self):
+        # the full catalogue is loaded only when needed
+        if self.table is None:
+            self.load_table()
+        return self.table
+
+    def _lookup_entry(self, dataset):
+        # returns False if the server cannot look up a dataset
+        if self.table is not None:
+            return False
+
+        if not self.source.has_capability(sdm_catalogue_source.CatalogueCapability.LOOKUP):
+            return False
+
+        try:
+            ent = self.source.fetch_entry(dataset)
+            if ent is None:
+                return None
+            return RepositoryEntry.from_dict(ent)
+        except sdm_deadline.DeadlineExceededException:
+            raise
+        except Exception, e:
+            sdm_util.log_message("Cannot look up a dataset, falling back to the full catalogue : %s" % e, sdm_util.LogLevel.WARNING)
+            return False
+        finally:
+            self._save_capabilities()
+
+    def _query_entries(self, query, limit):
+        # returns None if the server cannot answer the query
+        if self.table is not None:
+            return None
+
+        if not query and limit is None:
+            return None
+
+        if query and not self.source.has_capability(sdm_catalogue_source.CatalogueCapability.QUERY):
+            return None
+
+        if limit is not None and not self.source.has_capability(sdm_catalogue_source.CatalogueCapability.LIMIT):
+            return None
+
+        try:
+            entries = []
+            for ent in self.source.query(query, limit):
+                entries.append(RepositoryEntry.from_dict(ent))
+            return entries
+        except sdm_deadline.DeadlineExceededException:
+            raise
+        except Exception, e:
+            sdm_util.log_message("Cannot query datasets, falling back to the full catalogue : %s" % e, sdm_util.LogLevel.WARNING)
+            return None
+        finally:
+            self._save_capabilities()
 
     def get_entry(self, dataset):
         k = dataset.strip().lower()
-        if k in self.table:
-            return self.table[k]
+
+        entry = self._lookup_entry(k)
+        if entry is not False:
+            return entry
+
+        table = self._get_table()
+        if k in table:
+            return table[k]
         return None
 
+    def suggest(self, dataset, limit=MAX_SUGGESTIONS):
+        """
+        Return [(distance, dataset)] of datasets with similar names,
+        closest first
+        """
+        k = dataset.strip().lower()
+        table = self._get_table()
+
+        # allow about one edit per three characters
+        max_distance = min(MAX_SUGGESTION_DISTANCE, max(1, len(k) / 3))
+        results = []
+        for distance, name in self._get_name_tree().search(k, max_distance):
+            # a tree from an artifact is not covered by its content hash
+            if name in table:
+                results.append((distance, name))
+        return results[:limit]
+
     def check_match(self, query, entry):
         if query in entry.dataset.lower():
             return True
 
-        if query in username.lower():
+        if query in entry.username.lower():
             return True
 
-        if query in description.lower():
+        if query in entry.description.lower():
             return True
 
         return False
 
-    def list_entries(self, query=None):
-        entries = []
-        for k in self.table.keys():
+    def iter_entries(self, query=None, limit=None):
+        entries = self._query_entries(query, limit)
+        if entries is not None:
+            for entry in entries:
+                yield entry
+            return
+
+        table = self._get_table()
+        keys = None
+        if query:
+            keys = self._get_index().search(query)
+        if keys is None:
+            keys = table.keys()
+
+        cnt = 0
+        for k in keys:
+            if limit is not None and cnt >= limit:
+                return
+
             if query:
-                if self.check_match(query, self.table[k]):
-                    entries.append(self.table[k])
+                if self.check_match(query, table[k]):
+                    cnt += 1
+                    yield table[k]
             else:
-                entries.append(self.table[k])
-        return entries
+                cnt += 1
+                yield table[k]
+
+    def list_entries(self, query=None, limit=None):
+        return list(self.iter_entries(query, limit))
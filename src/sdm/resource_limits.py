@@ -0,0 +1,330 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/resource_limits.py
+#   Limit CPU, memory and I/O used by background processes
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import psutil
+
+CGROUP_FS_ROOT = "/sys/fs/cgroup"
+DEFAULT_CGROUP_ROOT = "/sys/fs/cgroup/sdm"
+CPU_MAX_PERIOD = 100000 # usec
+
+IONICE_CLASSES = {
+    "realtime": 1,
+    "best-effort": 2,
+    "idle": 3
+}
+
+
+class ResourceLimitsException(Exception):
+    pass
+
+
+def _check_range(name, v, low, high, types=(int, long)):
+    if isinstance(v, bool) or not isinstance(v, types) or v < low or (high is not None and v > high):
+        if high is None:
+            raise ResourceLimitsException("%s must be a number not less than %s - %s" % (name, low, v))
+        raise ResourceLimitsException("%s must be a number between %s and %s - %s" % (name, low, high, v))
+    return v
+
+
+class ResourceLimits(object):
+    """
+    Limits applied to a process and the threads it starts.
+    cpu_weight, cpu_max, memory_max and io_weight need a cgroup (v2);
+    nice, ionice and cpu_affinity work without one.
+    """
+    def __init__(self):
+        # start processes in their own cgroup under cgroup_root
+        self.cgroup = False
+        self.cgroup_root = DEFAULT_CGROUP_ROOT
+        self.cpu_weight = None # 1 - 10000, 100 is the default of the kernel
+        self.cpu_max = None # CPUs, e.g. 1.5
+        self.memory_max = None # bytes
+        self.io_weight = None # 1 - 10000
+        self.nice = None # -20 - 19
+        self.ionice_class = None # realtime, best-effort or idle
+        self.ionice_level = None # 0 - 7
+        self.cpu_affinity = None # [cpu]
+
+    @classmethod
+    def from_dict(cls, d):
+        limits = ResourceLimits()
+        if "cgroup" in d:
+            limits.cgroup = bool(d["cgroup"])
+        if "cgroup_root" in d:
+            limits.cgroup_root = d["cgroup_root"]
+        if "cpu_weight" in d and d["cpu_weight"] is not None:
+            limits.cpu_weight = _check_range("cpu_weight", d["cpu_weight"], 1, 10000)
+        if "cpu_max" in d and d["cpu_max"] is not None:
+            limits.cpu_max = _check_range("cpu_max", d["cpu_max"], 0.01, None, (int, long, float))
+        if "memory_max" in d and d["memory_max"] is not None:
+            limits.memory_max = _check_range("memory_max", d["memory_max"], 1, None)
+        if "io_weight" in d and d["io_weight"] is not None:
+            limits.io_weight = _check_range("io_weight", d["io_weight"], 1, 10000)
+        if "nice" in d and d["nice"] is not None:
+            limits.nice = _check_range("nice", d["nice"], -20, 19)
+        if "ionice_class" in d and d["ionice_class"] is not None:
+            if d["ionice_class"] not in IONICE_CLASSES:
+                raise ResourceLimitsException("unknown ionice class - %s, choose from %s" % (d["ionice_class"], ", ".join(sorted(IONICE_CLASSES.keys()))))
+            limits.ionice_class = d["ionice_class"]
+        if "ionice_level" in d and d["ionice_level"] is not None:
+            limits.ionice_level = _check_range("ionice_level", d["ionice_level"], 0, 7)
+        if "cpu_affinity" in d and d["cpu_affinity"] is not None:
+            cpus = d["cpu_affinity"]
+            if not isinstance(cpus, list) or len(cpus) == 0:
+                raise ResourceLimitsException("cpu_affinity must be a list of CPUs - %s" % cpus)
+            limits.cpu_affinity = [_check_range("cpu_affinity", c, 0, None) for c in cpus]
+        return limits
+
+    def to_dict(self):
+        return {
+            "cgroup": self.cgroup,
+            "cgroup_root": self.cgroup_root,
+            "cpu_weight": self.cpu_weight,
+            "cpu_max": self.cpu_max,
+            "memory_max": self.memory_max,
+            "io_weight": self.io_weight,
+            "nice": self.nice,
+            "ionice_class": self.ionice_class,
+            "ionice_level": self.ionice_level,
+            "cpu_affinity": self.cpu_affinity
+        }
+
+    def has_process_limits(self):
+        return self.nice is not None or self.ionice_class is not None or self.cpu_affinity is not None
+
+    def get_cgroup_settings(self):
+        """
+        Return {file: value} to write to the cgroup of a process
+        """
+        settings = {}
+        if self.cpu_weight is not None:
+            settings["cpu.weight"] = "%d" % self.cpu_weight
+        if self.cpu_max is not None:
+            settings["cpu.max"] = "%d %d" % (int(self.cpu_max * CPU_MAX_PERIOD), CPU_MAX_PERIOD)
+        if self.memory_max is not None:
+            settings["memory.max"] = "%d" % self.memory_max
+        if self.io_weight is not None:
+            settings["io.weight"] = "default %d" % self.io_weight
+        return settings
+
+    def __eq__(self, other):
+        return self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return "<ResourceLimits %s %s>" % \
+            (self.cgroup, self.cgroup_root)
+
+
+def is_cgroup2_available():
+    return os.path.exists("%s/cgroup.controllers" % CGROUP_FS_ROOT)
+
+
+def _write(path, value):
+    with open(path, "w") as f:
+        f.write(value)
+
+
+def create_cgroup(limits, name):
+    """
+    Create a cgroup for a process under limits.cgroup_root and return its path.
+    The root has to be writable by the user, e.g. delegated by systemd.
+    """
+    if not is_cgroup2_available():
+        raise ResourceLimitsException("cgroup v2 is not mounted at %s" % CGROUP_FS_ROOT)
+
+    settings = limits.get_cgroup_settings()
+    cgroup_path = "%s/%s" % (limits.cgroup_root.rstrip("/"), name)
+    try:
+        if not os.path.exists(limits.cgroup_root):
+            os.makedirs(limits.cgroup_root, 0755)
+
+        # controllers have to be enabled in the parent of the cgroups using them
+        controllers = sorted(set([k.split(".")[0] for k in settings.keys()]))
+        if controllers:
+            _write("%s/cgroup.subtree_control" % limits.cgroup_root, " ".join(["+%s" % c for c in controllers]))
+
+        if not os.path.exists(cgroup_path):
+            os.mkdir(cgroup_path, 0755)
+
+        for k in sorted(settings.keys()):
+            _write("%s/%s" % (cgroup_path, k), settings[k])
+    except (IOError, OSError), e:
+        remove_cgroup(cgroup_path)
+        raise ResourceLimitsException("cannot set up a cgroup %s : %s" % (cgroup_path, e))
+    return cgroup_path
+
+
+def remove_cgroup(cgroup_path):
+    # a cgroup can be removed once its processes are gone
+    try:
+        if cgroup_path and os.path.isdir(cgroup_path):
+            os.rmdir(cgroup_path)
+    except OSError:
+        pass
+
+
+def get_process_cgroup(pid):
+    """
+    Return the path of the cgroup (v2) a process is in, or None
+    """
+    try:
+        with open("/proc/%d/cgroup" % pid, "r") as f:
+            for line in f:
+                # "0::<path>" is the cgroup v2 hierarchy
+                hierarchy, _, path = line.rstrip("\n").split(":", 2)
+                if hierarchy == "0":
+                    return os.path.normpath("%s/%s" % (CGROUP_FS_ROOT, path.lstrip("/")))
+    except (IOError, ValueError):
+        pass
+    return None
+
+
+def join_cgroup(cgroup_path, pid):
+    """
+    Move a running process and its threads to a cgroup.
+    The move is checked with /proc/<pid>/cgroup.
+    """
+    try:
+        _write("%s/cgroup.procs" % cgroup_path, "%d" % pid)
+    except (IOError, OSError), e:
+        raise ResourceLimitsException("cannot move process %d to a cgroup %s : %s" % (pid, cgroup_path, e))
+
+    if get_process_cgroup(pid) != os.path.normpath(cgroup_path):
+        raise ResourceLimitsException("process %d is not in a cgroup %s" % (pid, cgroup_path))
+
+
+def _get_thread_ids(pid):
+    try:
+        return sorted([int(tid) for tid in os.listdir("/proc/%d/task" % pid)])
+    except (OSError, ValueError):
+        return [pid]
+
+
+def apply_process_limits(limits, pid):
+    """
+    Apply nice, ionice and CPU affinity to every thread of a running
+    process; threads it starts later inherit them from their creator.
+    Limits are applied by the caller rather than in the child before exec,
+    as running Python between fork and exec is not safe when the caller
+    has other threads.
+    """
+    errors = []
+    for tid in _get_thread_ids(pid):
+        try:
+            # Linux keeps these per thread, a thread id works as a pid
+            p = psutil.Process(tid)
+        except psutil.NoSuchProcess:
+            continue
+
+        if limits.nice is not None:
+            try:
+                p.nice(limits.nice)
+            except (psutil.Error, OSError, ValueError), e:
+                errors.append("nice - %s" % e)
+
+        if limits.ionice_class is not None:
+            try:
+                ioclass = IONICE_CLASSES[limits.ionice_class]
+                if ioclass == IONICE_CLASSES["idle"]:
+                    p.ionice(ioclass)
+                else:
+                    p.ionice(ioclass, limits.ionice_level or 0)
+            except (psutil.Error, OSError, ValueError), e:
+                errors.append("ionice - %s" % e)
+
+        if limits.cpu_affinity is not None:
+            try:
+                p.cpu_affinity(limits.cpu_affinity)
+            except (psutil.Error, OSError, ValueError), e:
+                errors.append("cpu_affinity - %s" % e)
+
+    if errors:
+        raise ResourceLimitsException("cannot apply limits to process %d : %s" % (pid, ", ".join(sorted(set(errors)))))
+
+
+def _read_keyed(path):
+    # reads "key value" lines of cgroup stat files
+    values = {}
+    with open(path, "r") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2:
+                values[fields[0]] = int(fields[1])
+    return values
+
+
+def get_cgroup_usage(cgroup_path):
+    usage = {}
+    cpu = _read_keyed("%s/cpu.stat" % cgroup_path)
+    usage["cpu_sec"] = round(cpu.get("usage_usec", 0) / 1000000.0, 3)
+
+    memory_path = "%s/memory.current" % cgroup_path
+    if os.path.exists(memory_path):
+        with open(memory_path, "r") as f:
+            usage["memory_bytes"] = int(f.read().strip())
+
+    io_path = "%s/io.stat" % cgroup_path
+    if os.path.exists(io_path):
+        rbytes = 0
+        wbytes = 0
+        with open(io_path, "r") as f:
+            # <major>:<minor> rbytes=... wbytes=... per device
+            for line in f:
+                for field in line.split()[1:]:
+                    k, _, v = field.partition("=")
+                    if k == "rbytes":
+                        rbytes += int(v)
+                    elif k == "wbytes":
+                        wbytes += int(v)
+        usage["read_bytes"] = rbytes
+        usage["write_bytes"] = wbytes
+    return usage
+
+
+def get_process_usage(process):
+    usage = {}
+    cpu_times = process.cpu_times()
+    usage["cpu_sec"] = round(cpu_times.user + cpu_times.system, 3)
+    usage["memory_bytes"] = process.memory_info().rss
+    try:
+        io = process.io_counters()
+        usage["read_bytes"] = io.read_bytes
+        usage["write_bytes"] = io.write_bytes
+    except (psutil.AccessDenied, AttributeError, NotImplementedError):
+        pass
+    return usage
+
+
+def get_usage(cgroup_path=None, process=None):
+    """
+    Return {"cpu_sec", "memory_bytes", "read_bytes", "write_bytes"} of a
+    cgroup, or of a process where it has no cgroup. Missing values are left out.
+    """
+    if cgroup_path and os.path.isdir(cgroup_path):
+        try:
+            return get_cgroup_usage(cgroup_path)
+        except (IOError, OSError, ValueError):
+            pass
+
+    if process is not None:
+        try:
+            return get_process_usage(process)
+        except psutil.Error:
+            pass
+    return None
@@ -18,13 +18,21 @@
 
 import os
 import json
-import grequests
 import urlparse
 import abstract_backend as sdm_absbackends
+import rest_transport as sdm_rest_transport
+import host_health as sdm_host_health
+import placement as sdm_placement
+import deadline as sdm_deadline
+import tracing as sdm_tracing
 import util as sdm_util
 
 DEFAULT_REST_HOSTS = ["http://localhost:8888"]
 DEFAULT_MOUNT_PATH = "hsyn:///"
+# 0 - every host keeps every dataset
+DEFAULT_REPLICAS = 0
+# requests carrying the trace to REST hosts
+TRACED_ENDPOINT_PREFIXES = ["/user/", "/gateway/"]
 
 
 class RestBackendException(sdm_absbackends.AbstractBackendException):
@@ -38,12 +46,43 @@ class RestBackendConfig(sdm_absbackends.AbstractBackendConfig):
     def __init__(self):
         self.default_mount_path = DEFAULT_MOUNT_PATH
         self.rest_hosts = DEFAULT_REST_HOSTS
+        self.transport = sdm_rest_transport.DEFAULT_TRANSPORT
+        self.max_connections_per_host = sdm_rest_transport.DEFAULT_MAX_CONNECTIONS_PER_HOST
+        self.max_retries = sdm_rest_transport.DEFAULT_MAX_RETRIES
+        self.hedge_requests = sdm_rest_transport.DEFAULT_HEDGE_REQUESTS
+        self.circuit_error_threshold = sdm_host_health.DEFAULT_CIRCUIT_ERROR_THRESHOLD
+        self.circuit_open_sec = sdm_host_health.DEFAULT_CIRCUIT_OPEN_SEC
+        self.replicas = DEFAULT_REPLICAS
+        self.health_path = sdm_host_health.DEFAULT_HEALTH_PATH
+        self.placement_path = sdm_placement.DEFAULT_PLACEMENT_PATH
+        # rest_host -> weight, 1 if not given
+        self.host_weights = {}
 
     @classmethod
     def from_dict(cls, d):
         config = RestBackendConfig()
         config.default_mount_path = d["default_mount_path"]
         config.rest_hosts = d["rest_hosts"]
+        if "transport" in d:
+            config.transport = d["transport"]
+        if "max_connections_per_host" in d:
+            config.max_connections_per_host = d["max_connections_per_host"]
+        if "max_retries" in d:
+            config.max_retries = d["max_retries"]
+        if "hedge_requests" in d:
+            config.hedge_requests = d["hedge_requests"]
+        if "circuit_error_threshold" in d:
+            config.circuit_error_threshold = d["circuit_error_threshold"]
+        if "circuit_open_sec" in d:
+            config.circuit_open_sec = d["circuit_open_sec"]
+        if "replicas" in d:
+            config.replicas = d["replicas"]
+        if "host_weights" in d:
+            config.host_weights = d["host_weights"]
+        if "health_path" in d:
+            config.health_path = d["health_path"]
+        if "placement_path" in d:
+            config.placement_path = d["placement_path"]
         return config
 
     @classmethod
@@ -53,15 +92,25 @@ class RestBackendConfig(sdm_absbackends.AbstractBackendConfig):
     def to_json(self):
         return json.dumps({
             "default_mount_path": self.default_mount_path,
-            "rest_hosts": self.rest_hosts
+            "rest_hosts": self.rest_hosts,
+            "transport": self.transport,
+            "max_connections_per_host": self.max_connections_per_host,
+            "max_retries": self.max_retries,
+            "hedge_requests": self.hedge_requests,
+            "circuit_error_threshold": self.circuit_error_threshold,
+            "circuit_open_sec": self.circuit_open_sec,
+            "replicas": self.replicas,
+            "host_weights": self.host_weights,
+            "health_path": self.health_path,
+            "placement_path": self.placement_path
         })
 
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
 
     def __repr__(self):
-        return "<RestBackendConfig %s>" % \
-            (self.rest_hosts)
+        return "<RestBackendConfig %s %s>" % \
+            (self.rest_hosts, self.transport)
 
 
 class RestBackend(sdm_absbackends.AbstractBackend):
@@ -70,6 +119,23 @@ class RestBackend(sdm_absbackends.AbstractBackend):
     """
     def __init__(self, backend_config):
         self.backend_config = backend_config
+        try:
+            self.transport = sdm_rest_transport.get_transport(backend_config.transport, backend_config)
+        except sdm_rest_transport.RestTransportException, e:
+            raise RestBackendException(e)
+        self.health = sdm_host_health.HostHealthTable(
+            backend_config.health_path,
+            backend_config.circuit_error_threshold,
+            backend_config.circuit_open_sec
+        )
+        self.transport.set_health(self.health)
+        try:
+            self.ring = sdm_placement.ConsistentHashRing(backend_config.rest_hosts, backend_config.host_weights)
+        except sdm_placement.PlacementException, e:
+            raise RestBackendException(e)
+        self.placements = sdm_placement.PlacementTable(backend_config.placement_path)
+        self.deadline = sdm_deadline.Deadline()
+        self.trace = sdm_tracing.Trace()
 
     @classmethod
     def get_name(cls):
@@ -110,23 +176,149 @@ class RestBackend(sdm_absbackends.AbstractBackend):
             return path[:idx]
         return path
 
+    def _get_replica_hosts(self, session_name):
+        # hosts to place the session on
+        if self.backend_config.replicas <= 0:
+            hosts = list(self.backend_config.rest_hosts)
+        else:
+            hosts = self.ring.get_hosts(session_name, self.backend_config.replicas)
+
+        if len(hosts) == 0:
+            raise RestBackendException("no REST host can keep %s - there is no host or every host has weight 0" % session_name)
+        return hosts
+
+    def _get_known_hosts(self, hosts):
+        # hosts removed from rest_hosts cannot be reached anymore
+        known_hosts = []
+        for host in hosts:
+            if host in self.backend_config.rest_hosts:
+                known_hosts.append(host)
+            else:
+                sdm_util.log_message("Skipping a REST host no longer configured : %s" % host, sdm_util.LogLevel.WARNING)
+        return known_hosts
+
+    def _get_placed_hosts(self, mount_id, session_name):
+        """
+        Return (hosts, user_hosts) a mount was placed on. Hosts the ring
+        places the session on now are added, as mounts made before
+        placements were kept live there.
+        """
+        placement = self.placements.get(mount_id)
+        if placement is None:
+            hosts = self._get_replica_hosts(session_name)
+            return hosts, hosts
+
+        try:
+            hosts = self._get_replica_hosts(session_name)
+        except RestBackendException:
+            # the ring is empty, the placed hosts are still there
+            hosts = []
+
+        placed_hosts = self._get_known_hosts(placement.hosts)
+        user_hosts = self._get_known_hosts(placement.user_hosts)
+        for host in hosts:
+            if host not in placed_hosts:
+                placed_hosts.append(host)
+            if host not in user_hosts:
+                user_hosts.append(host)
+        return placed_hosts, user_hosts
+
     def _raise_error_on_http_error(self, status_code):
         if status_code >= 400 and status_code <= 599:
             raise RestBackendException("received a http error - code %s" % status_code)
 
+    def get_host_health(self):
+        health = []
+        for rest_host in self.backend_config.rest_hosts:
+            health.append(self.health.get_health(rest_host))
+        return health
+
+    def _record_health(self, reqs, ress):
+        try:
+            for idx in range(len(reqs)):
+                res = ress[idx]
+                if res is None or res.status_code >= 500:
+                    if res is None and self.deadline.is_expired():
+                        # ran out of our budget, not the host's fault
+                        continue
+                    self.health.record_failure(reqs[idx].host)
+                else:
+                    self.health.record_success(reqs[idx].host, res.elapsed.total_seconds())
+            self.health.flush()
+        except (IOError, OSError), e:
+            sdm_util.log_message("Cannot save host health : %s" % e, sdm_util.LogLevel.WARNING)
+
+    def _start_spans(self, reqs):
+        spans = []
+        for req in reqs:
+            span = self.trace.start_span("%s %s" % (req.method, req.endpoint), sdm_tracing.SpanKind.CLIENT)
+            span.set_tag("http.method", req.method)
+            span.set_tag("http.host", req.host)
+            span.set_tag("http.path", req.endpoint)
+            for prefix in TRACED_ENDPOINT_PREFIXES:
+                if req.endpoint.startswith(prefix):
+                    req.headers[sdm_tracing.TRACEPARENT_HEADER] = span.get_traceparent()
+                    break
+            spans.append(span)
+        return spans
+
+    def _finish_spans(self, spans, reqs, ress):
+        for idx in range(len(reqs)):
+            span = spans[idx]
+            req = reqs[idx]
+            res = ress[idx]
+            span.set_tag("sdm.retries", req.retries)
+            if req.hedged:
+                span.set_tag("sdm.hedged", "true")
+            if res is None:
+                span.set_tag("error", "no response")
+            else:
+                span.set_tag("http.status_code", res.status_code)
+                if res.status_code >= 400:
+                    span.set_tag("error", "%d" % res.status_code)
+            span.finish(req.finished_at)
+
+    def _request_multi(self, reqs, phase):
+        # returns boolean results of requests in the same order
+        for req in reqs:
+            if not self.health.allow_request(req.host):
+                raise RestBackendException("%s is failing - its circuit is open" % req.host)
+
+        for req in reqs:
+            if self.health.is_probing(req.host) and not self.health.claim_probe(req.host):
+                raise RestBackendException("%s is being probed by another command - its circuit is open" % req.host)
+
+        timeout = self.deadline.remaining(phase)
+        spans = self._start_spans(reqs)
+        ress = self.transport.map(reqs, timeout)
+        self._finish_spans(spans, reqs, ress)
+        self._record_health(reqs, ress)
+
+        results = []
+        idx = 0
+        for res in ress:
+            if res is None:
+                self.deadline.check(phase)
+                raise RestBackendException("cannot connect to %s" % reqs[idx].host)
+            self._raise_error_on_http_error(res.status_code)
+            result = res.json()
+            sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
+            results.append(sdm_util.to_bool(result["result"]))
+            idx += 1
+        return results
+
+    def _request(self, req, phase):
+        return self._request_multi([req], phase)[0]
+
     def _check_syndicate_user(self, rest_host, mount_id):
         try:
-            url = "%s/user/check" % rest_host
             params = {
                 "mount_id": mount_id
             }
-            sdm_util.log_message("Sending a HTTP GET request : %s" % url)
-            req = [grequests.get(url, params=params)]
-            res = grequests.map(set(req))[0]
-            self._raise_error_on_http_error(res.status_code)
-            result = res.json()
-            sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-            return sdm_util.to_bool(result["result"])
+            req = sdm_rest_transport.RestRequest("GET", rest_host, "/user/check", params=params, idempotent=True)
+            return self._request(req, "user check")
+        except sdm_deadline.DeadlineExceededException:
+            raise
         except Exception, e:
             raise RestBackendException("cannot check user : %s" % e)
 
@@ -138,55 +330,21 @@ class RestBackend(sdm_absbackends.AbstractBackend):
 
             reqs = []
             for rest_host in rest_hosts:
-                url = "%s/user/check" % rest_host
-                sdm_util.log_message("Sending a HTTP GET request : %s" % url)
-                req = grequests.get(url, params=params)
-                reqs.append(req)
+                reqs.append(sdm_rest_transport.RestRequest("GET", rest_host, "/user/check", params=params, idempotent=True))
 
-            ress = grequests.map(set(reqs))
             results = {}
             idx = 0
-            for res in ress:
-                self._raise_error_on_http_error(res.status_code)
-                result = res.json()
-                sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                rest_host = rest_hosts[idx]
-                results[rest_host] = sdm_util.to_bool(result["result"])
+            for r in self._request_multi(reqs, "user check"):
+                results[rest_hosts[idx]] = r
                 idx += 1
             return results
+        except sdm_deadline.DeadlineExceededException:
+            raise
         except Exception, e:
             raise RestBackendException("cannot check user : %s" % e)
 
     def _regist_syndicate_user(self, rest_host, mount_id, dataset, username, user_pkey, gateway_name, ms_host):
-        # check if mount_id already exists
-        skip_config = False
-        if self._check_syndicate_user(rest_host, mount_id):
-            skip_config = True
-
-        if not skip_config:
-            sdm_util.log_message("Setting up Syndicate for an user, %s" % username)
-            try:
-                # register
-                url = "%s/user/setup" % rest_host
-                values = {
-                    "ms_url": ms_host,
-                    "user": username,
-                    "mount_id": mount_id,
-                    "cert": user_pkey
-                }
-                sdm_util.log_message("Sending a HTTP POST request : %s" % url)
-                req = [grequests.post(url, data=values)]
-                res = grequests.map(set(req))[0]
-                self._raise_error_on_http_error(res.status_code)
-                result = res.json()
-                sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                r = sdm_util.to_bool(result["result"])
-                if not r:
-                    raise RestBackendException("cannot setup Syndicate for an user, %s : %s" % (username, r))
-
-                sdm_util.log_message("Successfully set up Syndicate for an user, %s" % username)
-            except Exception, e:
-                raise RestBackendException("cannot setup Syndicate for an user, %s : %s" % (username, e))
+        self._regist_syndicate_user_multi([rest_host], mount_id, dataset, username, user_pkey, gateway_name, ms_host)
 
     def _regist_syndicate_user_multi(self, rest_hosts, mount_id, dataset, username, user_pkey, gateway_name, ms_host):
         # check if mount_id already exists
@@ -212,51 +370,22 @@ class RestBackend(sdm_absbackends.AbstractBackend):
                 reqs = []
                 for rest_host in target_rest_hosts:
                     # for hosts who returned False at check
-                    url = "%s/user/setup" % rest_host
-                    sdm_util.log_message("Sending a HTTP POST request : %s" % url)
-                    req = grequests.post(url, data=values)
-                    reqs.append(req)
+                    reqs.append(sdm_rest_transport.RestRequest("POST", rest_host, "/user/setup", data=values))
 
-                ress = grequests.map(set(reqs))
                 idx = 0
-                for res in ress:
-                    self._raise_error_on_http_error(res.status_code)
-                    result = res.json()
-                    sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                    r = sdm_util.to_bool(result["result"])
+                for r in self._request_multi(reqs, "user setup"):
                     if not r:
                         raise RestBackendException("cannot setup Syndicate for an user, %s - %s : %s" % (target_rest_hosts[idx], username, r))
                     idx += 1
 
                 sdm_util.log_message("Successfully set up Syndicate for an user, %s" % username)
+            except sdm_deadline.DeadlineExceededException:
+                raise
             except Exception, e:
                 raise RestBackendException("cannot setup Syndicate for an user, %s : %s" % (username, e))
 
     def _delete_syndicate_user(self, rest_host, mount_id):
-        # check if mount_id already exists
-        skip_delete = True
-        if self._check_syndicate_user(rest_host, mount_id):
-            skip_delete = False
-
-        if not skip_delete:
-            sdm_util.log_message("Deleting an user, %s" % mount_id)
-            try:
-                # delete
-                url = "%s/user/delete" % rest_host
-                params = {
-                    "mount_id": mount_id
-                }
-                sdm_util.log_message("Sending a HTTP DELETE request : %s" % url)
-                req = [grequests.delete(url, params=params)]
-                res = grequests.map(set(req))[0]
-                self._raise_error_on_http_error(res.status_code)
-                result = res.json()
-                sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                r = sdm_util.to_bool(result["result"])
-                if not r:
-                    raise RestBackendException("cannot delete an user : %s - " % r)
-            except Exception, e:
-                raise RestBackendException("cannot delete an user : %s" % e)
+        self._delete_syndicate_user_multi([rest_host], mount_id)
 
     def _delete_syndicate_user_multi(self, rest_hosts, mount_id):
         # check if mount_id already exists
@@ -277,38 +406,28 @@ class RestBackend(sdm_absbackends.AbstractBackend):
                 }
 
                 reqs = []
-                for rest_host in rest_hosts:
-                    url = "%s/user/delete" % rest_host
-                    sdm_util.log_message("Sending a HTTP DELETE request : %s" % url)
-                    req = grequests.delete(url, params=params)
-                    reqs.append(req)
+                for rest_host in target_rest_hosts:
+                    reqs.append(sdm_rest_transport.RestRequest("DELETE", rest_host, "/user/delete", params=params))
 
-                ress = grequests.map(set(reqs))
                 idx = 0
-                for res in ress:
-                    self._raise_error_on_http_error(res.status_code)
-                    result = res.json()
-                    sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                    r = sdm_util.to_bool(result["result"])
+                for r in self._request_multi(reqs, "user delete"):
                     if not r:
-                        raise RestBackendException("cannot delete an user : %s - %s" % (rest_hosts[idx], r))
+                        raise RestBackendException("cannot delete an user : %s - %s" % (target_rest_hosts[idx], r))
                     idx += 1
+            except sdm_deadline.DeadlineExceededException:
+                raise
             except Exception, e:
                 raise RestBackendException("cannot delete an user : %s" % e)
 
     def _check_syndicate_gateway(self, rest_host, session_name):
         try:
-            success = True
-            url = "%s/gateway/check" % rest_host
             params = {
                 "session_name": session_name
             }
-            req = [grequests.get(url, params=params)]
-            res = grequests.map(set(req))[0]
-            self._raise_error_on_http_error(res.status_code)
-            result = res.json()
-            sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-            return sdm_util.to_bool(result["result"])
+            req = sdm_rest_transport.RestRequest("GET", rest_host, "/gateway/check", params=params, idempotent=True)
+            return self._request(req, "gateway check")
+        except sdm_deadline.DeadlineExceededException:
+            raise
         except Exception, e:
             raise RestBackendException("cannot check mount : %s" % e)
 
@@ -320,57 +439,21 @@ class RestBackend(sdm_absbackends.AbstractBackend):
 
             reqs = []
             for rest_host in rest_hosts:
-                url = "%s/gateway/check" % rest_host
-                sdm_util.log_message("Sending a HTTP GET request : %s" % url)
-                req = grequests.get(url, params=params)
-                reqs.append(req)
+                reqs.append(sdm_rest_transport.RestRequest("GET", rest_host, "/gateway/check", params=params, idempotent=True))
 
-            ress = grequests.map(set(reqs))
             results = {}
             idx = 0
-            for res in ress:
-                self._raise_error_on_http_error(res.status_code)
-                result = res.json()
-                sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                rest_host = rest_hosts[idx]
-                results[rest_host] = sdm_util.to_bool(result["result"])
+            for r in self._request_multi(reqs, "gateway check"):
+                results[rest_hosts[idx]] = r
                 idx += 1
             return results
+        except sdm_deadline.DeadlineExceededException:
+            raise
         except Exception, e:
             raise RestBackendException("cannot check mount : %s" % e)
 
     def _regist_syndicate_gateway(self, rest_host, mount_id, dataset, gateway_name, session_name):
-        # check if session_name already exists
-        skip_config = False
-        if self._check_syndicate_gateway(rest_host, session_name):
-            skip_config = True
-
-        if not skip_config:
-            sdm_util.log_message("Registering a syndicate gateway, %s for %s" % (gateway_name, dataset))
-            try:
-                # register
-                url = "%s/gateway/setup" % rest_host
-                values = {
-                    "mount_id": mount_id,
-                    "session_name": session_name,
-                    "session_key": dataset,
-                    "volume": dataset,
-                    "gateway": gateway_name,
-                    "anonymous": "true"
-                }
-                sdm_util.log_message("Sending a HTTP POST request : %s" % url)
-                req = [grequests.post(url, data=values)]
-                res = grequests.map(set(req))[0]
-                self._raise_error_on_http_error(res.status_code)
-                result = res.json()
-                sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                r = sdm_util.to_bool(result["result"])
-                if not r:
-                    raise RestBackendException("cannot register a syndicate gateway, %s for %s : %s" % (gateway_name, dataset, r))
-
-                sdm_util.log_message("Successfully registered a syndicate gateway, %s for %s" % (gateway_name, dataset))
-            except Exception, e:
-                raise RestBackendException("cannot register a syndicate gateway, %s for %s : %s" % (gateway_name, dataset, e))
+        self._regist_syndicate_gateway_multi([rest_host], mount_id, dataset, gateway_name, session_name)
 
     def _regist_syndicate_gateway_multi(self, rest_hosts, mount_id, dataset, gateway_name, session_name):
         # check if session_name already exists
@@ -398,52 +481,22 @@ class RestBackend(sdm_absbackends.AbstractBackend):
                 reqs = []
                 for rest_host in target_rest_hosts:
                     # for hosts who returned False at check
-                    url = "%s/gateway/setup" % rest_host
-                    sdm_util.log_message("Sending a HTTP POST request : %s" % url)
-                    req = grequests.post(url, data=values)
-                    reqs.append(req)
+                    reqs.append(sdm_rest_transport.RestRequest("POST", rest_host, "/gateway/setup", data=values))
 
-                ress = grequests.map(set(reqs))
                 idx = 0
-                for res in ress:
-                    self._raise_error_on_http_error(res.status_code)
-                    result = res.json()
-                    sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                    r = sdm_util.to_bool(result["result"])
+                for r in self._request_multi(reqs, "gateway setup"):
                     if not r:
                         raise RestBackendException("cannot register a syndicate gateway, %s - %s for %s : %s" % (target_rest_hosts[idx], gateway_name, dataset, r))
                     idx += 1
 
                 sdm_util.log_message("Successfully registered a syndicate gateway, %s for %s" % (gateway_name, dataset))
+            except sdm_deadline.DeadlineExceededException:
+                raise
             except Exception, e:
                 raise RestBackendException("cannot register a syndicate gateway, %s for %s : %s" % (gateway_name, dataset, e))
 
     def _delete_syndicate_gateway(self, rest_host, mount_id, dataset, session_name):
-        # check if session_name already exists
-        skip_delete = True
-        if self._check_syndicate_gateway(rest_host, session_name):
-            skip_delete = False
-
-        if not skip_delete:
-            sdm_util.log_message("Deleting a syndicate gateway, %s" % (session_name))
-            try:
-                # delete
-                url = "%s/gateway/delete" % rest_host
-                params = {
-                    "session_name": session_name,
-                    "session_key": dataset
-                }
-                sdm_util.log_message("Sending a HTTP DELETE request : %s" % url)
-                req = [grequests.delete(url, params=params)]
-                res = grequests.map(set(req))[0]
-                self._raise_error_on_http_error(res.status_code)
-                result = res.json()
-                sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                r = sdm_util.to_bool(result["result"])
-                if not r:
-                    raise RestBackendException("cannot delete gateway : %s - " % r)
-            except Exception, e:
-                raise RestBackendException("cannot delete gateway : %s" % e)
+        self._delete_syndicate_gateway_multi([rest_host], mount_id, dataset, session_name)
 
     def _delete_syndicate_gateway_multi(self, rest_hosts, mount_id, dataset, session_name):
         # check if session_name already exists
@@ -464,37 +517,47 @@ class RestBackend(sdm_absbackends.AbstractBackend):
                 }
 
                 reqs = []
-                for rest_host in rest_hosts:
-                    url = "%s/gateway/delete" % rest_host
-                    sdm_util.log_message("Sending a HTTP DELETE request : %s" % url)
-                    req = grequests.delete(url, params=params)
-                    reqs.append(req)
+                for rest_host in target_rest_hosts:
+                    reqs.append(sdm_rest_transport.RestRequest("DELETE", rest_host, "/gateway/delete", params=params))
 
-                ress = grequests.map(set(reqs))
                 idx = 0
-                for res in ress:
-                    self._raise_error_on_http_error(res.status_code)
-                    result = res.json()
-                    sdm_util.log_message("> RETURN : %s" % result, sdm_util.LogLevel.DEBUG)
-                    r = sdm_util.to_bool(result["result"])
+                for r in self._request_multi(reqs, "gateway delete"):
                     if not r:
-                        raise RestBackendException("cannot delete gateway : %s - %s" % (rest_hosts[idx], r))
+                        raise RestBackendException("cannot delete gateway : %s - %s" % (target_rest_hosts[idx], r))
                     idx += 1
+            except sdm_deadline.DeadlineExceededException:
+                raise
             except Exception, e:
                 raise RestBackendException("cannot delete gateway : %s" % e)
 
-    def mount(self, mount_id, ms_host, dataset, username, user_pkey, gateway_name, mount_path):
+    def mount(self, mount_id, ms_host, dataset, username, user_pkey, gateway_name, mount_path, options=None):
         sdm_util.print_message("Mounting a dataset %s to %s" % (dataset, mount_path), True)
         session_name = self._get_session_name(mount_path)
-
-        self._regist_syndicate_user_multi(self.backend_config.rest_hosts, mount_id, dataset, username, user_pkey, gateway_name, ms_host)
-        self._regist_syndicate_gateway_multi(self.backend_config.rest_hosts, mount_id, dataset, gateway_name, session_name)
+        rest_hosts = self._get_replica_hosts(session_name)
+
+        # recorded first so that a failed mount is still removed where it was placed
+        placement = self.placements.get(mount_id) or sdm_placement.Placement()
+        user_hosts = list(placement.user_hosts)
+        for host in rest_hosts:
+            if host not in user_hosts:
+                user_hosts.append(host)
+        self.placements.set(mount_id, sdm_placement.Placement(rest_hosts, user_hosts))
+
+        self._regist_syndicate_user_multi(rest_hosts, mount_id, dataset, username, user_pkey, gateway_name, ms_host)
+        self._regist_syndicate_gateway_multi(rest_hosts, mount_id, dataset, gateway_name, session_name)
         sdm_util.print_message("A dataset %s is mounted to %s" % (dataset, mount_path), True)
 
     def check_mount(self, mount_id, dataset, mount_path):
         session_name = self._get_session_name(mount_path)
         try:
-            results = self._check_syndicate_gateway_multi(self.backend_config.rest_hosts, session_name)
+            placement = self.placements.get(mount_id)
+            if placement is not None:
+                rest_hosts = self._get_known_hosts(placement.hosts)
+            else:
+                rest_hosts = self._get_replica_hosts(session_name)
+            if len(rest_hosts) == 0:
+                return False
+            results = self._check_syndicate_gateway_multi(rest_hosts, session_name)
             result = True
             for r_result in results.values():
                 if not r_result:
@@ -507,9 +570,12 @@ class RestBackend(sdm_absbackends.AbstractBackend):
     def unmount(self, mount_id, dataset, mount_path, cleanup=False):
         sdm_util.print_message("Unmounting a dataset %s mounted at %s" % (dataset, mount_path), True)
         session_name = self._get_session_name(mount_path)
+        rest_hosts, user_hosts = self._get_placed_hosts(mount_id, session_name)
 
-        self._delete_syndicate_gateway_multi(self.backend_config.rest_hosts, mount_id, dataset, session_name)
+        # hosts without the session are skipped by the check before deleting
+        self._delete_syndicate_gateway_multi(rest_hosts, mount_id, dataset, session_name)
         if cleanup:
-            self._delete_syndicate_user_multi(self.backend_config.rest_hosts, mount_id)
+            self._delete_syndicate_user_multi(user_hosts, mount_id)
+            self.placements.remove(mount_id)
 
         sdm_util.print_message("Successfully unmounted a dataset %s mounted at %s" % (dataset, mount_path), True)
@@ -0,0 +1,271 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/rest_transport.py
+#   Send HTTP requests to REST hosts
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import time
+import random
+import collections
+import grequests
+import requests
+import gevent
+import gevent.lock
+import util as sdm_util
+
+DEFAULT_TRANSPORT = "grequests"
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 4
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.1 # sec
+DEFAULT_BACKOFF_MAX = 2.0 # sec
+DEFAULT_HEDGE_REQUESTS = True
+
+# latency samples kept per host
+LATENCY_WINDOW = 100
+# samples needed before hedging
+HEDGE_MIN_SAMPLES = 10
+
+
+class RestTransportException(Exception):
+    pass
+
+
+class RestRequest(object):
+    """
+    HTTP request to a REST host
+    """
+    def __init__(self, method, host, endpoint, params=None, data=None, idempotent=False, headers=None):
+        self.method = method.upper()
+        self.host = host
+        self.endpoint = endpoint
+        self.params = params
+        self.data = data
+        # idempotent requests can be retried and hedged
+        self.idempotent = idempotent
+        self.headers = headers or {}
+        # filled in by transports
+        self.retries = 0
+        self.hedged = False
+        self.finished_at = None
+
+    @property
+    def url(self):
+        return "%s%s" % (self.host.rstrip("/"), self.endpoint)
+
+    def __repr__(self):
+        return "<RestRequest %s %s>" % \
+            (self.method, self.url)
+
+
+def _make_finish_hook(req):
+    def _hook(res, *args, **kwargs):
+        req.finished_at = time.time()
+        return res
+    return _hook
+
+
+class GRequestsTransport(object):
+    """
+    Send requests in parallel with grequests
+    """
+    def __init__(self, backend_config=None):
+        pass
+
+    @classmethod
+    def get_name(cls):
+        return "grequests"
+
+    def set_health(self, health):
+        # requests are not hedged
+        pass
+
+    def map(self, reqs, timeout=None):
+        """
+        Send requests and return responses in the same order.
+        A response is None if the request failed.
+        """
+        greqs = []
+        for req in reqs:
+            sdm_util.log_message("Sending a HTTP %s request : %s" % (req.method, req.url))
+            greqs.append(grequests.request(req.method, req.url, params=req.params, data=req.data, headers=req.headers, timeout=timeout, hooks={"response": _make_finish_hook(req)}))
+        return grequests.map(greqs)
+
+
+class GeventTransport(object):
+    """
+    Send requests in greenlets with per-host concurrency limits,
+    retries with jittered exponential backoff and hedged requests
+    """
+    def __init__(self, backend_config=None):
+        self.max_connections_per_host = DEFAULT_MAX_CONNECTIONS_PER_HOST
+        self.max_retries = DEFAULT_MAX_RETRIES
+        self.hedge_requests = DEFAULT_HEDGE_REQUESTS
+        self.backoff_base = DEFAULT_BACKOFF_BASE
+        self.backoff_max = DEFAULT_BACKOFF_MAX
+
+        if backend_config:
+            self.max_connections_per_host = backend_config.max_connections_per_host
+            self.max_retries = backend_config.max_retries
+            self.hedge_requests = backend_config.hedge_requests
+
+        self.semaphores = {}
+        self.latencies = {}
+        self.health = None
+        self.session = requests.Session()
+
+    @classmethod
+    def get_name(cls):
+        return "gevent"
+
+    def set_health(self, health):
+        """
+        Hedge with latencies kept in a HostHealthTable across invocations,
+        as a single command sends too few requests to learn them
+        """
+        self.health = health
+
+    def _get_semaphore(self, host):
+        if host not in self.semaphores:
+            self.semaphores[host] = gevent.lock.BoundedSemaphore(self.max_connections_per_host)
+        return self.semaphores[host]
+
+    def _record_latency(self, host, latency):
+        if host not in self.latencies:
+            self.latencies[host] = collections.deque(maxlen=LATENCY_WINDOW)
+        self.latencies[host].append(latency)
+
+    def get_latency_percentile(self, host, percentile):
+        # returns None if there are not enough samples
+        if self.health is not None:
+            samples = self.health.get_health(host).latencies
+        else:
+            samples = self.latencies.get(host)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+
+        sorted_samples = sorted(samples)
+        idx = min(len(sorted_samples) - 1, int(len(sorted_samples) * percentile / 100.0))
+        return sorted_samples[idx]
+
+    def _send(self, req, expires_at=None):
+        with self._get_semaphore(req.host):
+            sdm_util.log_message("Sending a HTTP %s request : %s" % (req.method, req.url))
+            start = time.time()
+            timeout = None
+            if expires_at is not None:
+                timeout = max(0.001, expires_at - start)
+            res = self.session.request(req.method, req.url, params=req.params, data=req.data, headers=req.headers, timeout=timeout)
+            self._record_latency(req.host, time.time() - start)
+            return res
+
+    def _send_hedged(self, req, expires_at=None):
+        p95 = None
+        if self.hedge_requests and req.idempotent:
+            p95 = self.get_latency_percentile(req.host, 95)
+
+        if p95 is None:
+            return self._send(req, expires_at)
+
+        first = gevent.spawn(self._send, req, expires_at)
+        first.join(timeout=p95)
+        if first.ready():
+            return first.get()
+
+        # the host is slower than usual - send a duplicate
+        sdm_util.log_message("Hedging a slow HTTP %s request : %s" % (req.method, req.url), sdm_util.LogLevel.DEBUG)
+        req.hedged = True
+        second = gevent.spawn(self._send, req, expires_at)
+        pending = [first, second]
+        while pending:
+            done = gevent.wait(pending, count=1)
+            for g in done:
+                pending.remove(g)
+                if g.successful():
+                    gevent.killall(pending, block=False)
+                    return g.value
+
+        # both failed
+        return first.get()
+
+    def _send_with_retries(self, req, expires_at=None):
+        try:
+            return self._send_attempts(req, expires_at)
+        finally:
+            req.finished_at = time.time()
+
+    def _send_attempts(self, req, expires_at=None):
+        attempts = 1
+        if req.idempotent:
+            attempts += self.max_retries
+
+        for attempt in range(attempts):
+            if expires_at is not None and time.time() >= expires_at:
+                return None
+
+            try:
+                res = self._send_hedged(req, expires_at)
+                if res.status_code < 500 or attempt == attempts - 1:
+                    return res
+            except requests.RequestException, e:
+                if attempt == attempts - 1:
+                    sdm_util.log_message("HTTP %s request failed : %s - %s" % (req.method, req.url, e), sdm_util.LogLevel.WARNING)
+                    return None
+
+            # full jitter
+            backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            if expires_at is not None:
+                backoff = min(backoff, max(0, expires_at - time.time()))
+            sdm_util.log_message("Retrying a HTTP %s request in %.2f sec : %s" % (req.method, backoff, req.url), sdm_util.LogLevel.DEBUG)
+            gevent.sleep(backoff)
+            req.retries += 1
+        return None
+
+    def map(self, reqs, timeout=None):
+        """
+        Send requests and return responses in the same order.
+        A response is None if the request failed.
+        """
+        expires_at = None
+        if timeout is not None:
+            expires_at = time.time() + timeout
+
+        greenlets = [gevent.spawn(self._send_with_retries, req, expires_at) for req in reqs]
+        gevent.joinall(greenlets, timeout=timeout)
+        gevent.killall([g for g in greenlets if not g.ready()])
+
+        ress = []
+        for g in greenlets:
+            if g.successful():
+                ress.append(g.value)
+            else:
+                ress.append(None)
+        return ress
+
+
+transports_impl_map = {
+    GRequestsTransport.get_name(): GRequestsTransport,
+    GeventTransport.get_name(): GeventTransport
+}
+
+
+def get_transport_names():
+    return sorted(transports_impl_map.keys())
+
+
+def get_transport(name, backend_config=None):
+    n = name.strip().lower()
+    if n in transports_impl_map:
+        return transports_impl_map[n](backend_config)
+    raise RestTransportException("unknown transport - %s" % name)
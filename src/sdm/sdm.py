@@ -45,6 +45,11 @@
 import os
 import os.path
 import sys
+import json
+import time
+import fnmatch
+import threading
+import Queue
 import traceback
 import logging
 import config as sdm_config
@@ -53,23 +58,56 @@ import repository as sdm_repository
 import backends as sdm_backends
 import abstract_backend as sdm_absbackends
 import util as sdm_util
+import output_format as sdm_output_format
+import mount_selector as sdm_mount_selector
+import deadline as sdm_deadline
+import manifest as sdm_manifest
+import bench as sdm_bench
+import file_index as sdm_file_index
+import tracing as sdm_tracing
 
 from prettytable import PrettyTable
 
 SDM_CONFIG_DIR = "~/.sdm"
 CONFIG_PATH = ""
 MOUNT_TABLE_PATH = ""
+FILE_INDEX_PATH = ""
 
 config = None
 mount_table = None
 repository = None
 backend = None
+deadline = None
+trace = None
+# guards the mount table when mounts run concurrently
+mount_table_lock = threading.RLock()
 
 
 OPTIONS_TABLE = {}
 COMMANDS = []
 COMMANDS_TABLE = {}
 
+class OptionException(Exception):
+    pass
+
+
+# datasets mounted or prepared at once
+MOUNT_PARALLELISM = 8
+
+# operation whose time budget applies to a command
+COMMAND_OPERATIONS = {
+    "list_datasets": "catalogue",
+    "search_datasets": "catalogue",
+    "show_mounts": "status",
+    "mount": "mount",
+    "mmount": "mount",
+    "unmount": "unmount",
+    "munmount": "unmount",
+    "warm": "mount",
+    "apply": "mount",
+    "clean": "unmount"
+}
+
 
 def fill_options_table():
     """
@@ -77,6 +115,24 @@ def fill_options_table():
     """
     OPTIONS_TABLE["log"] = getattr(logging, "WARNING", None)
     OPTIONS_TABLE["config"] = SDM_CONFIG_DIR
+    OPTIONS_TABLE["refresh_certs"] = False
+    OPTIONS_TABLE["format"] = sdm_output_format.OutputFormat.TABLE
+    OPTIONS_TABLE["fields"] = None
+    OPTIONS_TABLE["no_header"] = False
+    OPTIONS_TABLE["limit"] = None
+    OPTIONS_TABLE["all"] = False
+    OPTIONS_TABLE["timeout"] = None
+    OPTIONS_TABLE["dry_run"] = False
+    OPTIONS_TABLE["fuzzy"] = False
+    OPTIONS_TABLE["profile"] = None
+    OPTIONS_TABLE["threads"] = sdm_bench.DEFAULT_MAX_THREADS
+    OPTIONS_TABLE["workloads"] = sdm_bench.BenchWorkload.get_names()
+    OPTIONS_TABLE["full"] = False
+    OPTIONS_TABLE["usage"] = False
+    OPTIONS_TABLE["min_size"] = None
+    OPTIONS_TABLE["max_size"] = None
+    OPTIONS_TABLE["newer"] = None
+    OPTIONS_TABLE["older"] = None
 
 
 def fill_commands_table():
@@ -87,7 +143,12 @@ def fill_commands_table():
     COMMANDS.append((["mmount", "mmnt"], mount_multi_dataset, "mount multi-datasets"))
     COMMANDS.append((["unmount", "umount", "umnt"], unmount_dataset, "unmount a dataset"))
     COMMANDS.append((["munmount", "mumount", "mumnt"], unmount_multi_dataset, "unmount multi-dataset"))
+    COMMANDS.append((["warm"], warm_datasets, "prepare datasets for mounting"))
+    COMMANDS.append((["apply"], apply_manifest, "mount and unmount datasets to match a manifest"))
     COMMANDS.append((["clean"], clean_mounts, "clear broken mounts"))
+    COMMANDS.append((["bench"], bench_dataset, "measure read throughput and metadata rates of a mounted dataset"))
+    COMMANDS.append((["index"], index_datasets, "index files of mounted datasets"))
+    COMMANDS.append((["find_files", "find-files", "ffind"], find_files, "find files of a dataset from its index"))
     COMMANDS.append((["help", "h"], show_help, "show help"))
 
     for cmd in COMMANDS:
@@ -96,26 +157,50 @@ def fill_commands_table():
             COMMANDS_TABLE[k] = cmd
 
 
+def get_backend_instance(backend_name):
+    """
+    Make a backend instance bound to the command deadline and trace
+    """
+    bimpl = sdm_backends.Backends.get_backend_instance(backend_name, config.get_backend_config(backend_name))
+    bimpl.set_deadline(deadline)
+    bimpl.set_trace(trace)
+    bimpl.refresh_certs = OPTIONS_TABLE["refresh_certs"]
+    return bimpl
+
+
+def make_dataset_deadline():
+    """
+    Make a deadline for a dataset of the command. Every dataset gets the
+    whole budget, so commands over many datasets do not run out of it.
+    """
+    return sdm_deadline.Deadline(deadline.timeout)
+
+
+def make_row_writer(field_names):
+    """
+    Make a row writer for the output options chosen
+    """
+    return sdm_output_format.make_row_writer(
+        OPTIONS_TABLE["format"],
+        field_names,
+        OPTIONS_TABLE["fields"],
+        not OPTIONS_TABLE["no_header"]
+    )
+
+
 def list_datasets(argv):
     """
     List Datasets
     """
     if len(argv) == 0:
-        entries = repository.list_entries()
-        cnt = 0
-        tbl = PrettyTable()
-        tbl.field_names = ["DATASET", "DESCRIPTION"]
-        for ent in entries:
-            cnt += 1
-            tbl.add_row([ent.dataset, ent.description])
-
-        sdm_util.print_message(tbl)
+        writer = make_row_writer(["DATASET", "DESCRIPTION"])
+        for ent in repository.iter_entries(limit=OPTIONS_TABLE["limit"]):
+            writer.write_row([ent.dataset, ent.description])
+        writer.close()
 
-        if cnt == 0:
+        if writer.rows == 0 and writer.is_tabular():
             sdm_util.print_message("No available dataset")
-            return 0
-        else:
-            return 0
+        return 0
     else:
         show_help(["list_datasets"])
         return 1
@@ -131,21 +216,15 @@ def search_datasets(argv):
     if len(argv) >= 1:
         query = argv[0].strip().lower()
 
-        entries = repository.list_entries(query)
-        cnt = 0
-        tbl = PrettyTable()
-        tbl.field_names = ["DATASET", "DESCRIPTION"]
-        for ent in entries:
-            cnt += 1
-            tbl.add_row([ent.dataset, ent.description])
+        writer = make_row_writer(["DATASET", "DESCRIPTION"])
+        for ent in repository.iter_entries(query, OPTIONS_TABLE["limit"]):
+            writer.write_row([ent.dataset, ent.description])
+        writer.close()
 
-        sdm_util.print_message(tbl)
-
-        if cnt == 0:
+        if writer.rows == 0 and writer.is_tabular():
             sdm_util.print_message("No matching dataset")
-            return 0
-        else:
-            return 0
+            show_suggestions(repository.suggest(query))
+        return 0
     else:
         show_help(["search_datasets"])
         return 1
@@ -157,14 +236,15 @@ def show_mounts(argv):
     """
     if len(argv) == 0:
         records = mount_table.list_records()
-        cnt = 0
-        tbl = PrettyTable()
-        tbl.field_names = ["MOUNT_ID", "DATASET", "MOUNT_PATH", "BACKEND", "STATUS"]
+        field_names = ["MOUNT_ID", "DATASET", "MOUNT_PATH", "BACKEND", "STATUS"]
+        if OPTIONS_TABLE["usage"]:
+            field_names += ["CPU_SEC", "MEMORY_BYTES", "READ_BYTES", "WRITE_BYTES"]
+        writer = make_row_writer(field_names)
 
         need_sync = False
         for rec in records:
             # detect out-of-sync record
-            bimpl = sdm_backends.Backends.get_backend_instance(rec.backend, config.get_backend_config(rec.backend))
+            bimpl = get_backend_instance(rec.backend)
 
             is_mounted = bimpl.check_mount(rec.record_id, rec.dataset, rec.mount_path)
             is_status_mounted = rec.status == sdm_mount_table.MountRecordStatus.MOUNTED
@@ -176,60 +256,174 @@ def show_mounts(argv):
                     rec.status = sdm_mount_table.MountRecordStatus.UNMOUNTED
                 need_sync = True
 
-            cnt += 1
-            tbl.add_row([rec.record_id[:12], rec.dataset, rec.mount_path, rec.backend, rec.status])
+            row = [rec.record_id[:12], rec.dataset, rec.mount_path, rec.backend, rec.status]
+            if OPTIONS_TABLE["usage"]:
+                usage = None
+                if is_mounted:
+                    usage = bimpl.get_mount_usage(rec.record_id)
+                for k in ["cpu_sec", "memory_bytes", "read_bytes", "write_bytes"]:
+                    row.append((usage or {}).get(k, "-"))
+            writer.write_row(row)
 
-        sdm_util.print_message(tbl)
+        writer.close()
 
         if need_sync:
             mount_table.save_table(MOUNT_TABLE_PATH)
 
-        if cnt == 0:
+        if writer.rows == 0 and writer.is_tabular():
             sdm_util.print_message("No mounts")
-            return 0
-        else:
-            return 0
+
+        if OPTIONS_TABLE["format"] == sdm_output_format.OutputFormat.TABLE:
+            backend_names = set([rec.backend for rec in records])
+            backend_names.add(backend)
+            show_host_health(sorted(backend_names))
+        return 0
     else:
         show_help(["show_mounts"])
         return 1
 
 
-def process_mount_dataset(dataset, mount_path):
+def show_host_health(backend_names):
     """
-    Begin the dataset mount process
+    Show health of remote hosts used by backends
+    """
+    rows = []
+    for backend_name in backend_names:
+        bimpl = get_backend_instance(backend_name)
+        for health in bimpl.get_host_health():
+            latency = health.get_latency_percentile(50)
+            latency_str = "-"
+            if latency is not None:
+                latency_str = "%.3f sec" % latency
+
+            last_failure_str = "-"
+            if health.last_failure is not None:
+                last_failure_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(health.last_failure))
+
+            rows.append([backend_name, health.host, health.state, "%d%%" % (health.get_error_rate() * 100), latency_str, last_failure_str])
+
+    if len(rows) > 0:
+        tbl = PrettyTable()
+        tbl.field_names = ["BACKEND", "HOST", "CIRCUIT", "ERROR_RATE", "LATENCY_P50", "LAST_FAILURE"]
+        for row in rows:
+            tbl.add_row(row)
+
+        sdm_util.print_message("")
+        sdm_util.print_message(tbl)
+
+
+def get_dataset_user(entry):
+    """
+    Return (username, user_pkey) to access the dataset
+    """
+    username = entry.username
+    user_pkey = entry.user_pkey
+    if username.strip() == "" or user_pkey.strip() == "":
+        # use local settings
+        syndicate_users = config.list_syndicate_users_by_ms_host(entry.ms_host)
+        for suser in syndicate_users:
+            username = suser.username
+            user_pkey = suser.user_pkey
+            break
+    return username, user_pkey
+
+
+def expand_datasets(args):
+    """
+    Expand dataset globs against the catalogue.
+    Datasets that are not found are left out.
+    """
+    datasets = []
+    for d in args:
+        if sdm_mount_selector.is_glob(d):
+            pattern = d.strip().lower()
+            matched = False
+            for ent in repository.iter_entries():
+                if fnmatch.fnmatch(ent.dataset, pattern):
+                    datasets.append(ent.dataset)
+                    matched = True
+            if not matched:
+                sdm_util.print_message("No matching dataset - %s" % d)
+        else:
+            entry = find_dataset_entry(d)
+            if entry:
+                datasets.append(entry.dataset)
+    return datasets
+
+
+def find_dataset_entry(dataset):
+    """
+    Return the entry of a dataset, or suggest similar datasets and return None.
+    With --fuzzy, a single closest match is used instead.
     """
     entry = repository.get_entry(dataset)
     if entry:
-        username = entry.username
-        user_pkey = entry.user_pkey
-        if username.strip() == "" or user_pkey.strip() == "":
-            # use local settings
-            syndicate_users = config.list_syndicate_users_by_ms_host(entry.ms_host)
-            for suser in syndicate_users:
-                username = suser.username
-                user_pkey = suser.user_pkey
-                break
+        return entry
+
+    suggestions = repository.suggest(dataset)
+    if OPTIONS_TABLE["fuzzy"] and len(suggestions) > 0:
+        closest = [name for distance, name in suggestions if distance == suggestions[0][0]]
+        if len(closest) == 1:
+            sdm_util.print_message("Dataset not found - %s, using %s" % (dataset, closest[0]))
+            return repository.get_entry(closest[0])
+
+    sdm_util.print_message("Dataset not found - %s" % dataset)
+    show_suggestions(suggestions)
+    return None
+
+
+def show_suggestions(suggestions):
+    if len(suggestions) > 0:
+        sdm_util.print_message("Did you mean? %s" % ", ".join([name for _, name in suggestions]))
+
+
+def make_mount_options():
+    """
+    Mount options given on the command line
+    """
+    options = {}
+    if OPTIONS_TABLE["profile"]:
+        options["profile"] = OPTIONS_TABLE["profile"]
+    return options
 
+
+def process_mount_dataset(dataset, mount_path, entry=None, options=None, backend_name=None):
+    """
+    Begin the dataset mount process
+    """
+    if entry is None:
+        entry = repository.get_entry(dataset)
+    if backend_name is None:
+        backend_name = backend
+
+    if entry:
+        username, user_pkey = get_dataset_user(entry)
         if username.strip() == "" or user_pkey.strip() == "":
             sdm_util.print_message("Cannot find user accounts to access the dataset - %s" % (dataset))
             return 1
 
+        if entry.fuse_options:
+            options = dict(options or {})
+            options["fuse_hints"] = entry.fuse_options
+
         try:
-            bimpl = sdm_backends.Backends.get_backend_instance(backend, config.get_backend_config(backend))
+            bimpl = get_backend_instance(backend_name)
+            bimpl.set_deadline(make_dataset_deadline())
             if not bimpl.is_legal_mount_path(mount_path):
                 sdm_util.print_message("Cannot mount dataset to the given mount path for wrong mount path - %s" % (mount_path))
                 return 1
 
-            # check existance
-            records = mount_table.get_records_by_mount_path(mount_path)
-            for rec in records:
-                if rec.dataset == dataset and rec.status == sdm_mount_table.MountRecordStatus.UNMOUNTED:
-                    # same dataset but unmounted
-                    # delete and overwrite
-                    mount_table.delete_record(rec.record_id)
+            with mount_table_lock:
+                # check existance
+                records = mount_table.get_records_by_mount_path(mount_path)
+                for rec in records:
+                    if rec.dataset == dataset and rec.status == sdm_mount_table.MountRecordStatus.UNMOUNTED:
+                        # same dataset but unmounted
+                        # delete and overwrite
+                        mount_table.delete_record(rec.record_id)
 
-            mount_record = mount_table.add_record(dataset, mount_path, backend, sdm_mount_table.MountRecordStatus.UNMOUNTED)
-            mount_table.save_table(MOUNT_TABLE_PATH)
+                mount_record = mount_table.add_record(dataset, mount_path, backend_name, sdm_mount_table.MountRecordStatus.UNMOUNTED)
+                mount_table.save_table(MOUNT_TABLE_PATH)
 
             bimpl.mount(
                 mount_record.record_id,
@@ -238,16 +432,19 @@ def process_mount_dataset(dataset, mount_path):
                 username,
                 user_pkey,
                 entry.gateway,
-                mount_path
+                mount_path,
+                options
             )
-            mount_record.status = sdm_mount_table.MountRecordStatus.MOUNTED
-            mount_table.save_table(MOUNT_TABLE_PATH)
+
+            with mount_table_lock:
+                mount_record.status = sdm_mount_table.MountRecordStatus.MOUNTED
+                mount_table.save_table(MOUNT_TABLE_PATH)
             return 0
         except sdm_mount_table.MountTableException, e:
             sdm_util.print_message("Cannot mount dataset - %s to  %s" % (dataset, mount_path), True, sdm_util.LogLevel.ERROR)
             sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
             return 1
-        except sdm_absbackends.AbstractBackendException, e:
+        except (sdm_absbackends.AbstractBackendException, sdm_deadline.DeadlineExceededException), e:
             sdm_util.print_message("Cannot mount dataset - %s to  %s" % (dataset, mount_path), True, sdm_util.LogLevel.ERROR)
             sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
             return 1
@@ -265,18 +462,21 @@ def mount_dataset(argv):
         arg2: mount_path (optional)
     """
     if len(argv) >= 1:
-        dataset = argv[0].strip().lower()
+        entry = find_dataset_entry(argv[0])
+        if entry is None:
+            return 1
+        dataset = entry.dataset
 
         try:
-            bimpl = sdm_backends.Backends.get_backend_instance(backend, config.get_backend_config(backend))
+            bimpl = get_backend_instance(backend)
             mount_path = bimpl.make_default_mount_path(dataset, config.get_backend_config(backend).default_mount_path)
 
             if len(argv) >= 2 and len(argv[1].strip()) != 0:
                 mount_path = argv[1].strip()
 
             abs_mount_path = sdm_util.get_abs_path(mount_path)
-            return process_mount_dataset(dataset, abs_mount_path)
-        except sdm_absbackends.AbstractBackendException, e:
+            return process_mount_dataset(dataset, abs_mount_path, entry, make_mount_options())
+        except (sdm_absbackends.AbstractBackendException, sdm_deadline.DeadlineExceededException), e:
             sdm_util.print_message("Cannot mount dataset - %s" % dataset, True, sdm_util.LogLevel.ERROR)
             sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
             return 1
@@ -290,22 +490,41 @@ def mount_multi_dataset(argv):
     Mount a multi dataset
 
     args:
-        arg1: dataset name
+        arg1: dataset name, dataset glob or mount selector
     """
     if len(argv) >= 1:
         try:
-            bimpl = sdm_backends.Backends.get_backend_instance(backend, config.get_backend_config(backend))
+            bimpl = get_backend_instance(backend)
 
+            # remount selected mounts at their mount paths
+            targets = []
+            dataset_args = []
+            selector = None
             for d in argv:
-                dataset = d.strip().lower()
+                if sdm_mount_selector.is_attribute_selector(d):
+                    if selector is None:
+                        selector = sdm_mount_selector.MountSelector(mount_table.list_records())
+                    for rec in selector.select(d):
+                        if rec.status == sdm_mount_table.MountRecordStatus.UNMOUNTED:
+                            targets.append((rec.dataset, rec.mount_path))
+                else:
+                    dataset_args.append(d)
+
+            for dataset in expand_datasets(dataset_args):
                 mount_path = bimpl.make_default_mount_path(dataset, config.get_backend_config(backend).default_mount_path)
-                abs_mount_path = sdm_util.get_abs_path(mount_path)
-                res = process_mount_dataset(dataset, abs_mount_path)
+                targets.append((dataset, sdm_util.get_abs_path(mount_path)))
+
+            for dataset, abs_mount_path in targets:
+                res = process_mount_dataset(dataset, abs_mount_path, None, make_mount_options())
                 if res > 0:
                     return res
             return 0
-        except sdm_absbackends.AbstractBackendException, e:
-            sdm_util.print_message("Cannot mount dataset - %s" % dataset, True, sdm_util.LogLevel.ERROR)
+        except sdm_mount_selector.MountSelectorException, e:
+            sdm_util.print_message("Cannot mount datasets", True, sdm_util.LogLevel.ERROR)
+            sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+            return 1
+        except (sdm_absbackends.AbstractBackendException, sdm_deadline.DeadlineExceededException), e:
+            sdm_util.print_message("Cannot mount datasets", True, sdm_util.LogLevel.ERROR)
             sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
             return 1
     else:
@@ -313,38 +532,295 @@ def mount_multi_dataset(argv):
         return 1
 
 
-def process_unmount_dataset(record_id, cleanup=False):
+def run_concurrently(func, items):
     """
-    Unmount a dataset
+    Run func over items with worker threads and return results in order.
+    An item whose func raises gets 1 as its result.
+    """
+    results = [None] * len(items)
+    work_queue = Queue.Queue()
+    for idx in range(len(items)):
+        work_queue.put(idx)
+
+    def worker():
+        while True:
+            try:
+                idx = work_queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[idx] = func(items[idx])
+            except Exception, e:
+                # one failure should not take down the others
+                sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+                sdm_util.log_message(traceback.format_exc(), sdm_util.LogLevel.DEBUG)
+                results[idx] = 1
+
+    threads = []
+    for _ in range(min(MOUNT_PARALLELISM, len(items))):
+        t = threading.Thread(target=worker)
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+    return results
+
+
+def process_warm_dataset(bimpl, entry):
     """
+    Prepare a dataset for mounting. Return (status, cert_expires_at).
+    """
+    username, user_pkey = get_dataset_user(entry)
+    if username.strip() == "" or user_pkey.strip() == "":
+        sdm_util.print_message("Cannot find user accounts to access the dataset - %s" % (entry.dataset))
+        return "FAILED", None
+
     try:
-        records = mount_table.get_records_by_record_id(record_id)
-        if len(records) == 1:
-            record = records[0]
-            if not cleanup and record.status == sdm_mount_table.MountRecordStatus.UNMOUNTED:
-                sdm_util.print_message("Dataset is already unmounted")
+        bimpl.set_deadline(make_dataset_deadline())
+        mount_id = sdm_mount_table.make_record_id(entry.dataset, backend)
+        cert_expires_at = bimpl.prepare(mount_id, entry.ms_host, entry.dataset, username, user_pkey, entry.gateway)
+        return "READY", cert_expires_at
+    except (sdm_absbackends.AbstractBackendException, sdm_deadline.DeadlineExceededException), e:
+        sdm_util.print_message("Cannot prepare dataset - %s" % entry.dataset, True, sdm_util.LogLevel.ERROR)
+        sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+        return "FAILED", None
+
+
+def warm_datasets(argv):
+    """
+    Prepare datasets for mounting ahead of time
+
+    args:
+        arg1: dataset names or dataset globs (optional, warm_datasets in config by default)
+    """
+    args = argv
+    if len(args) == 0:
+        args = config.warm_datasets
+
+    if len(args) == 0:
+        show_help(["warm"])
+        return 1
+
+    # look up entries first - the repository is not shared with workers
+    entries = []
+    for dataset in expand_datasets(args):
+        entry = repository.get_entry(dataset)
+        if entry:
+            entries.append(entry)
+        else:
+            sdm_util.print_message("Dataset not found - %s" % dataset)
+
+    bimpls = threading.local()
+
+    def warm(entry):
+        try:
+            if not hasattr(bimpls, "bimpl"):
+                bimpls.bimpl = get_backend_instance(backend)
+            return process_warm_dataset(bimpls.bimpl, entry)
+        except Exception, e:
+            # one failure should not take down the others
+            sdm_util.print_message("Cannot prepare dataset - %s" % entry.dataset, True, sdm_util.LogLevel.ERROR)
+            sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+            sdm_util.log_message(traceback.format_exc(), sdm_util.LogLevel.DEBUG)
+            return "FAILED", None
+
+    results = run_concurrently(warm, entries)
+
+    res = 0
+    writer = make_row_writer(["DATASET", "STATUS", "CERT_EXPIRES"])
+    for idx in range(len(entries)):
+        status, cert_expires_at = results[idx]
+        cert_expires_str = "-"
+        if cert_expires_at is not None:
+            cert_expires_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(cert_expires_at))
+        if status != "READY":
+            res = 1
+        writer.write_row([entries[idx].dataset, status, cert_expires_str])
+    writer.close()
+    return res
+
+
+def process_apply_step(step):
+    """
+    Run a step of a plan
+    """
+    action, is_unmount = step
+    if is_unmount:
+        return process_unmount_dataset(action.record.record_id, action.cleanup)
+    return process_mount_dataset(action.dataset, action.mount_path, action.entry, action.options, action.backend)
+
+
+def apply_manifest(argv):
+    """
+    Mount and unmount datasets to match a manifest
+
+    args:
+        arg1: manifest path
+    """
+    if len(argv) >= 1:
+        try:
+            manifest = sdm_manifest.Manifest.load(sdm_util.get_abs_path(argv[0]), backend)
+        except sdm_manifest.ManifestException, e:
+            sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+            return 1
+
+        backend_instances = {}
+
+        def get_cached_backend_instance(backend_name):
+            if backend_name not in backend_instances:
+                backend_instances[backend_name] = get_backend_instance(backend_name)
+            return backend_instances[backend_name]
+
+        def check_mount(rec):
+            bimpl = get_cached_backend_instance(rec.backend)
+            return bimpl.check_mount(rec.record_id, rec.dataset, rec.mount_path)
+
+        def get_mount_options(rec):
+            return get_cached_backend_instance(rec.backend).get_mount_options(rec.record_id)
+
+        try:
+            actions = sdm_manifest.make_plan(manifest, mount_table.list_records(), check_mount, get_mount_options)
+
+            not_found = 0
+            # mounts without a path go to the default mount path
+            for action in actions:
+                if action.is_mounting():
+                    if action.mount_path is None:
+                        backend_config = config.get_backend_config(action.backend)
+                        action.mount_path = get_cached_backend_instance(action.backend).make_default_mount_path(action.dataset, backend_config.default_mount_path)
+
+                    # look up entries first - the repository is not shared with workers
+                    action.entry = repository.get_entry(action.dataset)
+                    if action.entry is None:
+                        sdm_util.print_message("Dataset not found - %s" % action.dataset)
+                        not_found += 1
+
+            # report every missing dataset before giving up
+            if not_found > 0:
                 return 1
+        except (sdm_absbackends.AbstractBackendException, sdm_deadline.DeadlineExceededException), e:
+            sdm_util.print_message("Cannot make a plan", True, sdm_util.LogLevel.ERROR)
+            sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+            return 1
 
-            bimpl = sdm_backends.Backends.get_backend_instance(record.backend, config.get_backend_config(record.backend))
-            record.status = sdm_mount_table.MountRecordStatus.UNMOUNTED
+        if OPTIONS_TABLE["dry_run"]:
+            writer = make_row_writer(["ACTION", "DATASET", "MOUNT_PATH", "BACKEND", "REASON"])
+            for action in actions:
+                writer.write_row([action.action, action.dataset, action.mount_path, action.backend, action.reason])
+            writer.close()
 
-            bimpl.unmount(record.record_id, record.dataset, record.mount_path, cleanup)
-            if cleanup:
-                mount_table.delete_record(record.record_id)
+            if writer.rows == 0 and writer.is_tabular():
+                sdm_util.print_message("Nothing to do")
+            return 0
 
-            mount_table.save_table(MOUNT_TABLE_PATH)
+        if len(actions) == 0:
+            sdm_util.print_message("Nothing to do")
             return 0
-        else:
-            sdm_util.print_message("Cannot unmount. There are %d mounts" % len(records))
+
+        res = 0
+        for stage in sdm_manifest.make_stages(actions):
+            for r in run_concurrently(process_apply_step, stage):
+                res |= r
+        return res
+    else:
+        show_help(["apply"])
+        return 1
+
+
+def unmount_record(record, cleanup=False):
+    """
+    Unmount a mount record. The mount table is saved by the caller.
+    """
+    try:
+        if not cleanup and record.status == sdm_mount_table.MountRecordStatus.UNMOUNTED:
+            sdm_util.print_message("Dataset is already unmounted")
             return 1
-    except sdm_mount_table.MountTableException, e:
-        sdm_util.print_message("Cannot unmount - %s" % (record_id), True, sdm_util.LogLevel.ERROR)
+
+        bimpl = get_backend_instance(record.backend)
+        bimpl.set_deadline(make_dataset_deadline())
+        try:
+            outcome = bimpl.unmount(record.record_id, record.dataset, record.mount_path, cleanup)
+        except sdm_absbackends.UnmountException, e:
+            # keep what was tried so that a stuck mount can be looked into
+            with mount_table_lock:
+                record.unmount_outcome = e.outcome
+            raise
+
+        with mount_table_lock:
+            record.status = sdm_mount_table.MountRecordStatus.UNMOUNTED
+            record.unmount_outcome = outcome or ""
+        return 0
+    except (sdm_absbackends.AbstractBackendException, sdm_deadline.DeadlineExceededException), e:
+        sdm_util.print_message("Cannot unmount - %s" % (record.record_id), True, sdm_util.LogLevel.ERROR)
         sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
         return 1
-    except sdm_absbackends.AbstractBackendException, e:
-        sdm_util.print_message("Cannot unmount - %s" % (record_id), True, sdm_util.LogLevel.ERROR)
-        sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+
+
+def process_unmount_records(records, cleanup=False):
+    """
+    Unmount mount records and save the mount table once.
+    Mounts at the same depth are unmounted concurrently, deepest first,
+    so that nested mounts are released before their parents.
+    """
+    stages = {}
+    for rec in records:
+        depth = len([p for p in sdm_util.get_abs_path(rec.mount_path).split("/") if len(p) > 0])
+        stages.setdefault(depth, []).append(rec)
+
+    res = 0
+    unmounted = []
+    try:
+        for depth in sorted(stages.keys(), reverse=True):
+            stage = stages[depth]
+            results = run_concurrently(lambda rec: unmount_record(rec, cleanup), stage)
+            for idx in range(len(stage)):
+                if results[idx] == 0:
+                    unmounted.append(stage[idx].record_id)
+                res |= results[idx]
+    finally:
+        with mount_table_lock:
+            if cleanup:
+                mount_table.delete_records(unmounted)
+            mount_table.save_table(MOUNT_TABLE_PATH)
+    return res
+
+
+def process_unmount_dataset(record_id, cleanup=False):
+    """
+    Unmount a dataset
+    """
+    with mount_table_lock:
+        records = mount_table.get_records_by_record_id(record_id)
+    if len(records) != 1:
+        sdm_util.print_message("Cannot unmount. There are %d mounts" % len(records))
         return 1
+    return process_unmount_records(records, cleanup)
+
+
+def select_mounts(args):
+    """
+    Resolve selectors to mount records
+    """
+    selector = sdm_mount_selector.MountSelector(mount_table.list_records())
+    if OPTIONS_TABLE["all"]:
+        return selector.select_all(), []
+    return selector.resolve(args)
+
+
+def process_unmount_selected(args, cleanup=False):
+    """
+    Unmount all mounts selected
+    """
+    records, errors = select_mounts(args)
+
+    res = 0
+    for error in errors:
+        sdm_util.print_message(error)
+        res |= 1
+
+    res |= process_unmount_records(records, cleanup)
+    return res
 
 
 def unmount_dataset(argv):
@@ -352,45 +828,21 @@ def unmount_dataset(argv):
     Unmount a dataset
 
     args:
-        arg1: dataset name OR mount_path
+        arg1: dataset name OR mount_path OR mount_id OR mount selector
+        arg2: cleanup flag (optional)
     """
+    if OPTIONS_TABLE["all"]:
+        cleanup = False
+        if len(argv) >= 1:
+            cleanup = sdm_util.to_bool(argv[0])
+        return process_unmount_selected([], cleanup)
+
     if len(argv) >= 1:
         cleanup = False
         if len(argv) >= 2:
             cleanup = sdm_util.to_bool(argv[1])
 
-        arg = argv[0]
-
-        # dataset?
-        records = mount_table.get_records_by_dataset(arg)
-        if len(records) > 0:
-            if len(records) == 1:
-                return process_unmount_dataset(records[0].record_id, cleanup)
-            else:
-                sdm_util.print_message("Cannot unmount dataset. There are more %d mounts" % len(records))
-                return 1
-
-        # record_id?
-        records = mount_table.get_records_by_record_id(arg)
-        if len(records) > 0:
-            if len(records) == 1:
-                return process_unmount_dataset(records[0].record_id, cleanup)
-            else:
-                sdm_util.print_message("Cannot unmount dataset. There are more %d mounts" % len(records))
-                return 1
-
-        # path?
-        path = sdm_util.get_abs_path(arg)
-        records = mount_table.get_records_by_mount_path(path)
-        if len(records) > 0:
-            if len(records) == 1:
-                return process_unmount_dataset(records[0].record_id, cleanup)
-            else:
-                sdm_util.print_message("Cannot unmount dataset. There are more %d mounts" % len(records))
-                return 1
-
-        sdm_util.print_message("Cannot find mount - %s" % argv[0])
-        return 1
+        return process_unmount_selected([argv[0]], cleanup)
     else:
         show_help(["unmount"])
         return 1
@@ -401,51 +853,12 @@ def unmount_multi_dataset(argv):
     Unmount a multi dataset
 
     args:
-        arg1: dataset name OR mount_path
+        arg1: dataset name OR mount_path OR mount_id OR mount selector
     """
-    if len(argv) >= 1:
-        cleanup = False
-        res = 0
-        for arg in argv:
-            # dataset?
-            records = mount_table.get_records_by_dataset(arg)
-            if len(records) > 0:
-                if len(records) == 1:
-                    res |= process_unmount_dataset(records[0].record_id, cleanup)
-                    continue
-                else:
-                    sdm_util.print_message("Cannot unmount dataset. There are more %d mounts" % len(records))
-                    res |= 1
-                    continue
-
-            # record_id?
-            records = mount_table.get_records_by_record_id(arg)
-            if len(records) > 0:
-                if len(records) == 1:
-                    res |= process_unmount_dataset(records[0].record_id, cleanup)
-                    continue
-                else:
-                    sdm_util.print_message("Cannot unmount dataset. There are more %d mounts" % len(records))
-                    res |= 1
-                    continue
-
-            # path?
-            path = sdm_util.get_abs_path(arg)
-            records = mount_table.get_records_by_mount_path(path)
-            if len(records) > 0:
-                if len(records) == 1:
-                    res |= process_unmount_dataset(records[0].record_id, cleanup)
-                    continue
-                else:
-                    sdm_util.print_message("Cannot unmount dataset. There are more %d mounts" % len(records))
-                    res |= 1
-                    continue
-
-            sdm_util.print_message("Cannot find mount - %s" % arg)
-            res |= 1
-        return res
+    if len(argv) >= 1 or OPTIONS_TABLE["all"]:
+        return process_unmount_selected(argv, False)
     else:
-        show_help(["unmount"])
+        show_help(["munmount"])
         return 1
 
 
@@ -453,13 +866,184 @@ def clean_mounts(argv):
     """
     Clean or unmount mounted datasets
     """
-    records = mount_table.list_records()
-    for rec in records:
-        if rec.status == sdm_mount_table.MountRecordStatus.UNMOUNTED:
-            process_unmount_dataset(rec.record_id, True)
+    records = mount_table.get_records_by_status(sdm_mount_table.MountRecordStatus.UNMOUNTED)
+    process_unmount_records(records, True)
     return 0
 
 
+def get_mounted_record(dataset):
+    """
+    Return the record of a mounted dataset, or None
+    """
+    for rec in mount_table.get_records_by_dataset(dataset):
+        if rec.status == sdm_mount_table.MountRecordStatus.MOUNTED:
+            return rec
+    return None
+
+
+def get_mounted_path(target):
+    """
+    Return the path of a directory or a mounted dataset, or None
+    """
+    abs_path = sdm_util.get_abs_path(target)
+    if os.path.isdir(abs_path):
+        return abs_path
+
+    rec = get_mounted_record(target)
+    if rec is not None:
+        return rec.mount_path
+    return None
+
+
+def bench_dataset(argv):
+    """
+    Measure read throughput and metadata rates of a mounted dataset
+
+    args:
+        arg1: dataset name or directory
+    """
+    if len(argv) >= 1:
+        path = get_mounted_path(argv[0])
+        if path is None:
+            sdm_util.print_message("Dataset is not mounted - %s" % argv[0])
+            return 1
+
+        bench_config = sdm_bench.BenchConfig()
+        bench_config.workloads = OPTIONS_TABLE["workloads"]
+        bench_config.max_threads = OPTIONS_TABLE["threads"]
+        if OPTIONS_TABLE["limit"] is not None:
+            bench_config.max_files = OPTIONS_TABLE["limit"]
+
+        try:
+            sdm_util.log_message("Running workloads %s over %s" % (", ".join(bench_config.workloads), path))
+            result = sdm_bench.run_bench(path, bench_config)
+            result["dataset"] = argv[0]
+            sdm_util.print_message(json.dumps(result, indent=2, sort_keys=True))
+            return 0
+        except sdm_bench.BenchException, e:
+            sdm_util.print_message("Cannot run a benchmark over %s" % path, True, sdm_util.LogLevel.ERROR)
+            sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+            return 1
+    else:
+        show_help(["bench"])
+        return 1
+
+
+def show_selector_help():
+    """
+    Print the mount selector help
+    """
+    sdm_util.print_message("")
+    sdm_util.print_message("mount selectors :")
+    sdm_util.print_message("  <dataset_name> | <mount_id> | <mount_path>  a mount")
+    sdm_util.print_message("  <dataset_glob>                              mounts of datasets matching the glob, e.g. 'ref*'")
+    sdm_util.print_message("  dataset=<glob> id=<prefix> path=<prefix> backend=<backend> status=<status>")
+    sdm_util.print_message("                                              mounts with the attribute, join with ',' to match all")
+
+
+def index_datasets(argv):
+    """
+    Index files of mounted datasets
+
+    args:
+        arg1: dataset name
+        ...
+    """
+    if len(argv) >= 1:
+        result = 0
+        for d in argv:
+            dataset = d.strip().lower()
+            rec = get_mounted_record(dataset)
+            if rec is None:
+                sdm_util.print_message("Dataset is not mounted - %s" % dataset, True, sdm_util.LogLevel.ERROR)
+                result = 1
+                continue
+
+            index_path = sdm_file_index.get_index_path(FILE_INDEX_PATH, dataset)
+            index = None
+            if os.path.exists(index_path) and not OPTIONS_TABLE["full"]:
+                try:
+                    index = sdm_file_index.FileIndex.load(index_path)
+                except sdm_file_index.FileIndexException, e:
+                    sdm_util.log_message("Cannot read the file index, rebuilding : %s" % e, sdm_util.LogLevel.WARNING)
+
+            if index is None:
+                index = sdm_file_index.FileIndex(dataset, rec.mount_path)
+            # listings are relative, so a remounted dataset keeps its index
+            index.root = rec.mount_path
+
+            try:
+                sdm_util.print_message("Indexing files of %s at %s" % (dataset, rec.mount_path))
+                start = time.time()
+                listed = index.update(OPTIONS_TABLE["threads"], OPTIONS_TABLE["full"])
+                index.save(index_path)
+                sdm_util.print_message("Indexed %d files in %d directories of %s (%d listed) in %.1f sec" % (index.get_file_count(), len(index.dirs), dataset, listed, time.time() - start))
+            except (sdm_file_index.FileIndexException, IOError, OSError), e:
+                sdm_util.print_message("Cannot index files of %s" % dataset, True, sdm_util.LogLevel.ERROR)
+                sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+                result = 1
+        return result
+    else:
+        show_help(["index"])
+        return 1
+
+
+def find_files(argv):
+    """
+    Find files of a dataset from its index
+
+    args:
+        arg1: dataset name
+        arg2: glob pattern (optional)
+    """
+    if len(argv) >= 1:
+        dataset = argv[0].strip().lower()
+        pattern = None
+        if len(argv) >= 2:
+            pattern = argv[1]
+
+        index_path = sdm_file_index.get_index_path(FILE_INDEX_PATH, dataset)
+        if not os.path.exists(index_path):
+            sdm_util.print_message("Files of %s are not indexed, run 'sdm index %s' first" % (dataset, dataset))
+            return 1
+
+        now = time.time()
+        newer_than = None
+        older_than = None
+        min_size = None
+        max_size = None
+        try:
+            index = sdm_file_index.FileIndex.load(index_path)
+            if OPTIONS_TABLE["newer"] is not None:
+                newer_than = now - sdm_file_index.parse_age(OPTIONS_TABLE["newer"])
+            if OPTIONS_TABLE["older"] is not None:
+                older_than = now - sdm_file_index.parse_age(OPTIONS_TABLE["older"])
+            if OPTIONS_TABLE["min_size"] is not None:
+                min_size = sdm_file_index.parse_size(OPTIONS_TABLE["min_size"])
+            if OPTIONS_TABLE["max_size"] is not None:
+                max_size = sdm_file_index.parse_size(OPTIONS_TABLE["max_size"])
+        except sdm_file_index.FileIndexException, e:
+            sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+            return 1
+
+        sdm_util.log_message("Using the file index of %s built at %s" % (dataset, time.ctime(index.built_at)))
+
+        writer = make_row_writer(["PATH", "SIZE", "MTIME"])
+        for rel_path, size, mtime in index.find(pattern, min_size, max_size, newer_than, older_than):
+            if OPTIONS_TABLE["limit"] is not None and writer.rows >= OPTIONS_TABLE["limit"]:
+                break
+            mtime_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(mtime))
+            writer.write_row([os.path.join(index.root, rel_path), size, mtime_str])
+        writer.close()
+
+        if writer.rows == 0 and writer.is_tabular():
+            sdm_util.print_message("No matching file")
+        return 0
+    else:
+        show_help(["find_files"])
+        return 1
+
+
 def show_help(argv=None):
     """
     Print the standard help page
@@ -468,51 +1052,74 @@ def show_help(argv=None):
         if "list_datasets" in argv:
             karr, _, desc = COMMANDS_TABLE["list_datasets"]
             sdm_util.print_message("command : %s" % (" | ".join(karr)))
-            sdm_util.print_message("usage : sdm ls")
+            sdm_util.print_message("usage : sdm ls [--limit=<n>] [--format=table|json|jsonl|tsv] [--fields=<field>[,<field> ...]] [--no-header]")
             sdm_util.print_message("")
             sdm_util.print_message(desc)
             return 0
         elif "search_datasets" in argv:
             karr, _, desc = COMMANDS_TABLE["search_datasets"]
             sdm_util.print_message("command : %s" % (" | ".join(karr)))
-            sdm_util.print_message("usage : sdm search <keyword>")
+            sdm_util.print_message("usage : sdm search <keyword> [--limit=<n>] [--format=table|json|jsonl|tsv] [--fields=<field>[,<field> ...]] [--no-header]")
             sdm_util.print_message("")
             sdm_util.print_message(desc)
             return 0
         elif "show_mounts" in argv:
             karr, _, desc = COMMANDS_TABLE["show_mounts"]
             sdm_util.print_message("command : %s" % (" | ".join(karr)))
-            sdm_util.print_message("usage : sdm ps")
+            sdm_util.print_message("usage : sdm ps [--usage] [--format=table|json|jsonl|tsv] [--fields=<field>[,<field> ...]] [--no-header]")
             sdm_util.print_message("")
             sdm_util.print_message(desc)
             return 0
         elif "mount" in argv:
             karr, _, desc = COMMANDS_TABLE["mount"]
             sdm_util.print_message("command : %s" % (" | ".join(karr)))
-            sdm_util.print_message("usage : sdm mount <dataset_name> [<mount_path>]")
+            sdm_util.print_message("usage : sdm mount <dataset_name> [<mount_path>] [--refresh-certs] [--fuzzy] [--profile=throughput|debug|valgrind] [--timeout=<sec>]")
             sdm_util.print_message("")
             sdm_util.print_message(desc)
             return 0
         elif "mmount" in argv:
             karr, _, desc = COMMANDS_TABLE["mmount"]
             sdm_util.print_message("command : %s" % (" | ".join(karr)))
-            sdm_util.print_message("usage : sdm mmount <dataset_name> [<dataset_name> ...]")
+            sdm_util.print_message("usage : sdm mmount <dataset_name|dataset_glob|mount_selector> [<dataset_name|dataset_glob|mount_selector> ...] [--fuzzy] [--profile=throughput|debug|valgrind] [--timeout=<sec>]")
             sdm_util.print_message("")
             sdm_util.print_message(desc)
             return 0
         elif "unmount" in argv:
             karr, _, desc = COMMANDS_TABLE["unmount"]
             sdm_util.print_message("command : %s" % (" | ".join(karr)))
-            sdm_util.print_message("usage : sdm unmount <mount_id> [<cleanup_flag>]")
+            sdm_util.print_message("usage : sdm unmount <dataset_name|mount_path|mount_id|mount_selector> [<cleanup_flag>] [--timeout=<sec>]")
+            sdm_util.print_message("        sdm unmount --all [<cleanup_flag>]")
             sdm_util.print_message("")
             sdm_util.print_message(desc)
+            show_selector_help()
             return 0
         elif "munmount" in argv:
             karr, _, desc = COMMANDS_TABLE["munmount"]
             sdm_util.print_message("command : %s" % (" | ".join(karr)))
-            sdm_util.print_message("usage : sdm munmount <mount_id> [<mount_id> ...]")
+            sdm_util.print_message("usage : sdm munmount <mount_selector> [<mount_selector> ...]")
+            sdm_util.print_message("        sdm munmount --all")
+            sdm_util.print_message("")
+            sdm_util.print_message(desc)
+            show_selector_help()
+            return 0
+        elif "warm" in argv:
+            karr, _, desc = COMMANDS_TABLE["warm"]
+            sdm_util.print_message("command : %s" % (" | ".join(karr)))
+            sdm_util.print_message("usage : sdm warm [<dataset_name|dataset_glob> ...] [--refresh-certs] [--timeout=<sec>]")
+            sdm_util.print_message("")
+            sdm_util.print_message(desc)
+            sdm_util.print_message("datasets in warm_datasets of the config are prepared if no dataset is given")
+            return 0
+        elif "apply" in argv:
+            karr, _, desc = COMMANDS_TABLE["apply"]
+            sdm_util.print_message("command : %s" % (" | ".join(karr)))
+            sdm_util.print_message("usage : sdm apply <manifest.json> [--dry-run] [--timeout=<sec>]")
             sdm_util.print_message("")
             sdm_util.print_message(desc)
+            sdm_util.print_message("")
+            sdm_util.print_message("manifest :")
+            sdm_util.print_message('  {"mounts": [{"dataset": "<dataset>", "path": "<mount_path>", "backend": "<backend>", "cache_size": <bytes>, "profile": "<profile>"}], "prune": true}')
+            sdm_util.print_message("  path, backend, cache_size and profile are optional. prune unmounts mounts not in the manifest.")
             return 0
         elif "clean" in argv:
             karr, _, desc = COMMANDS_TABLE["clean"]
@@ -521,6 +1128,30 @@ def show_help(argv=None):
             sdm_util.print_message("")
             sdm_util.print_message(desc)
             return 0
+        elif "index" in argv:
+            karr, _, desc = COMMANDS_TABLE["index"]
+            sdm_util.print_message("command : %s" % (" | ".join(karr)))
+            sdm_util.print_message("usage : sdm index <dataset_name> [<dataset_name> ...] [--full] [--threads=<n>]")
+            sdm_util.print_message("")
+            sdm_util.print_message(desc)
+            sdm_util.print_message("only directories whose mtime has changed are listed again unless --full is given.")
+            return 0
+        elif "find_files" in argv:
+            karr, _, desc = COMMANDS_TABLE["find_files"]
+            sdm_util.print_message("command : %s" % (" | ".join(karr)))
+            sdm_util.print_message("usage : sdm find-files <dataset_name> [<glob>] [--min-size=<size>] [--max-size=<size>] [--newer=<age>] [--older=<age>] [--limit=<n>] [--format=table|json|jsonl|tsv]")
+            sdm_util.print_message("")
+            sdm_util.print_message(desc)
+            sdm_util.print_message("sizes are like 512, 10K, 4M or 1G. ages are like 30m, 12h or 7d.")
+            return 0
+        elif "bench" in argv:
+            karr, _, desc = COMMANDS_TABLE["bench"]
+            sdm_util.print_message("command : %s" % (" | ".join(karr)))
+            sdm_util.print_message("usage : sdm bench <dataset_name|directory> [--workloads=meta,seq,random,scaling] [--threads=<n>] [--limit=<files>]")
+            sdm_util.print_message("")
+            sdm_util.print_message(desc)
+            sdm_util.print_message("results are printed in json. seq reads files twice to compare cold and warm cache.")
+            return 0
         else:
             sdm_util.print_message("Unrecognized command")
             return 1
@@ -541,6 +1172,18 @@ def show_help(argv=None):
         return 0
 
 
+def export_trace(t):
+    """
+    Export a trace of a command that talked to remote hosts
+    """
+    if len(t.get_spans()) <= 1:
+        return
+    try:
+        t.export(sdm_tracing.DEFAULT_TRACE_PATH)
+    except (IOError, OSError), e:
+        sdm_util.log_message("Cannot export trace %s : %s" % (t.trace_id, e), sdm_util.LogLevel.WARNING)
+
+
 def run(command, argv):
     """
     Run
@@ -551,22 +1194,93 @@ def run(command, argv):
     command = command.lower()
 
     if command in COMMANDS_TABLE:
-        _, func, _ = COMMANDS_TABLE[command]
-        func(argv)
+        karr, func, _ = COMMANDS_TABLE[command]
+
+        global deadline
+        timeout = OPTIONS_TABLE["timeout"]
+        if timeout is None and karr[0] in COMMAND_OPERATIONS:
+            timeout = config.get_timeout(COMMAND_OPERATIONS[karr[0]])
+        deadline = sdm_deadline.Deadline(timeout)
+        repository.set_deadline(deadline)
+
+        global trace
+        trace = sdm_tracing.Trace(karr[0])
+        sdm_util.log_message("Trace ID : %s" % trace.trace_id)
+        try:
+            res = func(argv)
+            if res:
+                # commands report most failures by their return value
+                trace.finish("exit status %s" % res)
+            return res
+        except Exception, e:
+            trace.finish("%s" % e)
+            raise
+        finally:
+            trace.finish()
+            export_trace(trace)
     else:
         raise ValueError("Unrecognized command: %s" % (command))
 
 
 def set_option(k, v="True"):
     """
-    Set the option chosen, i.e. log, backend, config
+    Set the option chosen, i.e. log, backend, config, refresh-certs, format, fields, no-header, limit, all, timeout, dry-run, fuzzy, profile, threads, workloads, full, min-size, max-size, newer, older, usage
     """
+    try:
+        _set_option(k, v)
+    except (ValueError, sdm_output_format.OutputFormatException, sdm_bench.BenchException, sdm_backends.UnknownBackend), e:
+        raise OptionException("invalid value of --%s - %s : %s" % (k, v, e))
+
+
+def _set_option(k, v):
     if k == "log":
         OPTIONS_TABLE[k] = getattr(logging, v.upper(), None)
+        if not isinstance(OPTIONS_TABLE[k], int):
+            raise ValueError("unknown log level")
     elif k == "backend":
         OPTIONS_TABLE[k] = sdm_backends.Backends.get_backend_name(v)
     elif k == "config":
         OPTIONS_TABLE[k] = sdm_util.get_abs_path(v)
+    elif k == "refresh-certs":
+        OPTIONS_TABLE["refresh_certs"] = sdm_util.to_bool(v)
+    elif k == "format":
+        OPTIONS_TABLE[k] = sdm_output_format.OutputFormat.from_str(v)
+    elif k == "fields":
+        OPTIONS_TABLE[k] = [f.strip() for f in v.split(",") if len(f.strip()) > 0]
+    elif k == "no-header":
+        OPTIONS_TABLE["no_header"] = sdm_util.to_bool(v)
+    elif k == "limit":
+        OPTIONS_TABLE[k] = int(v)
+        if OPTIONS_TABLE[k] < 0:
+            raise ValueError("must not be negative")
+    elif k == "all":
+        OPTIONS_TABLE[k] = sdm_util.to_bool(v)
+    elif k == "timeout":
+        OPTIONS_TABLE[k] = float(v)
+    elif k == "dry-run":
+        OPTIONS_TABLE["dry_run"] = sdm_util.to_bool(v)
+    elif k == "fuzzy":
+        OPTIONS_TABLE[k] = sdm_util.to_bool(v)
+    elif k == "profile":
+        OPTIONS_TABLE[k] = v.strip().lower()
+    elif k == "threads":
+        OPTIONS_TABLE[k] = int(v)
+        if OPTIONS_TABLE[k] < 1:
+            raise ValueError("must be at least 1")
+    elif k == "workloads":
+        OPTIONS_TABLE[k] = sdm_bench.BenchWorkload.from_str(v)
+    elif k == "full":
+        OPTIONS_TABLE[k] = sdm_util.to_bool(v)
+    elif k == "usage":
+        OPTIONS_TABLE[k] = sdm_util.to_bool(v)
+    elif k == "min-size":
+        OPTIONS_TABLE["min_size"] = v
+    elif k == "max-size":
+        OPTIONS_TABLE["max_size"] = v
+    elif k == "newer":
+        OPTIONS_TABLE[k] = v
+    elif k == "older":
+        OPTIONS_TABLE[k] = v
 
 
 def extract_options(argv):
@@ -600,13 +1314,14 @@ def process_options():
         if k == "log":
             numeric_level = OPTIONS_TABLE[k]
             if not isinstance(numeric_level, int):
-                raise ValueError("Invalid log level: %s" % numeric_level)
+                raise OptionException("invalid log level - %s" % numeric_level)
             logging.basicConfig(level=numeric_level)
             sdm_util.log_message("Set log level to %s" % numeric_level)
 
     # defaults
     global CONFIG_PATH
     global MOUNT_TABLE_PATH
+    global FILE_INDEX_PATH
     global config
     global mount_table
     global repository
@@ -620,10 +1335,11 @@ def process_options():
             ABS_SDM_CONFIG_DIR = sdm_util.get_abs_path(_config_root)
             CONFIG_PATH = "%s/sdm.conf" % ABS_SDM_CONFIG_DIR
             MOUNT_TABLE_PATH = "%s/sdm_mtab" % ABS_SDM_CONFIG_DIR
+            FILE_INDEX_PATH = "%s/index" % ABS_SDM_CONFIG_DIR
 
             config = sdm_config.Config(CONFIG_PATH)
             mount_table = sdm_mount_table.MountTable(MOUNT_TABLE_PATH)
-            repository = sdm_repository.Repository(config.repo_url)
+            repository = sdm_repository.Repository(config.repo_url, "%s/catalogue" % ABS_SDM_CONFIG_DIR)
             backend = config.default_backend
 
     for k in OPTIONS_TABLE:
@@ -643,8 +1359,13 @@ def main(argv=None):
     fill_options_table()
     fill_commands_table()
 
-    argv = extract_options(argv)
-    process_options()
+    try:
+        argv = extract_options(argv)
+        process_options()
+    except OptionException, e:
+        sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
+        sdm_util.print_message("See \"sdm help\" for options")
+        return 1
 
     if len(argv) >= 1:
         # has command part
@@ -653,6 +1374,8 @@ def main(argv=None):
 
         try:
             run(command, oargs)
+        except sdm_deadline.DeadlineExceededException, e:
+            sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
         except Exception, e:
             sdm_util.print_message(e, True, sdm_util.LogLevel.ERROR)
             traceback.print_exc()
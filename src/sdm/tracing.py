@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+
+##  @file: src/sdm/tracing.py
+#   Trace commands and the HTTP requests they make
+#
+#   @author Illyoung Choi
+#
+#   @copyright Copyright 2016 The Trustees of University of Arizona\n
+#   Licensed under the Apache License, Version 2.0 (the "License" );
+#   you may not use this file except in compliance with the License.\n
+#   You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0\n
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.\n
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import time
+import fcntl
+import threading
+import util as sdm_util
+
+DEFAULT_TRACE_PATH = "~/.sdm/traces.jsonl"
+DEFAULT_TRACE_MAX_BYTES = 10*1024*1024 # 10MB
+SERVICE_NAME = "sdm"
+
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_VERSION = "00"
+# sampled
+TRACEPARENT_FLAGS = "01"
+
+
+class SpanKind(object):
+    # a request sent to another host
+    CLIENT = "CLIENT"
+
+
+def _make_id(nbytes):
+    return os.urandom(nbytes).encode("hex")
+
+
+class Span(object):
+    """
+    A timed operation of a trace
+    """
+    def __init__(self, trace_id, name, parent_id=None, kind=None):
+        self.trace_id = trace_id
+        self.span_id = _make_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.end = None
+        self.tags = {}
+
+    def set_tag(self, k, v):
+        self.tags[k] = "%s" % v
+
+    def finish(self, end=None):
+        if self.end is None:
+            self.end = end or time.time()
+
+    def get_duration(self):
+        end = self.end or time.time()
+        return end - self.start
+
+    def get_traceparent(self):
+        """
+        Return a W3C traceparent header value making this span the parent
+        of the work done by the receiver
+        """
+        return "%s-%s-%s-%s" % (TRACEPARENT_VERSION, self.trace_id, self.span_id, TRACEPARENT_FLAGS)
+
+    def to_zipkin(self):
+        # Zipkin v2 span, times in usec
+        d = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": int(self.start * 1000000),
+            "duration": max(1, int(self.get_duration() * 1000000)),
+            "localEndpoint": {
+                "serviceName": SERVICE_NAME
+            },
+            "tags": self.tags
+        }
+        if self.parent_id:
+            d["parentId"] = self.parent_id
+        if self.kind:
+            d["kind"] = self.kind
+        return d
+
+    def __repr__(self):
+        return "<Span %s %s>" % \
+            (self.name, self.span_id)
+
+
+class Trace(object):
+    """
+    Spans of a command under a root span named after it
+    """
+    def __init__(self, name=SERVICE_NAME):
+        self.trace_id = _make_id(16)
+        self.root = Span(self.trace_id, name)
+        self.spans = []
+        # spans are started by concurrent mounts
+        self.lock = threading.Lock()
+
+    def start_span(self, name, kind=None):
+        span = Span(self.trace_id, name, self.root.span_id, kind)
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    def finish(self, error=None):
+        if error is not None:
+            self.root.set_tag("error", error)
+        self.root.finish()
+
+    def get_spans(self):
+        with self.lock:
+            return [self.root] + list(self.spans)
+
+    def export(self, path=DEFAULT_TRACE_PATH, max_bytes=DEFAULT_TRACE_MAX_BYTES):
+        """
+        Append the trace to a file as a line of Zipkin v2 JSON.
+        The file is moved to <path>.1 when it grows over max_bytes.
+        Each line is an array of spans that can be posted to Zipkin as is;
+        the lines of the file have to be merged into an array first, e.g.
+        jq -s add <path>.
+        """
+        abs_path = sdm_util.get_abs_path(path)
+        parent = os.path.dirname(abs_path)
+        if not os.path.exists(parent):
+            os.makedirs(parent, 0755)
+
+        line = json.dumps([span.to_zipkin() for span in self.get_spans()]) + "\n"
+        with open(abs_path + ".lock", "a") as lock_fd:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(abs_path) and os.path.getsize(abs_path) + len(line) > max_bytes:
+                    os.rename(abs_path, abs_path + ".1")
+                with open(abs_path, "a") as f:
+                    f.write(line)
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+    def __repr__(self):
+        return "<Trace %s %s>" % \
+            (self.root.name, self.trace_id)
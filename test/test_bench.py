@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import sdm.bench as sdm_bench
+
+
+def main(argv):
+    workdir = tempfile.mkdtemp()
+    try:
+        for d in range(3):
+            os.makedirs("%s/dir%d/sub" % (workdir, d))
+            for f in range(4):
+                with open("%s/dir%d/sub/file%d" % (workdir, d, f), "wb") as fd:
+                    fd.write(os.urandom(256 * 1024))
+
+        config = sdm_bench.BenchConfig()
+        config.seq_block_size = 64 * 1024
+        config.random_reads = 50
+        config.max_threads = 3
+        result = sdm_bench.run_bench(workdir, config)
+
+        assert result["files"] == 12
+        meta = result["workloads"]["meta"]
+        assert meta["dirs"] == 7
+        assert meta["stats"] == 18
+        seq = result["workloads"]["seq"]
+        assert seq["cold"]["bytes"] == 12 * 256 * 1024
+        assert seq["warm"]["bytes"] == 12 * 256 * 1024
+        assert sorted(seq["cold"]["read_latency_msec"].keys()) == ["p50", "p95", "p99"]
+        assert result["workloads"]["random"]["reads"] == 50
+        assert [r["threads"] for r in result["workloads"]["scaling"]] == [1, 2, 3]
+        json.dumps(result)
+
+        # only the chosen workloads run
+        config.workloads = sdm_bench.BenchWorkload.from_str("meta,random")
+        result = sdm_bench.run_bench(workdir, config)
+        assert sorted(result["workloads"].keys()) == ["meta", "random"]
+
+        # without meta the walk stops once enough files are found
+        config.workloads = sdm_bench.BenchWorkload.from_str("random")
+        config.max_files = 2
+        result = sdm_bench.run_bench(workdir, config)
+        assert result["files"] == 2
+        files, walk_result = sdm_bench.walk(workdir, 2, stat_all=False)
+        assert walk_result["truncated"]
+        assert walk_result["stats"] < 18
+
+        # the meta walk is capped too
+        files, walk_result = sdm_bench.walk(workdir, 1000, max_stats=5)
+        assert walk_result["stats"] == 5
+        assert walk_result["truncated"]
+
+        try:
+            sdm_bench.BenchWorkload.from_str("meta,bogus")
+            assert False
+        except sdm_bench.BenchException:
+            pass
+
+        print "OK"
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
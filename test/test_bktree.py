@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import sys
+import json
+import random
+import sdm.bktree as sdm_bktree
+
+
+def main(argv):
+    assert sdm_bktree.edit_distance("ivirus", "ivirus") == 0
+    assert sdm_bktree.edit_distance("ivirus", "ivirsu") == 2
+    assert sdm_bktree.edit_distance("ivirus", "virus") == 1
+    assert sdm_bktree.edit_distance("", "abc") == 3
+
+    tree = sdm_bktree.BKTree(["ivirus", "imicrobe", "tara", "gos", "ivirus"])
+    assert len(tree) == 4
+    assert tree.search("ivrus", 1) == [(1, "ivirus")]
+    assert tree.search("tar", 3) == [(1, "tara"), (3, "gos")]
+    assert tree.search("zzzzzzzz", 2) == []
+
+    # same answers as a linear scan
+    rnd = random.Random(7)
+    words = ["".join([rnd.choice("abcde") for _ in range(rnd.randint(3, 8))]) for _ in range(2000)]
+    tree = sdm_bktree.BKTree(words)
+    for query in words[:50]:
+        expected = sorted(set([(sdm_bktree.edit_distance(query, w), w) for w in words if sdm_bktree.edit_distance(query, w) <= 2]))
+        assert tree.search(query, 2) == expected
+
+    # a stored tree gives the same answers
+    stored = sdm_bktree.BKTree.from_list(json.loads(json.dumps(tree.to_list())))
+    assert len(stored) == len(tree)
+    for query in words[:50]:
+        assert stored.search(query, 2) == tree.search(query, 2)
+    assert len(sdm_bktree.BKTree.from_list(sdm_bktree.BKTree().to_list())) == 0
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import sdm.repository as sdm_repository
+import sdm.bktree as sdm_bktree
+import sdm.catalogue_codec as sdm_catalogue_codec
+
+
+def main(argv):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalogue.json"), "r") as f:
+        entries = json.load(f)
+
+    index = sdm_repository.RepositoryIndex.build([sdm_repository.RepositoryEntry.from_dict(ent) for ent in entries])
+    name_tree = sdm_bktree.BKTree([ent["dataset"] for ent in entries])
+    doc = sdm_catalogue_codec.make_artifact(7, entries, index.grams, name_tree.to_list())
+
+    # all datasets share a key
+    assert len(doc["keys"]) == 1
+
+    # same catalogue, same bytes
+    data = sdm_catalogue_codec.encode_json_gz(doc)
+    assert data == sdm_catalogue_codec.encode_json_gz(doc)
+    assert len(data) < len(json.dumps(entries)) / 4
+
+    catalogue = sdm_catalogue_codec.read_artifact(sdm_catalogue_codec.decode(data))
+    assert catalogue["version"] == 7
+    assert sorted(catalogue["entries"]) == sorted(entries)
+    assert catalogue["content_hash"] == sdm_catalogue_codec.make_content_hash(list(reversed(entries)))
+
+    # entries without a key round-trip
+    keyless = sdm_repository.RepositoryEntry("open", "http://ms.example.org", "open", "anonymous", "", "anonymous_gw", "an open dataset").to_dict()
+    catalogue = sdm_catalogue_codec.read_artifact(sdm_catalogue_codec.decode(sdm_catalogue_codec.encode_json_gz(sdm_catalogue_codec.make_artifact(1, [keyless]))))
+    assert catalogue["entries"] == [keyless]
+
+    # tampered entries are rejected
+    tampered = sdm_catalogue_codec.decode(data)
+    tampered["entries"][0]["ms_host"] = "http://evil"
+    try:
+        sdm_catalogue_codec.read_artifact(tampered)
+        assert False
+    except sdm_catalogue_codec.CatalogueCodecException:
+        pass
+
+    # negotiated responses decode by their headers
+    content_type = sdm_catalogue_codec.choose_content_type(sdm_catalogue_codec.get_accept_header())
+    assert content_type != sdm_catalogue_codec.JSON_TYPE
+    assert sdm_catalogue_codec.choose_content_type("application/json") == sdm_catalogue_codec.JSON_TYPE
+    content_encoding = sdm_catalogue_codec.choose_content_encoding(sdm_catalogue_codec.get_accept_encoding_header())
+    assert content_encoding is not None
+    assert sdm_catalogue_codec.choose_content_encoding("identity") is None
+    body = sdm_catalogue_codec.encode_body(doc, content_type, content_encoding)
+    assert sdm_catalogue_codec.decode_body(body, content_type, content_encoding) == sdm_catalogue_codec.decode(data)
+    body = sdm_catalogue_codec.encode_body(entries, sdm_catalogue_codec.JSON_TYPE)
+    assert sdm_catalogue_codec.decode_body(body, "application/json; charset=utf-8") == entries
+
+    # repository loads an artifact with its index
+    workdir = tempfile.mkdtemp()
+    try:
+        path = "%s/catalogue-7.json.gz" % workdir
+        with open(path, "wb") as f:
+            f.write(data)
+
+        repo = sdm_repository.Repository(path)
+        assert repo.version == None
+        assert sorted([ent.dataset for ent in repo.list_entries()]) == sorted([ent["dataset"] for ent in entries])
+        assert repo.version == 7
+        assert [ent.dataset for ent in repo.list_entries("viral")] == ["ivirus"]
+        assert repo.get_entry("refseq").user_pkey == entries[0]["user_pkey"]
+
+        # and with its tree of dataset names
+        assert len(repo.name_tree) == len(entries)
+        assert repo.suggest("ivirsu")[0] == (2, "ivirus")
+    finally:
+        shutil.rmtree(workdir)
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,141 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import sys
+import shutil
+import tempfile
+import sdm.repository as sdm_repository
+import sdm.catalogue_source as sdm_catalogue_source
+
+
+def make_entry(dataset, description):
+    return {
+        "dataset": dataset,
+        "ms_host": "http://localhost:8080",
+        "volume": dataset,
+        "username": "anonymous",
+        "user_pkey": "",
+        "gateway": "%s_anonymous" % dataset,
+        "description": description
+    }
+
+
+def list_datasets(repo, query=None):
+    return sorted([ent.dataset for ent in repo.list_entries(query)])
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+def no_request(*args, **kwargs):
+    raise AssertionError("unexpected request")
+
+
+def main(argv):
+    workdir = tempfile.mkdtemp()
+    try:
+        server = sdm_catalogue_source.LocalCatalogueSource("%s/server" % workdir)
+        cache_path = "%s/cache" % workdir
+        url = "file://%s/server" % workdir
+
+        server.publish([
+            make_entry("ivirus", "iVirus - viral ecology"),
+            make_entry("refseq", "NCBI-REFSEQ")
+        ])
+
+        # first sync downloads the full catalogue
+        repo = sdm_repository.Repository(url, cache_path)
+        assert list_datasets(repo) == ["ivirus", "refseq"]
+        assert repo.version == 1
+
+        server.publish([
+            make_entry("ivirus", "iVirus - viral ecology v2"),
+            make_entry("uhslc", "Ocean Tide Dataset")
+        ])
+
+        # delta applied to the in-memory table and its index
+        repo.load_table()
+        assert repo.version == 2
+        assert list_datasets(repo) == ["ivirus", "uhslc"]
+        assert list_datasets(repo, "v2") == ["ivirus"]
+        assert list_datasets(repo, "tide") == ["uhslc"]
+        assert list_datasets(repo, "ncbi") == []
+
+        server.publish([
+            make_entry("uhslc", "Ocean Tide Dataset")
+        ])
+
+        # delta applied to the local snapshot
+        repo = sdm_repository.Repository(url, cache_path)
+        assert list_datasets(repo) == ["uhslc"]
+        assert repo.version == 3
+
+        # listing builds no index, a full sync of the same version keeps the snapshot
+        assert repo.index is None
+        saves = []
+        save_snapshot = repo._save_snapshot
+        repo._save_snapshot = lambda version, table, name_tree=None: saves.append(version) or save_snapshot(version, table, name_tree)
+        repo._apply_full(server.fetch_all())
+        assert saves == []
+        assert list_datasets(repo, "tide") == ["uhslc"]
+        assert repo.index is not None
+
+        # unknown version falls back to a full sync
+        repo = sdm_repository.Repository(url, cache_path)
+        repo._save_snapshot(100, {})
+        assert list_datasets(repo) == ["uhslc"]
+        assert repo.version == 3
+
+        server.publish([
+            make_entry("uhslc", "Ocean Tide Dataset"),
+            make_entry("tara", "Tara Oceans")
+        ])
+
+        # suggestions use the tree of names kept in the snapshot
+        repo = sdm_repository.Repository(url, cache_path)
+        assert repo.suggest("taro") == [(1, "tara")]
+        assert repo.suggest("ivirus") == []
+        assert sorted(repo._load_snapshot()[2].search("uhslcc", 2)) == [(1, "uhslc")]
+        assert len(repo._load_snapshot()[2]) == 2
+
+        # capabilities come from response headers and are kept for later commands
+        http_url = "http://127.0.0.1:1/"
+        repo = sdm_repository.Repository(http_url, cache_path)
+        repo.source._learn_capabilities(FakeResponse(404, {}))
+        assert repo.source.get_learned_capabilities() is None
+        repo.source._learn_capabilities(FakeResponse(200, {sdm_catalogue_source.CAPABILITIES_HEADER: "Delta, query"}))
+        repo._save_capabilities()
+
+        repo = sdm_repository.Repository(http_url, cache_path)
+        repo.source._get = no_request
+        assert repo.source.has_capability("delta")
+        assert not repo.source.has_capability("artifact")
+
+        # a server without the header has no optional features
+        repo.source._learn_capabilities(FakeResponse(200, {}))
+        assert repo.source.get_capabilities() == []
+
+        print "OK"
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
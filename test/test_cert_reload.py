@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+
+import sys
+import time
+import StringIO
+import sdm.fuse_backend as sdm_fuse_backend
+import sdm.deadline as sdm_deadline
+
+
+class FakeProcess(object):
+    """
+    A cert reload that never finishes until it is killed
+    """
+    def __init__(self):
+        self.returncode = None
+        self.waited = False
+        self.output_file = StringIO.StringIO()
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        self.returncode = -9
+
+    def wait(self):
+        self.waited = True
+        return self.returncode
+
+
+def main(argv):
+    bimpl = sdm_fuse_backend.FuseBackend(sdm_fuse_backend.FuseBackendConfig())
+    bimpl.set_deadline(sdm_deadline.Deadline(0.01))
+    time.sleep(0.02)
+
+    # the deadline stops every reload, not only the one waited for
+    procs = [("volume", "ivirus", FakeProcess()), ("gateway", "ivirus_anonymous", FakeProcess())]
+    try:
+        bimpl._finish_reload_certs("/nonexistent", procs)
+        assert False
+    except sdm_deadline.DeadlineExceededException:
+        pass
+
+    for _, _, proc in procs:
+        assert proc.returncode == -9
+        assert proc.waited
+        assert proc.output_file.closed
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
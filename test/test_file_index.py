@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import sdm.file_index as sdm_file_index
+
+
+def write_file(path, size, mtime=None):
+    with open(path, "wb") as f:
+        f.write("x" * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def main(argv):
+    workdir = tempfile.mkdtemp()
+    try:
+        root = os.path.join(workdir, "refseq")
+        now = time.time()
+        for d in ["viral", "bacteria/a", "bacteria/b"]:
+            os.makedirs(os.path.join(root, d))
+        write_file(os.path.join(root, "README"), 10)
+        write_file(os.path.join(root, "viral", "v1.fna"), 2048, now - 30 * 86400)
+        write_file(os.path.join(root, "viral", "v2.gbff"), 100)
+        write_file(os.path.join(root, "bacteria", "a", "a1.fna"), 4096)
+        write_file(os.path.join(root, "bacteria", "b", "odd\tname.fna"), 1)
+
+        index = sdm_file_index.FileIndex("refseq", root)
+        assert index.update(threads=4) == 5
+        assert index.get_file_count() == 5
+
+        index_path = sdm_file_index.get_index_path(os.path.join(workdir, "index"), "refseq")
+        index.save(index_path)
+        index = sdm_file_index.FileIndex.load(index_path)
+        assert index.get_file_count() == 5
+        assert sorted(index.dirs["bacteria"].subdirs) == ["a", "b"]
+
+        names = [p for p, _, _ in index.find("*.fna")]
+        assert names == ["bacteria/a/a1.fna", "bacteria/b/odd\tname.fna", "viral/v1.fna"], names
+        assert [p for p, _, _ in index.find("viral/*")] == ["viral/v1.fna", "viral/v2.gbff"]
+        assert [p for p, _, _ in index.find("*.fna", min_size=sdm_file_index.parse_size("2K"))] == ["bacteria/a/a1.fna", "viral/v1.fna"]
+        assert [p for p, _, _ in index.find(max_size=10)] == ["README", "bacteria/b/odd\tname.fna"]
+        week_ago = now - sdm_file_index.parse_age("7d")
+        assert [p for p, _, _ in index.find(older_than=week_ago)] == ["viral/v1.fna"]
+        assert len(list(index.find(newer_than=week_ago))) == 4
+
+        # only changed directories are listed again
+        write_file(os.path.join(root, "bacteria", "a", "a2.fna"), 5)
+        shutil.rmtree(os.path.join(root, "viral"))
+        assert index.update() == 2
+        assert [p for p, _, _ in index.find("*.fna")] == ["bacteria/a/a1.fna", "bacteria/a/a2.fna", "bacteria/b/odd\tname.fna"]
+        assert "viral" not in index.dirs
+        index.save(index_path)
+        assert sdm_file_index.FileIndex.load(index_path).get_file_count() == 4
+        assert index.update() == 0
+        assert index.update(full=True) == 4
+
+        # a directory that cannot be listed keeps its old listing and is
+        # listed again once it can be
+        write_file(os.path.join(root, "bacteria", "b", "b2.fna"), 5)
+        listdir = os.listdir
+        b_path = os.path.join(root, "bacteria", "b")
+        def failing_listdir(path):
+            if path == b_path:
+                raise OSError(5, "Input/output error")
+            return listdir(path)
+        os.listdir = failing_listdir
+        try:
+            assert index.update() == 0
+        finally:
+            os.listdir = listdir
+        assert index.dirs["bacteria/b"].mtime is None
+        assert index.get_file_count() == 4
+        index.save(index_path)
+        index = sdm_file_index.FileIndex.load(index_path)
+        assert index.update() == 1
+        assert index.get_file_count() == 5
+
+        for bad in ["10X", "", "-1"]:
+            try:
+                sdm_file_index.parse_size(bad)
+                assert False
+            except sdm_file_index.FileIndexException:
+                pass
+        assert sdm_file_index.parse_age("12h") == 43200
+        assert sdm_file_index.parse_age("3") == 3 * 86400
+
+        print "OK"
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import sys
+import shutil
+import time
+import tempfile
+import sdm.host_health as sdm_host_health
+
+HOST = "http://host1:8888"
+OPEN_SEC = 0.2
+CircuitState = sdm_host_health.CircuitState
+
+
+def main(argv):
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, "health.json")
+        table = sdm_host_health.HostHealthTable(path, 0.5, OPEN_SEC)
+
+        # closed until enough results fail
+        table.record_success(HOST, 0.1)
+        table.record_failure(HOST)
+        assert table.get_health(HOST).state == CircuitState.CLOSED
+        table.record_failure(HOST)
+        table.record_failure(HOST)
+        assert table.get_health(HOST).state == CircuitState.OPEN
+        assert not table.allow_request(HOST)
+        table.flush()
+        assert os.path.exists(path)
+
+        # after open_sec, a single invocation gets to probe
+        time.sleep(OPEN_SEC)
+        other = sdm_host_health.HostHealthTable(path, 0.5, OPEN_SEC)
+        assert table.allow_request(HOST) and other.allow_request(HOST)
+        assert table.claim_probe(HOST)
+        assert table.get_health(HOST).state == CircuitState.HALF_OPEN
+        assert not other.claim_probe(HOST)
+        assert not other.allow_request(HOST)
+
+        # a failed probe opens the circuit again
+        table.record_failure(HOST)
+        assert table.get_health(HOST).state == CircuitState.OPEN
+        table.flush()
+
+        # a successful probe closes it
+        time.sleep(OPEN_SEC)
+        assert table.claim_probe(HOST)
+        table.record_success(HOST, 0.2)
+        health = table.get_health(HOST)
+        assert health.state == CircuitState.CLOSED
+        assert health.results == [True]
+        table.flush()
+        assert sdm_host_health.HostHealthTable(path).get_health(HOST).state == CircuitState.CLOSED
+
+        # successes alone are saved at exit, not per request
+        mtime = os.path.getmtime(path)
+        size = os.path.getsize(path)
+        table.record_success(HOST, 0.3)
+        table.flush()
+        assert table.save_at_exit
+        assert len(table.pending) == 1
+        assert (os.path.getmtime(path), os.path.getsize(path)) == (mtime, size)
+        table.save()
+        assert 0.3 in sdm_host_health.HostHealthTable(path).get_health(HOST).latencies
+    finally:
+        shutil.rmtree(workdir)
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import sdm.latency_history as sdm_latency_history
+
+MOUNT = sdm_latency_history.LatencyPhase.MOUNT
+SETUP = sdm_latency_history.LatencyPhase.SETUP
+
+
+def main(argv):
+    histogram = sdm_latency_history.LatencyHistogram()
+    assert histogram.get_percentile(50) is None
+    for _ in range(99):
+        histogram.add(1.0)
+    histogram.add(50.0)
+    # percentiles are upper bounds of buckets
+    assert 1.0 <= histogram.get_percentile(50) < 1.5
+    assert 1.0 <= histogram.get_percentile(99) < 1.5
+    assert 50.0 <= histogram.get_percentile(100) < 75.0
+
+    # counts stay bounded
+    for _ in range(1000):
+        histogram.add(2.0)
+    assert histogram.get_count() <= sdm_latency_history.HISTOGRAM_MAX_COUNT
+
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, "sub", "history.json")
+        history = sdm_latency_history.LatencyHistory(path)
+        # too little history
+        history.record("refseq", MOUNT, 2.0)
+        assert history.get_timeout("refseq", MOUNT, 30, 3.0, 10, 600) == 30
+        assert history.get_estimate("refseq", [SETUP, MOUNT]) is None
+
+        for _ in range(10):
+            history.record("refseq", MOUNT, 8.0)
+            history.record("refseq", SETUP, 1.0)
+        history.save()
+
+        loaded = sdm_latency_history.LatencyHistory(path)
+        assert loaded.get_histogram("REFSEQ", MOUNT).get_count() == 11
+        p99 = loaded.get_percentile("refseq", MOUNT, 99)
+        assert 8.0 <= p99 < 12.0
+        assert loaded.get_timeout("refseq", MOUNT, 30, 3.0, 10, 600) == p99 * 3.0
+        assert loaded.get_timeout("refseq", MOUNT, 30, 3.0, 10, 20) == 20
+        assert loaded.get_timeout("refseq", MOUNT, 30, 0.1, 10, 600) == 10
+        assert loaded.get_estimate("refseq", [SETUP, MOUNT]) == loaded.get_percentile("refseq", SETUP, 50) + loaded.get_percentile("refseq", MOUNT, 50)
+
+        # timed-out waits are not durations - each one in a row waits
+        # longer up to the ceiling, then the next starts over
+        timeouts = []
+        for _ in range(5):
+            timeouts.append(history.get_timeout("slow", MOUNT, 30, 3.0, 10, 240))
+            history.record_timeout("slow", MOUNT)
+        assert timeouts == [30, 90, 240, 30, 90]
+        assert history.get_histogram("slow", MOUNT).get_count() == 0
+        history.save()
+        assert sdm_latency_history.LatencyHistory(path).get_timeouts("slow", MOUNT) == 5
+
+        # a mount that succeeds resets the count
+        history.record("slow", MOUNT, 20.0)
+        assert history.get_timeout("slow", MOUNT, 30, 3.0, 10, 240) == 30
+        history.save()
+        assert sdm_latency_history.LatencyHistory(path).get_timeouts("slow", MOUNT) == 0
+
+        # saves of other invocations are merged
+        history.record("refseq", MOUNT, 8.0)
+        loaded.record("refseq", MOUNT, 8.0)
+        history.save()
+        loaded.save()
+        assert sdm_latency_history.LatencyHistory(path).get_histogram("refseq", MOUNT).get_count() == 13
+
+        # a broken file is started over
+        with open(path, "w") as f:
+            f.write("{")
+        assert sdm_latency_history.LatencyHistory(path).get_histogram("refseq", MOUNT).get_count() == 0
+    finally:
+        shutil.rmtree(workdir)
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
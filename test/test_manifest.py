@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import sys
+import sdm.manifest as sdm_manifest
+import sdm.mount_table as sdm_mount_table
+
+BACKEND = "FUSE"
+
+
+def make_record(dataset, mount_path, status=sdm_mount_table.MountRecordStatus.MOUNTED):
+    return sdm_mount_table.MountRecord(dataset, mount_path, BACKEND, status)
+
+
+def plan(manifest_dict, records, broken=[], options={}):
+    manifest = sdm_manifest.Manifest.from_dict(manifest_dict, BACKEND)
+    actions = sdm_manifest.make_plan(
+        manifest,
+        records,
+        lambda rec: rec.dataset not in broken,
+        lambda rec: options.get(rec.dataset, {"cache_size": 100})
+    )
+    return sorted([(a.action, a.dataset, a.mount_path) for a in actions])
+
+
+def main(argv):
+    records = [
+        make_record("ivirus", "/data/ivirus"),
+        make_record("refseq", "/data/refseq"),
+        make_record("uhslc", "/data/uhslc", sdm_mount_table.MountRecordStatus.UNMOUNTED)
+    ]
+
+    # unchanged manifest is a no-op
+    assert plan([
+        {"dataset": "ivirus", "path": "/data/ivirus"},
+        {"dataset": "refseq", "path": "/data/refseq", "cache_size": 100}
+    ], records) == []
+
+    # without prune other mounts stay
+    assert plan({"mounts": [{"dataset": "ivirus"}], "prune": False}, records) == []
+
+    # new, pruned, moved, resized, broken and unmounted mounts
+    assert plan([
+        {"dataset": "ivirus", "path": "/data2/ivirus"},
+        {"dataset": "uhslc", "path": "/data/uhslc"},
+        {"dataset": "imicrobe"}
+    ], records) == [
+        ("MOUNT", "imicrobe", None),
+        ("MOUNT", "uhslc", "/data/uhslc"),
+        ("REMOUNT", "ivirus", "/data2/ivirus"),
+        ("UNMOUNT", "refseq", "/data/refseq")
+    ]
+    assert plan([{"dataset": "refseq", "cache_size": 200}], records[1:2]) == [("REMOUNT", "refseq", "/data/refseq")]
+    assert plan([{"dataset": "refseq"}], records[1:2], broken=["refseq"]) == [("REMOUNT", "refseq", "/data/refseq")]
+
+    # options a backend does not report, as with REST mounts, never change
+    assert plan([{"dataset": "refseq", "cache_size": 200, "profile": "throughput"}], records[1:2], options={"refseq": {}}) == []
+
+    # children are unmounted before parents, parents are mounted before children
+    manifest = sdm_manifest.Manifest.from_dict([
+        {"dataset": "parent", "path": "/data/p"},
+        {"dataset": "child", "path": "/data/p/c"}
+    ], BACKEND)
+    old = [make_record("oldparent", "/old"), make_record("oldchild", "/old/c")]
+    actions = sdm_manifest.make_plan(manifest, old, lambda rec: True, lambda rec: {})
+    stages = []
+    for stage in sdm_manifest.make_stages(actions):
+        stages.append(sorted([(a.dataset, is_unmount) for a, is_unmount in stage]))
+    assert stages == [
+        [("oldchild", True)],
+        [("oldparent", True)],
+        [("parent", False)],
+        [("child", False)]
+    ]
+
+    # a dataset can appear once
+    try:
+        sdm_manifest.Manifest.from_dict([{"dataset": "a"}, {"dataset": "A"}], BACKEND)
+        assert False
+    except sdm_manifest.ManifestException:
+        pass
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import sys
+import sdm.mount_table as sdm_mount_table
+import sdm.mount_selector as sdm_mount_selector
+
+MOUNTED = sdm_mount_table.MountRecordStatus.MOUNTED
+UNMOUNTED = sdm_mount_table.MountRecordStatus.UNMOUNTED
+
+
+def make_records():
+    return [
+        sdm_mount_table.MountRecord("refseq", "/opt/dataset/refseq", "FUSE", MOUNTED, "aa11"),
+        sdm_mount_table.MountRecord("refseq_protein", "/opt/dataset/refseq_protein", "FUSE", UNMOUNTED, "aa22"),
+        sdm_mount_table.MountRecord("uniprot", "/opt/dataset/uniprot", "FUSE", MOUNTED, "bb33"),
+        sdm_mount_table.MountRecord("pdb", "hsyn://host/pdb", "REST", MOUNTED, "cc44"),
+    ]
+
+
+def ids(records):
+    return [rec.record_id for rec in records]
+
+
+def main(argv):
+    selector = sdm_mount_selector.MountSelector(make_records())
+
+    # a single mount by dataset, id prefix or path
+    assert ids(selector.select("refseq")) == ["aa11"]
+    assert ids(selector.select("bb")) == ["bb33"]
+    assert ids(selector.select("/opt/dataset/uniprot")) == ["bb33"]
+    assert ids(selector.select("hsyn://host/pdb")) == ["cc44"]
+    try:
+        selector.select("aa")
+        assert False
+    except sdm_mount_selector.MountSelectorException:
+        pass
+
+    # globs and attributes
+    assert ids(selector.select("refseq*")) in (["aa11", "aa22"], ["aa22", "aa11"])
+    assert ids(selector.select("status=mounted,backend=fuse")) == ["aa11", "bb33"]
+    assert sorted(ids(selector.select("id=aa"))) == ["aa11", "aa22"]
+    # path prefixes match whole components
+    assert ids(selector.select("path=/opt/dataset/refseq")) == ["aa11"]
+    assert len(selector.select("path=/opt/dataset")) == 3
+    assert sdm_mount_selector.is_attribute_selector("dataset=ref*,status=mounted")
+    assert not sdm_mount_selector.is_attribute_selector("owner=me")
+
+    # in mount table order, without duplicates, with errors for misses
+    records, errors = selector.resolve(["uniprot", "dataset=*", "missing", "aa"])
+    assert ids(records) == ["aa11", "aa22", "bb33", "cc44"]
+    assert len(errors) == 2
+    assert "missing" in errors[0]
+
+    assert len(selector.select_all()) == 4
+    assert sdm_mount_selector.MountSelector([]).resolve(["refseq"]) == ([], ["Cannot find mount - refseq"])
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import sdm.resource_limits as sdm_resource_limits
+
+
+def main(argv):
+    limits = sdm_resource_limits.ResourceLimits.from_dict({
+        "cgroup": True,
+        "cpu_weight": 50,
+        "cpu_max": 1.5,
+        "memory_max": 2*1024*1024*1024,
+        "io_weight": 20,
+        "nice": 10,
+        "ionice_class": "idle"
+    })
+    assert limits.get_cgroup_settings() == {
+        "cpu.weight": "50",
+        "cpu.max": "150000 100000",
+        "memory.max": "2147483648",
+        "io.weight": "default 20"
+    }
+    assert limits.has_process_limits()
+    assert sdm_resource_limits.ResourceLimits.from_dict(limits.to_dict()) == limits
+    assert not sdm_resource_limits.ResourceLimits().has_process_limits()
+
+    for bad in [{"cpu_weight": 0}, {"nice": 20}, {"ionice_class": "fast"}, {"cpu_affinity": []}, {"memory_max": True}]:
+        try:
+            sdm_resource_limits.ResourceLimits.from_dict(bad)
+            assert False, bad
+        except sdm_resource_limits.ResourceLimitsException:
+            pass
+
+    workdir = tempfile.mkdtemp()
+    try:
+        # cgroup files as the kernel shows them
+        with open(os.path.join(workdir, "cpu.stat"), "w") as f:
+            f.write("usage_usec 2500000\nuser_usec 2000000\nsystem_usec 500000\n")
+        with open(os.path.join(workdir, "memory.current"), "w") as f:
+            f.write("1048576\n")
+        with open(os.path.join(workdir, "io.stat"), "w") as f:
+            f.write("8:0 rbytes=100 wbytes=10 rios=1 wios=1\n8:16 rbytes=50 wbytes=0 rios=1 wios=0\n")
+        assert sdm_resource_limits.get_usage(workdir) == {
+            "cpu_sec": 2.5,
+            "memory_bytes": 1048576,
+            "read_bytes": 150,
+            "write_bytes": 10
+        }
+        assert sdm_resource_limits.get_usage(os.path.join(workdir, "gone")) is None
+
+        # nice is applied to a running process
+        limits = sdm_resource_limits.ResourceLimits.from_dict({"nice": 19})
+        proc = subprocess.Popen(["sleep", "10"])
+        try:
+            sdm_resource_limits.apply_process_limits(limits, proc.pid)
+            with open("/proc/%d/stat" % proc.pid, "r") as f:
+                assert f.read().rsplit(")", 1)[1].split()[16] == "19"
+        finally:
+            proc.kill()
+            proc.wait()
+
+        # a process that is not in a cgroup fails to join it
+        assert sdm_resource_limits.get_process_cgroup(os.getpid()) is not None
+        try:
+            sdm_resource_limits.join_cgroup(workdir, os.getpid())
+            assert False
+        except sdm_resource_limits.ResourceLimitsException:
+            pass
+    finally:
+        shutil.rmtree(workdir)
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+
+import os
+import sys
+import shutil
+import tempfile
+import sdm.fuse_backend as sdm_fuse_backend
+
+DATASET = "ivirus"
+GATEWAY = "ivirus_anonymous"
+
+
+class FakeNode(object):
+    """
+    Bind mounts and the shared syndicatefs of a node
+    """
+    def __init__(self, bimpl):
+        self.instance_mounted = False
+        self.instance_starts = []
+        self.bind_mounts = set()
+
+        def mount_syndicatefs(mount_id, dataset, gateway_name, mount_path, debug_mode, debug_level, use_valgrind, log_sink, fuse_options):
+            self.instance_mounted = True
+            self.instance_starts.append(fuse_options)
+
+        def unmount_syndicatefs(mount_id, mount_path, dataset=None):
+            self.instance_mounted = False
+            return [("unmount", "ok")]
+
+        bimpl._setup_syndicate = lambda *args: None
+        bimpl._mount_syndicatefs = mount_syndicatefs
+        bimpl._unmount_syndicatefs = unmount_syndicatefs
+        bimpl._remove_syndicate_setup = lambda mount_id: None
+        bimpl._is_shared_instance_mounted = lambda instance_id: self.instance_mounted
+        bimpl._bind_mount = lambda source_path, mount_path: self.bind_mounts.add(mount_path)
+        bimpl._bind_unmount = lambda mount_path: self.bind_mounts.discard(mount_path)
+        bimpl._get_fuse_mounts = lambda name, mount_path: [mount_path] if mount_path in self.bind_mounts else []
+        bimpl._set_shared_instance_id = lambda mount_id, instance_id: None
+
+
+def as_user(uid, func, *args):
+    """
+    Run func as root through sudo by the user of uid
+    """
+    os.environ["SUDO_UID"] = str(uid)
+    try:
+        return func(*args)
+    finally:
+        del os.environ["SUDO_UID"]
+
+
+def load_ref_uids(bimpl, instance_id):
+    return sorted([ref["uid"] for ref in bimpl._load_shared_instance_refs(instance_id)])
+
+
+def main(argv):
+    workdir = tempfile.mkdtemp()
+    getuid = os.getuid
+    try:
+        config = sdm_fuse_backend.FuseBackendConfig()
+        config.shared_mount = True
+        config.shared_mount_root = workdir
+        bimpl = sdm_fuse_backend.FuseBackend(config)
+        node = FakeNode(bimpl)
+        mount_options = bimpl._make_mount_options(None, DATASET)
+        instance_id = bimpl._make_shared_instance_id(DATASET, GATEWAY)
+        mount_id = "%s-fuse" % DATASET
+
+        def mount(mount_path):
+            bimpl._mount_shared(mount_id, "http://localhost:8080", DATASET, "anonymous", "", GATEWAY, mount_path, mount_options)
+
+        def unmount(mount_path):
+            return bimpl._unmount_shared(instance_id, mount_id, mount_path)
+
+        # users cannot run a shared instance of their own
+        os.getuid = lambda: 1001
+        try:
+            mount("/home/alice/ivirus")
+            assert False
+        except sdm_fuse_backend.FuseBackendException:
+            pass
+        assert node.instance_starts == []
+
+        # two users share an instance started once, as root, with allow_other
+        os.getuid = lambda: 0
+        as_user(1001, mount, "/home/alice/ivirus")
+        as_user(1002, mount, "/home/bob/ivirus")
+        assert len(node.instance_starts) == 1
+        assert node.instance_starts[0]["allow_other"]
+        assert "allow_other" not in mount_options["fuse_options"]
+        assert load_ref_uids(bimpl, instance_id) == [1001, 1002]
+
+        # a user cannot unmount the mount of another
+        try:
+            as_user(1002, unmount, "/home/alice/ivirus")
+            assert False
+        except sdm_fuse_backend.FuseBackendException:
+            pass
+        assert "/home/alice/ivirus" in node.bind_mounts
+
+        # the instance stops with the last reference only
+        assert as_user(1001, unmount, "/home/alice/ivirus") is None
+        assert node.instance_mounted
+        assert load_ref_uids(bimpl, instance_id) == [1002]
+
+        assert as_user(1002, unmount, "/home/bob/ivirus") == [("unmount", "ok")]
+        assert not node.instance_mounted
+        assert node.bind_mounts == set()
+    finally:
+        os.getuid = getuid
+        shutil.rmtree(workdir)
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,69 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import tempfile
+import sdm.tracing as sdm_tracing
+
+
+def main(argv):
+    trace = sdm_tracing.Trace("mount")
+    span = trace.start_span("GET /user/check", sdm_tracing.SpanKind.CLIENT)
+    span.set_tag("http.status_code", 200)
+    span.finish()
+    trace.finish()
+
+    m = re.match(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-01$", span.get_traceparent())
+    assert m is not None
+    assert m.group(1) == trace.trace_id
+    assert m.group(2) == span.span_id
+
+    root, child = [s.to_zipkin() for s in trace.get_spans()]
+    assert root["name"] == "mount" and "parentId" not in root
+    assert child["traceId"] == root["traceId"]
+    assert child["parentId"] == root["id"]
+    assert child["kind"] == "CLIENT"
+    assert child["tags"] == {"http.status_code": "200"}
+    assert child["timestamp"] >= root["timestamp"]
+
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, "sub", "traces.jsonl")
+        trace.export(path)
+        trace.export(path)
+        with open(path, "r") as f:
+            lines = f.readlines()
+        assert len(lines) == 2
+        assert [s["id"] for s in json.loads(lines[0])] == [root["id"], child["id"]]
+
+        # moved aside when full
+        trace.export(path, len(lines[0]))
+        assert os.path.exists(path + ".1")
+        with open(path, "r") as f:
+            assert len(f.readlines()) == 1
+    finally:
+        shutil.rmtree(workdir)
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import sdm.fuse_backend as sdm_fuse_backend
+import sdm.latency_history as sdm_latency_history
+import sdm.abstract_backend as sdm_absbackends
+import sdm.deadline as sdm_deadline
+
+
+class FakeProcess(object):
+    """
+    A syndicatefs that exits on its own ("wait"), on SIGTERM ("term"),
+    on SIGKILL ("kill") or never
+    """
+    pid = 42
+
+    def __init__(self, exits_on):
+        self.exits_on = exits_on
+        self.exited = exits_on == "wait"
+
+    def terminate(self):
+        self.exited = self.exits_on == "term"
+
+    def kill(self):
+        self.exited = self.exits_on in ["term", "kill"]
+
+
+def unmount(fusermount_results, exits_on, history=None):
+    """
+    Run the unmount stages with fusermount returning "ok", "busy",
+    "not_found" or "timeout" in turn. Returns the outcome, or
+    "raised <outcome>" when the mount or syndicatefs is left behind.
+    """
+    bimpl = sdm_fuse_backend.FuseBackend(sdm_fuse_backend.FuseBackendConfig())
+    results = iter(fusermount_results)
+    dataset = None
+    if history is not None:
+        bimpl.latency_history = history
+        dataset = "refseq"
+
+    def run_command_foreground(command, description, deadline=None):
+        r = next(results)
+        if r == "timeout":
+            raise sdm_deadline.DeadlineExceededException(description)
+        if r == "busy":
+            raise sdm_fuse_backend.FuseBackendException("Failed - 1 : Device or resource busy")
+        if r == "not_found":
+            raise sdm_fuse_backend.FuseBackendException("Failed - 1 : entry for /mnt not found in /etc/mtab")
+
+    process = None
+    if exits_on:
+        process = FakeProcess(exits_on)
+    bimpl._run_command_foreground = run_command_foreground
+    bimpl._get_syndicatefs_process = lambda mount_id: (process is not None, process)
+    bimpl._get_syndicatefs_cgroup = lambda mount_id: None
+    bimpl._remove_syndicatefs_pid = lambda mount_id: None
+    bimpl._wait_process_exit = lambda p, timeout: p.exited
+    try:
+        return sdm_fuse_backend.format_unmount_outcome(bimpl._unmount_syndicatefs("id", "/mnt", dataset))
+    except sdm_absbackends.UnmountException, e:
+        return "raised %s" % e.outcome
+
+
+def main(argv):
+    assert unmount(["ok"], "wait") == "unmount=ok"
+    assert unmount(["not_found"], None) == "unmount=not_mounted"
+
+    # a busy mount is detached lazily, then syndicatefs is stopped
+    assert unmount(["busy", "ok"], "term") == "unmount=failed,lazy=ok,term=exited"
+
+    # a mount of a killed syndicatefs is detached after it exits
+    assert unmount(["timeout", "busy", "ok"], "kill") == "unmount=timeout,lazy=failed,term=timeout,kill=exited,lazy=ok"
+
+    # what is left behind is reported with every stage tried
+    assert unmount(["timeout", "ok"], "never") == "raised unmount=timeout,lazy=ok,term=timeout,kill=timeout"
+    assert unmount(["timeout", "busy", "busy"], "kill") == "raised unmount=timeout,lazy=failed,term=timeout,kill=exited,lazy=failed"
+
+    # clean unmounts are timed and set the stage timeout of the dataset
+    workdir = tempfile.mkdtemp()
+    try:
+        history = sdm_latency_history.LatencyHistory(os.path.join(workdir, "history.json"))
+        assert unmount(["ok"], "wait", history) == "unmount=ok"
+        assert unmount(["busy", "ok"], "term", history) == "unmount=failed,lazy=ok,term=exited"
+        assert history.get_histogram("refseq", sdm_latency_history.LatencyPhase.UNMOUNT).get_count() == 1
+
+        bimpl = sdm_fuse_backend.FuseBackend(sdm_fuse_backend.FuseBackendConfig())
+        bimpl.latency_history = history
+        assert bimpl._get_unmount_stage_timeout("refseq") == sdm_fuse_backend.DEFAULT_UNMOUNT_STAGE_TIMEOUT
+        for _ in range(sdm_latency_history.HISTORY_MIN_SAMPLES):
+            history.record("refseq", sdm_latency_history.LatencyPhase.UNMOUNT, 4.0)
+        assert 12.0 <= bimpl._get_unmount_stage_timeout("refseq") <= sdm_fuse_backend.UNMOUNT_STAGE_TIMEOUT_MAX
+        assert bimpl._get_unmount_stage_timeout(None) == sdm_fuse_backend.DEFAULT_UNMOUNT_STAGE_TIMEOUT
+    finally:
+        shutil.rmtree(workdir)
+
+    # stage timeouts have to be positive numbers
+    d = json.loads(sdm_fuse_backend.FuseBackendConfig().to_json())
+    for bad in [0, -1, "2", True]:
+        d["unmount_stage_timeout"] = bad
+        try:
+            sdm_fuse_backend.FuseBackendConfig.from_dict(d)
+            assert False, bad
+        except sdm_fuse_backend.FuseBackendException:
+            pass
+    d["unmount_stage_timeout"] = 0.5
+    assert sdm_fuse_backend.FuseBackendConfig.from_dict(d).unmount_stage_timeout == 0.5
+
+    print "OK"
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import sdm.rest_backend as sdm_rest_backend
+import sdm.rest_transport as sdm_rest_transport
+
+exec_name = ""
+
+
+def percentile(samples, p):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * p / 100.0))]
+
+
+def bench(transport, rest_hosts, rounds, workdir):
+    config = sdm_rest_backend.RestBackendConfig()
+    config.rest_hosts = rest_hosts
+    config.transport = transport
+    # keep circuits of real mounts out of the bench
+    config.health_path = os.path.join(workdir, "%s_health.json" % transport)
+    backend = sdm_rest_backend.RestBackend(config)
+
+    samples = []
+    errors = 0
+    for i in range(rounds):
+        start = time.time()
+        try:
+            backend._check_syndicate_gateway_multi(rest_hosts, "bench_session")
+        except sdm_rest_backend.RestBackendException:
+            errors += 1
+        samples.append(time.time() - start)
+
+    print "%-10s rounds=%d errors=%d p50=%.3fs p95=%.3fs p99=%.3fs max=%.3fs" % (
+        transport,
+        rounds,
+        errors,
+        percentile(samples, 50),
+        percentile(samples, 95),
+        percentile(samples, 99),
+        max(samples)
+    )
+
+
+def show_help():
+    print "Usage:"
+    print "> %s rounds rest_host [rest_host ...]" % exec_name
+    print "e.g. run tools/rest_mock_server.py 8888 0.01 0.05 1.0 0.02 first"
+
+
+def main(argv):
+    if len(argv) >= 2:
+        rounds = int(argv[0])
+        rest_hosts = argv[1:]
+        workdir = tempfile.mkdtemp()
+        try:
+            for transport in sdm_rest_transport.get_transport_names():
+                bench(transport, rest_hosts, rounds, workdir)
+        finally:
+            shutil.rmtree(workdir)
+    else:
+        show_help()
+
+
+if __name__ == "__main__":
+    exec_name = sys.argv[0]
+    main(sys.argv[1:])
@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import multiprocessing.pool
+import sdm.repository as sdm_repository
+import sdm.catalogue_codec as sdm_catalogue_codec
+import sdm.bktree as sdm_bktree
+
+exec_name = ""
+
+REQUIRED_FIELDS = ["dataset", "ms_host", "volume", "gateway", "description"]
+DEFAULT_WORKERS = 8
+
+
+class KeyCache(object):
+    """
+    Read each private key file once, however many specs share it
+    """
+    def __init__(self):
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def read(self, path):
+        real_path = os.path.realpath(path)
+        with self.lock:
+            if real_path in self.keys:
+                return self.keys[real_path]
+
+        with open(real_path, "r") as f:
+            user_pkey = f.read()
+
+        if "PRIVATE KEY-----" not in user_pkey:
+            raise ValueError("not a private key - %s" % path)
+
+        with self.lock:
+            self.keys[real_path] = user_pkey
+        return user_pkey
+
+
+def list_spec_files(spec_dir):
+    spec_files = []
+    for root, _, filenames in os.walk(spec_dir):
+        for filename in filenames:
+            if filename.endswith(".json"):
+                spec_files.append(os.path.join(root, filename))
+    return sorted(spec_files)
+
+
+def load_spec_file(spec_path, key_cache):
+    """
+    Return (entries, errors) of a spec file.
+    A spec file holds a dataset spec or a list of them. user_pkey_path is
+    relative to the spec file.
+    """
+    try:
+        with open(spec_path, "r") as f:
+            specs = json.load(f)
+    except (IOError, ValueError), e:
+        return [], ["%s : %s" % (spec_path, e)]
+
+    if isinstance(specs, dict):
+        specs = [specs]
+
+    entries = []
+    errors = []
+    for spec in specs:
+        missing = [k for k in REQUIRED_FIELDS if not spec.get(k)]
+        if missing:
+            errors.append("%s : missing %s" % (spec_path, ", ".join(missing)))
+            continue
+
+        spec = dict(spec)
+        try:
+            if "user_pkey_path" in spec:
+                key_path = os.path.join(os.path.dirname(spec_path), spec.pop("user_pkey_path"))
+                spec["user_pkey"] = key_cache.read(key_path)
+
+            if spec.get("user_pkey") and not spec.get("username"):
+                raise ValueError("a private key without a username")
+
+            entries.append(sdm_repository.RepositoryEntry.from_dict(spec))
+        except (IOError, ValueError), e:
+            errors.append("%s : %s - %s" % (spec_path, spec["dataset"], e))
+    return entries, errors
+
+
+def build(spec_dir, output_prefix, version, workers, with_msgpack):
+    if with_msgpack and sdm_catalogue_codec.msgpack is None:
+        print >> sys.stderr, "msgpack is not installed"
+        return 1
+
+    spec_files = list_spec_files(spec_dir)
+    key_cache = KeyCache()
+
+    # specs are validated in parallel, mostly waiting on key files
+    pool = multiprocessing.pool.ThreadPool(workers)
+    try:
+        results = pool.map(lambda p: load_spec_file(p, key_cache), spec_files)
+    finally:
+        pool.close()
+
+    errors = []
+    table = {}
+    for spec_path, (entries, spec_errors) in zip(spec_files, results):
+        errors.extend(spec_errors)
+        for entry in entries:
+            if entry.dataset in table:
+                errors.append("%s : duplicated dataset - %s" % (spec_path, entry.dataset))
+                continue
+            table[entry.dataset] = entry
+
+    if errors:
+        for error in errors:
+            print >> sys.stderr, error
+        return 1
+
+    entries = [table[k] for k in sorted(table.keys())]
+    index = sdm_repository.RepositoryIndex.build(entries)
+    name_tree = sdm_bktree.BKTree([entry.dataset for entry in entries])
+    doc = sdm_catalogue_codec.make_artifact(version, [entry.to_dict() for entry in entries], index.grams, name_tree.to_list())
+
+    outputs = [("%s.json.gz" % output_prefix, sdm_catalogue_codec.encode_json_gz(doc))]
+    if with_msgpack:
+        outputs.append(("%s.msgpack" % output_prefix, sdm_catalogue_codec.encode_msgpack(doc)))
+
+    for path, data in outputs:
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.rename(tmp_path, path)
+        print "Wrote %s (%d bytes)" % (path, len(data))
+
+    print "version=%s datasets=%d keys=%d grams=%d %s" % (version, len(entries), len(doc["keys"]), len(doc["index"]), doc["content_hash"])
+    return 0
+
+
+def show_help():
+    print "Usage:"
+    print "> %s spec_dir output_prefix [version] [--msgpack] [--workers=<n>]" % exec_name
+    print "spec : {\"dataset\": ..., \"ms_host\": ..., \"volume\": ..., \"username\": ..., \"user_pkey_path\": ..., \"gateway\": ..., \"description\": ...}"
+
+
+def main(argv):
+    with_msgpack = False
+    workers = DEFAULT_WORKERS
+    args = []
+    for arg in argv:
+        if arg == "--msgpack":
+            with_msgpack = True
+        elif arg.startswith("--workers="):
+            workers = int(arg[len("--workers="):])
+        else:
+            args.append(arg)
+
+    if len(args) >= 2:
+        # catalogue versions increase with time by default
+        version = int(time.time())
+        if len(args) >= 3:
+            version = int(args[2])
+        return build(args[0], args[1], version, workers, with_msgpack)
+    else:
+        show_help()
+        return 1
+
+
+if __name__ == "__main__":
+    exec_name = sys.argv[0]
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,116 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import sys
+import urllib
+import urlparse
+import BaseHTTPServer
+import sdm.catalogue_source as sdm_catalogue_source
+import sdm.catalogue_codec as sdm_catalogue_codec
+
+exec_name = ""
+source = None
+
+
+class CatalogueRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serve a local catalogue directory with the catalogue server protocol
+    """
+    def _send_json(self, code, obj, content_type=sdm_catalogue_codec.JSON_TYPE):
+        content_encoding = sdm_catalogue_codec.choose_content_encoding(self.headers.get("Accept-Encoding"))
+        body = sdm_catalogue_codec.encode_body(obj, content_type, content_encoding)
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        if content_encoding:
+            self.send_header("Content-Encoding", content_encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header(sdm_catalogue_source.CAPABILITIES_HEADER, ", ".join(source.get_capabilities()))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header(sdm_catalogue_source.CAPABILITIES_HEADER, ", ".join(source.get_capabilities()))
+        self.end_headers()
+
+    def do_GET(self):
+        parts = urlparse.urlparse(self.path)
+        params = urlparse.parse_qs(parts.query)
+        dataset = urllib.unquote(parts.path.strip("/"))
+
+        try:
+            if dataset:
+                ent = source.fetch_entry(dataset)
+                if ent is None:
+                    self._send_json(404, {"error": "dataset not found - %s" % dataset})
+                else:
+                    self._send_json(200, ent)
+                return
+
+            if "since" in params:
+                delta = source.fetch_delta(params["since"][0])
+                if delta is None:
+                    self._send_json(410, {"error": "cannot produce a delta"})
+                else:
+                    self._send_json(200, delta)
+                return
+
+            if "q" in params or "limit" in params:
+                query = None
+                limit = None
+                if "q" in params:
+                    query = params["q"][0].strip().lower()
+                if "limit" in params:
+                    limit = int(params["limit"][0])
+                self._send_json(200, source.query(query, limit))
+                return
+
+            catalogue = source.fetch_all()
+            content_type = sdm_catalogue_codec.choose_content_type(self.headers.get("Accept"))
+            if content_type == sdm_catalogue_codec.JSON_TYPE:
+                self._send_json(200, catalogue)
+            else:
+                # clients that understand artifacts get shared keys once
+                artifact = sdm_catalogue_codec.make_artifact(catalogue["version"], catalogue["entries"])
+                self._send_json(200, artifact, content_type)
+        except Exception, e:
+            self._send_json(500, {"error": str(e)})
+
+
+def show_help():
+    print "Usage:"
+    print "> %s catalogue_dir [port]" % exec_name
+
+
+def main(argv):
+    global source
+    if len(argv) >= 1:
+        port = 8000
+        if len(argv) >= 2:
+            port = int(argv[1])
+
+        source = sdm_catalogue_source.LocalCatalogueSource(argv[0])
+        server = BaseHTTPServer.HTTPServer(("", port), CatalogueRequestHandler)
+        print "Serving %s at port %d" % (argv[0], port)
+        server.serve_forever()
+    else:
+        show_help()
+
+
+if __name__ == "__main__":
+    exec_name = sys.argv[0]
+    main(sys.argv[1:])
@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License" );
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import sys
+import json
+import time
+import random
+import urlparse
+import threading
+import BaseHTTPServer
+import SocketServer
+
+exec_name = ""
+
+# mock server behavior
+latency = 0.0
+slow_rate = 0.0
+slow_latency = 1.0
+fail_rate = 0.0
+
+users = set()
+gateways = set()
+lock = threading.Lock()
+
+
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class MockRestRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Mock of the Syndicate REST gateway API used by the REST backend
+    """
+    def log_message(self, format, *args):
+        pass
+
+    def _get_params(self):
+        parts = urlparse.urlparse(self.path)
+        params = urlparse.parse_qs(parts.query)
+        if self.command == "POST":
+            length = int(self.headers.getheader("Content-Length", 0))
+            params.update(urlparse.parse_qs(self.rfile.read(length)))
+
+        values = {}
+        for k in params:
+            values[k] = params[k][0]
+        return parts.path, values
+
+    def _respond(self, result):
+        delay = latency
+        if random.random() < slow_rate:
+            delay = slow_latency
+        time.sleep(delay)
+
+        if random.random() < fail_rate:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        body = json.dumps({"result": result})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        path, params = self._get_params()
+        with lock:
+            if path == "/user/check":
+                result = params.get("mount_id") in users
+            elif path == "/user/setup":
+                users.add(params.get("mount_id"))
+                result = True
+            elif path == "/user/delete":
+                users.discard(params.get("mount_id"))
+                result = True
+            elif path == "/gateway/check":
+                result = params.get("session_name") in gateways
+            elif path == "/gateway/setup":
+                gateways.add(params.get("session_name"))
+                result = True
+            elif path == "/gateway/delete":
+                gateways.discard(params.get("session_name"))
+                result = True
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+        self._respond(result)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+
+def show_help():
+    print "Usage:"
+    print "> %s port [latency_sec] [slow_rate] [slow_latency_sec] [fail_rate]" % exec_name
+
+
+def main(argv):
+    global latency
+    global slow_rate
+    global slow_latency
+    global fail_rate
+    if len(argv) >= 1:
+        port = int(argv[0])
+        if len(argv) >= 2:
+            latency = float(argv[1])
+        if len(argv) >= 3:
+            slow_rate = float(argv[2])
+        if len(argv) >= 4:
+            slow_latency = float(argv[3])
+        if len(argv) >= 5:
+            fail_rate = float(argv[4])
+
+        server = ThreadedHTTPServer(("", port), MockRestRequestHandler)
+        print "Serving a mock REST host at port %d" % port
+        server.serve_forever()
+    else:
+        show_help()
+
+
+if __name__ == "__main__":
+    exec_name = sys.argv[0]
+    main(sys.argv[1:])